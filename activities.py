@@ -1,35 +1,38 @@
-from slack_sdk.errors import SlackApiError
 import asyncio
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import coloredlogs
-from slack_sdk import WebClient
-import json
-import os
-import smtplib
-import ssl
+import dataclasses
 from logging import getLogger
-from scrapegraphai.graphs import SearchGraph
-from scrapegraphai.utils import prettify_exec_info
-from scrapegraphai.utils.data_export import export_to_json
-from serpapi import GoogleSearch
 from temporalio import activity
-from news_data import NewsfeedInput
-from temporalio.exceptions import ActivityError, ApplicationError
+from article_store import get_article_store, store_search_results, with_stored_snippets
+from near_duplicates import collapse_near_duplicates
+from news_data import Article, NearDuplicateInput, NewsfeedInput, StoreArticlesInput
+from search_cache import get_search_cache, search_cache_key
+from temporalio.exceptions import ApplicationError
+from typing import Dict, List
 
-SLACKAPI_KEY = os.getenv('SLACKAPI_KEY')
-SERPAPI_KEY = os.getenv('SERPAPI_KEY')
+# Workflows import this module for the activity definitions, through the sandbox and in the web
+# tier, so the HTTP and Slack clients (news_search.py, slack_notify.py) and the watchlist tagger
+# are only imported by the activities that use them
 
 # Create a logger object and use coloredlogs
 logger = getLogger(__name__)
 coloredlogs.install(level='INFO')
 
 
+def get_required_article_store():
+    store = get_article_store()
+    if store is None:
+        raise ApplicationError("The article store is not enabled on this worker (ARTICLE_STORE_ENABLED)",
+                               non_retryable=True)
+    return store
+
+
 class NewsActivities:
 
     @activity.defn
-    def search_news(activity_input: NewsfeedInput) -> dict:
-        """Function to search and retrieve news based on query"""
+    async def search_news(activity_input: NewsfeedInput) -> Dict[str, List[Article]]:
+        """Function to search and retrieve news based on query, projected onto Article"""
+        from news_search import SERPAPI_KEY, SERPAPI_URL, get_search_client, get_search_semaphore
         logger.info("Fetching the news")
 
         logger.info(activity_input.topicString)
@@ -49,23 +52,88 @@ class NewsActivities:
             "api_key": SERPAPI_KEY
         }
 
-        search = GoogleSearch(params)
-        search_results = search.get_dict()
+        # Identical searches from other workflows (any term order) are served from the cache
+        cache = get_search_cache()
+        cache_key = search_cache_key(activity_input.topicString, activity_input.topicDate,
+                                     **{name: value for name, value in params.items()
+                                        if name not in ('q', 'api_key')})
+        news_results = await asyncio.to_thread(cache.get, cache_key) if cache else None
+        if news_results is not None:
+            logger.info(f"Search cache hit for {activity_input.topicString}")
+            articles = [Article.from_result(item, activity_input.topicDate) for item in news_results]
+        else:
+            async with get_search_semaphore():
+                response = await get_search_client().get(SERPAPI_URL, params=params)
+            response.raise_for_status()
+            search_results = response.json()
+            news_results = search_results.get('news_results', []) if search_results else None
+            # Only the fields a feed uses go any further, in the cache as well
+            articles = [Article.from_result(item, activity_input.topicDate) for item in news_results or []]
+            # An empty result is often a transient SerpAPI hiccup, don't pin it for the whole TTL
+            if cache and news_results:
+                await asyncio.to_thread(cache.put, cache_key, [dataclasses.asdict(article) for article in articles])
+
+        # Bodies stay on this host, the workflow only gets what it needs to dedupe and notify
+        if activity_input.articleStore and articles:
+            articles = await asyncio.to_thread(store_search_results, get_required_article_store(),
+                                               activity_input.topicDate, articles)
 
         # Create result dictionary where the key is the date of the search
         result_dict = {}
-        if search_results:
-            result_dict[activity_input.topicDate] = search_results['news_results']
+        if news_results is not None:
+            result_dict[activity_input.topicDate] = articles
         logger.info("Returning articles from Activity")
         return result_dict
 
+    @activity.defn
+    def collapse_near_duplicates(activity_input: NearDuplicateInput) -> Dict[str, List[Article]]:
+        """Drop syndicated or re-shared copies of the same story, by canonical link and headline SimHash"""
+        results, dropped = collapse_near_duplicates(activity_input.results,
+                                                    known=activity_input.knownSimhashes,
+                                                    max_distance=activity_input.maxDistance)
+        logger.info(f"Collapsed {dropped} near-duplicate articles")
+        return results
+
+    @activity.defn
+    def tag_watchlist_entities(results: Dict[str, List[Article]]) -> Dict[str, List[Article]]:
+        """Tag a batch of articles with the watchlist entities their titles and snippets mention"""
+        from watchlist_tagger import get_watchlist_tagger
+        tagger = get_watchlist_tagger()
+        if tagger is None:
+            raise ApplicationError("Watchlist tagging is not enabled on this worker (WATCHLIST_TAGGING)",
+                                   non_retryable=True)
+        store = get_article_store()
+        if store is None:
+            results, tagged = tagger.tag_articles(results)
+        else:
+            # search_news left the snippets in the article store, tag them too but keep the batch slim
+            full, tagged = tagger.tag_articles(with_stored_snippets(store, results))
+            results = {date_key: [dataclasses.replace(item, entities=tagged_item.entities)
+                                  for item, tagged_item in zip(items, full[date_key])]
+                       for date_key, items in results.items()}
+        logger.info(f"Tagged {tagged} of {sum(len(items) for items in results.values())} articles "
+                    f"with watchlist entities")
+        return results
+
+    @activity.defn
+    def store_articles(activity_input: StoreArticlesInput) -> None:
+        """Link a feed's new articles in the article store and drop the ones it has trimmed"""
+        store = get_required_article_store()
+        store.store_bodies([article for article in activity_input.articles if 'title' in article])
+        store.link_articles(activity_input.feedId, activity_input.cursor,
+                            activity_input.articles, activity_input.removedSeqs, activity_input.reset)
+        logger.info(f"Stored {len(activity_input.articles)} articles for feed {activity_input.feedId}, "
+                    f"removed {len(activity_input.removedSeqs)}")
+
     @activity.defn
     async def notify_slack(newsfeed_results: list):
-        logger.info("Sending Slack notification")
+        """Post newly found articles to Slack, grouped into a few Block Kit messages"""
+        from slack_sdk.errors import SlackApiError
+        from slack_notify import (SLACK_ARTICLES_PER_MESSAGE, SLACK_MESSAGE_INTERVAL_SECONDS, build_slack_blocks,
+                                  get_slack_client)
+        logger.info(f"Sending Slack notification for {len(newsfeed_results)} articles")
 
-        # Initialize a WebClient instance with your OAuth token
-        client = WebClient(
-            token=SLACKAPI_KEY)
+        client = get_slack_client()
 
         # The channel ID or name where you want to send the message
         channel_id = "#newsfeed-demo"
@@ -73,13 +141,19 @@ class NewsActivities:
         # The bot name
         bot_name = "NewsfeedDemo"
 
-        # Send Slack with newsfeed results
-        for entry in newsfeed_results:
+        # One message per chunk of articles, paced to stay under Slack's per-channel rate limit
+        chunks = [newsfeed_results[i:i + SLACK_ARTICLES_PER_MESSAGE]
+                  for i in range(0, len(newsfeed_results), SLACK_ARTICLES_PER_MESSAGE)]
+        for chunk_index, chunk in enumerate(chunks):
+            if chunk_index > 0:
+                await asyncio.sleep(SLACK_MESSAGE_INTERVAL_SECONDS)
             try:
-                msg = entry['title']
-                link = entry['link']
-                response = client.chat_postMessage(
-                    channel=channel_id, text=f"{msg} {link}", username=bot_name)
-                logger.info("Message sent successfully!")
+                # 429 responses are retried by the client after Retry-After
+                await client.chat_postMessage(
+                    channel=channel_id,
+                    text=f"{len(chunk)} new articles",
+                    blocks=build_slack_blocks(chunk, chunk_index + 1, len(chunks)),
+                    username=bot_name)
+                logger.info(f"Message {chunk_index + 1}/{len(chunks)} sent successfully!")
             except SlackApiError as e:
                 logger.error(f"Error sending message: {e}")
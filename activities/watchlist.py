@@ -4,16 +4,26 @@
 from datetime import datetime
 import os
 import boto3
-import pandas as pd
 import json
 import logging
 from temporalio import activity
+from watchlist_matcher import WatchlistMatcher, build_matcher
+from watchlist_refresh import bulk_load_watchlist, iter_watchlist_csv, setup_sql, watchlist_table_sql, VERSION_SQL
+from watchlist_snapshot import VersionedWatchlist
 log = logging.getLogger()
 log.setLevel(logging.INFO)
 
 # Global variable for RDS Connection
 rds_client = None
 config = None
+# Set once this process has made sure the watchlist tables exist
+watchlist_tables_ready = False
+# Rows per Data API page when loading the watchlist, responses are capped at 1 MB
+WATCHLIST_PAGE_SIZE = int(os.getenv('WATCHLIST_PAGE_SIZE', '5000'))
+# How often each worker checks the watchlist_version row that refresh bumps
+WATCHLIST_VERSION_POLL_SECONDS = float(os.getenv('WATCHLIST_VERSION_POLL_SECONDS', '30'))
+# Parameter sets per batch_execute_statement call when reloading the watchlist
+WATCHLIST_BATCH_SIZE = int(os.getenv('WATCHLIST_BATCH_SIZE', '1000'))
 
 
 class WatchlistActivity:
@@ -33,12 +43,9 @@ class WatchlistActivity:
         try:
             req_body = json.loads(event['body'])
             keywords = req_body["keywords"]
-            results = []
-            for keyword in keywords:
-                statement, parameters = get_keyword_query(keyword)
-                query_result = execute_statement(statement, parameters)
-
-                results.append(query_result)
+            # One in-memory pass for the whole batch instead of a Data API query per keyword,
+            # answered in the execute_statement shape the SQL query returned
+            results = [keyword_query_result(entries) for entries in get_watchlist_matcher().match_batch(keywords)]
         except Exception as e:
             log.error("Error executing check_keyword ", e)
             return {
@@ -59,7 +66,8 @@ class WatchlistActivity:
 
     def refresh(event, context):
         """
-        This method refresh the watchlist data in the DB, by cleaning the table and reloading new data
+        This method refresh the watchlist data in the DB, by loading the new data into a staging table
+        and swapping it in for the watchlist table in one transaction
         {
         "refresh_list_from_bucket": false,
         "watchlist": [
@@ -89,18 +97,14 @@ class WatchlistActivity:
                 input_file = "watchlist/watchlist.csv"
                 s3 = boto3.client('s3')
                 obj = s3.get_object(Bucket=newsfeed_bucket, Key=input_file)
-                csv_data = pd.read_csv(obj['Body'])
-                csv_watchlist = []
-                for i, row in csv_data.iterrows():
-                    record = {'entity': row[0], 'entity_type': row[1]}
-                    csv_watchlist.append(record)
-                recreate_db()
-                insert_records(csv_watchlist)
+                # Streamed straight into the batches, the file is never held whole
+                insert_records(iter_watchlist_csv(obj['Body']))
             else:
-                recreate_db()
                 insert_records(watchlist)
             response = execute_statement('select count(*) from WatchList')
             result = response
+            # Other workers see the version bump on their next poll, this one checks right away
+            watchlist_snapshots.expire()
         except Exception as e:
             log.error("Error executing refresh_watchlist ", e)
             return {
@@ -121,90 +125,159 @@ class WatchlistActivity:
             'body': json.dumps(response)
         }
 
-    def recreate_db():
-        """
-        This method delete the watchlist data
-        :return:
-        """
-        execute_statement(get_watchlist_table_sql())
-        execute_statement("truncate table watchlist")
-        execute_statement('create extension IF NOT EXISTS fuzzystrmatch;')
+def execute_statement(sql, sql_parameters=[]):
+    """
+    Execute a sql statement against an Aurora serverless Data API
+    sql_parameters as a means to prevent SQL injections
+    :param sql: the SQL Statement
+    :param sql_parameters: sql statement params - if exists
+    :return: the result of the query execution
+    """
 
-    def execute_statement(sql, sql_parameters=[]):
-        """
-        Execute a sql statement against an Aurora serverless Data API
-        sql_parameters as a means to prevent SQL injections
-        :param sql: the SQL Statement
-        :param sql_parameters: sql statement params - if exists
-        :return: the result of the query execution
-        """
+    client = get_rds_connection()
+    if sql_parameters:
+        response = client.execute_statement(
+            secretArn=config['db-secret'],
+            database='postgres',
+            resourceArn=config['db-cluster-arn'],
+            sql=sql,
+            parameters=sql_parameters
+        )
+    else:
+        response = client.execute_statement(
+            secretArn=config['db-secret'],
+            database='postgres',
+            resourceArn=config['db-cluster-arn'],
+            sql=sql
+        )
+    return response
 
-        client = get_rds_connection()
-        if sql_parameters:
-            response = client.execute_statement(
-                secretArn=config['db-secret'],
-                database='postgres',
-                resourceArn=config['db-cluster-arn'],
-                sql=sql,
-                parameters=sql_parameters
-            )
-        else:
-            response = client.execute_statement(
-                secretArn=config['db-secret'],
-                database='postgres',
-                resourceArn=config['db-cluster-arn'],
-                sql=sql
-            )
-        return response
-
-    def get_watchlist_table_sql():
-        """
-        Returns the watchlist DDL table creation SQL Statement
-        :return:
-        """
-        query = 'CREATE TABLE IF NOT EXISTS WatchList( ' \
-                'entity varchar(255), ' \
-                'entity_type varchar(255), ' \
-                'create_datetime timestamp, ' \
-                'PRIMARY KEY (entity, entity_type)) '
-        return query
-
-    def insert_records(watchlist):
-        """
-        Iterate on the watchlist values and create and insert records to the watchlist table
-        :param watchlist: array of entity and entity_type values
-        :return:
-        """
+def get_watchlist_table_sql():
+    """
+    Returns the watchlist DDL table creation SQL Statement
+    :return:
+    """
+    return watchlist_table_sql()
 
-        for record in watchlist:
-            sql_parameters = [
-                {'name': 'entity', 'value': {
-                    'stringValue': "{0}".format(record["entity"])}},
-                {'name': 'entity_type', 'value': {
-                    'stringValue': "{0}".format(record["entity_type"])}}
-            ]
-            statement = "INSERT INTO watchlist(entity, entity_type, create_datetime) VALUES(:entity, :entity_type, timezone('UTC', now()))"
-            execute_statement(statement, sql_parameters)
-        execute_statement('commit;')
-
-    def get_keyword_query(keyword):
-        """
-        Generate the corresponding SQL Statement and SQL parameters for query the watchlist DB
-        :param keyword:
-        :return: the statement and statement parameters
-        """
-        sql_parameters = [{'name': 'input_keyword',
-                           'value': {'stringValue': "{0}".format(keyword)}}]
-        statement = "SELECT * FROM  watchlist WHERE soundex(lower(entity)) = soundex(lower(:input_keyword)) " \
-                    "union " \
-                    "SELECT * FROM  watchlist WHERE levenshtein_less_equal(lower(entity), lower(:input_keyword),2) <=2"
-        return statement, sql_parameters
-
-    def get_rds_connection():
-        global rds_client
-        global config
-        if rds_client is None:
-            rds_client = boto3.client('rds-data')
-        if config is None:
-            config = common.get_secret(os.environ['SECRET'])
-        return rds_client
+def insert_records(watchlist):
+    """
+    Load the watchlist values into a fresh table with batched inserts and swap it in,
+    readers keep seeing the previous watchlist until the swap commits
+    :param watchlist: iterable of entity and entity_type values
+    :return: how many records were sent
+    """
+    client = get_rds_connection()
+    db = {'secretArn': config['db-secret'], 'resourceArn': config['db-cluster-arn'], 'database': 'postgres'}
+    return bulk_load_watchlist(client, db, watchlist, WATCHLIST_BATCH_SIZE)
+
+def get_keyword_query(keyword):
+    """
+    Generate the corresponding SQL Statement and SQL parameters for query the watchlist DB
+    :param keyword:
+    :return: the statement and statement parameters
+    """
+    sql_parameters = [{'name': 'input_keyword',
+                       'value': {'stringValue': "{0}".format(keyword)}}]
+    statement = "SELECT * FROM  watchlist WHERE soundex(lower(entity)) = soundex(lower(:input_keyword)) " \
+                "union " \
+                "SELECT * FROM  watchlist WHERE levenshtein_less_equal(lower(entity), lower(:input_keyword),2) <=2"
+    return statement, sql_parameters
+
+def keyword_query_result(entries):
+    """
+    Matched watchlist entries as the Data API response get_keyword_query's SELECT * returned,
+    one record of entity, entity_type and create_datetime columns per entry
+    :param entries: matcher entries for one keyword
+    :return: the response, without the boto3 ResponseMetadata
+    """
+    def column(value):
+        return {'isNull': True} if value is None else {'stringValue': value}
+
+    return {
+        'records': [[column(entry['entity']), column(entry['entity_type']), column(entry.get('create_datetime'))]
+                    for entry in entries],
+        'numberOfRecordsUpdated': 0
+    }
+
+def get_rds_connection():
+    global rds_client
+    global config
+    if rds_client is None:
+        rds_client = boto3.client('rds-data')
+    if config is None:
+        config = common.get_secret(os.environ['SECRET'])
+    return rds_client
+
+
+def ensure_watchlist_tables():
+    """
+    Create the watchlist and watchlist_version tables if they don't exist yet.
+    Deployments older than the version table, or never refreshed, would
+    otherwise fail every check until the next refresh.
+    """
+    global watchlist_tables_ready
+    if not watchlist_tables_ready:
+        for sql in setup_sql():
+            execute_statement(sql)
+        watchlist_tables_ready = True
+
+
+def read_watchlist_version() -> str:
+    """
+    The version refresh bumps with every reload, '0' before the first refresh
+    :return: the version
+    """
+    ensure_watchlist_tables()
+    records = execute_statement(VERSION_SQL).get('records', [])
+    return str(records[0][0].get('longValue', 0)) if records else '0'
+
+
+def load_watchlist():
+    """
+    Read every watchlist row through the Data API, a page at a time
+    :return: list of (entity, entity_type, create_datetime) rows
+    """
+    rows = []
+    offset = 0
+    while True:
+        response = execute_statement(
+            "SELECT entity, entity_type, create_datetime FROM watchlist ORDER BY entity, entity_type "
+            "LIMIT :limit OFFSET :offset",
+            [{'name': 'limit', 'value': {'longValue': WATCHLIST_PAGE_SIZE}},
+             {'name': 'offset', 'value': {'longValue': offset}}])
+        records = response.get('records', [])
+        rows.extend([column.get('stringValue') for column in record] for record in records)
+        if len(records) < WATCHLIST_PAGE_SIZE:
+            return rows
+        offset += WATCHLIST_PAGE_SIZE
+
+
+def load_watchlist_version():
+    """
+    Build a matcher over the watchlist, with the version the rows belong to.
+    The pages aren't read in one transaction, so the load is retried if a
+    refresh swapped the table in the middle of it.
+    :return: the version and the matcher
+    """
+    version = read_watchlist_version()
+    for _ in range(3):
+        rows = load_watchlist()
+        current = read_watchlist_version()
+        if current == version:
+            break
+        version = current
+    return version, build_matcher(rows)
+
+
+# Each worker's current watchlist, checks match against it without touching the database
+watchlist_snapshots = VersionedWatchlist('watchlist', read_watchlist_version, load_watchlist_version,
+                                         WATCHLIST_VERSION_POLL_SECONDS)
+
+
+def get_watchlist_matcher() -> WatchlistMatcher:
+    """
+    The worker's in-memory matcher over its current watchlist snapshot.
+    It returns the same entries as get_keyword_query's SQL for each keyword.
+    :return: the matcher
+    """
+    return watchlist_snapshots.get()
@@ -0,0 +1,370 @@
+import base64
+import bisect
+import hashlib
+import sys
+from array import array
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from near_duplicates import canonical_url
+from news_data import Article
+
+# Version of the compact payload carried across continue-as-new
+STATE_VERSION = 5
+
+# Inline data: URI thumbnails can be tens of KB each, never keep those
+MAX_THUMBNAIL_CHARS = 512
+
+
+def article_fingerprint(title: str, link: str, article_date: str) -> int:
+    """
+    64-bit fingerprint of an article, same inputs as the old title-link-date key.
+
+    The link is keyed in its canonical form, so an article shared with
+    tracking parameters or an AMP link is still the same article.
+    """
+    key = f"{title}-{canonical_url(link)}-{article_date}".encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big')
+
+
+def article_id(title: str, link: str, article_date: str) -> str:
+    """Fingerprint as the fixed-width hex ID clients see"""
+    return f"{article_fingerprint(title, link, article_date):016x}"
+
+
+class FingerprintIndex:
+    """
+    Dedupe index of 64-bit article fingerprints.
+
+    Fingerprints are held in two unsigned 64-bit arrays, one sorted for
+    bisect lookups and one in insertion order so the oldest can be evicted
+    once the index is over its limit. That is 16 bytes per article, and the
+    payload is the insertion-order array as base64, so restoring it after
+    continue-as-new is a copy rather than rehashing every article.
+    """
+
+    def __init__(self, limit: int = 0):
+        self.limit = limit
+        self._order = array('Q')
+        self._sorted = array('Q')
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, fingerprint: int) -> bool:
+        i = bisect.bisect_left(self._sorted, fingerprint)
+        return i < len(self._sorted) and self._sorted[i] == fingerprint
+
+    def add(self, fingerprint: int) -> bool:
+        """Add a fingerprint, returns False if it was already present"""
+        i = bisect.bisect_left(self._sorted, fingerprint)
+        if i < len(self._sorted) and self._sorted[i] == fingerprint:
+            return False
+        self._sorted.insert(i, fingerprint)
+        self._order.append(fingerprint)
+
+        if self.limit and len(self._order) > self.limit:
+            excess = len(self._order) - self.limit
+            for old in self._order[:excess]:
+                del self._sorted[bisect.bisect_left(self._sorted, old)]
+            del self._order[:excess]
+        return True
+
+    def to_payload(self) -> str:
+        order = array('Q', self._order)
+        # Always little-endian on the wire so any worker can load it
+        if sys.byteorder == 'big':
+            order.byteswap()
+        return base64.b64encode(order.tobytes()).decode('ascii')
+
+    def load_payload(self, payload: str) -> None:
+        order = array('Q')
+        order.frombytes(base64.b64decode(payload))
+        if sys.byteorder == 'big':
+            order.byteswap()
+        self._order = order
+        self._sorted = array('Q', sorted(order))
+
+    def load_fingerprints(self, fingerprints) -> None:
+        for fingerprint in fingerprints:
+            self.add(fingerprint)
+
+
+class ArticleState:
+    """
+    Compact, size-bounded store of the articles a newsfeed has collected.
+
+    Articles are kept as short rows rather than full dicts. Source names
+    are interned into a table, snippets are truncated, and thumbnails are
+    kept out of line so they can be left out entirely. Every article gets
+    a sequence number that only ever grows. Clients use it as a cursor,
+    and it stays valid while old articles are trimmed.
+
+    trim() enforces the retention window by date and by count. The
+    workflow state, query results and continue-as-new payload therefore
+    stay bounded however long a topic runs.
+
+    Duplicates are checked against a FingerprintIndex that outlives
+    trimming (up to index_size entries), so an article dropped from the
+    window is not re-added and re-notified when a later search returns it.
+
+    With keep_content off (feeds backed by the article store) rows only
+    hold the sequence number, fingerprint, date, headline SimHash and
+    watchlist entities, the title, link, snippet and thumbnail live in
+    article_store.py. Sequence numbers removed by trim() are kept until
+    drain_trimmed() so the store can drop them too.
+    """
+
+    def __init__(self, retention_days: int = 7, max_articles: int = 1000,
+                 snippet_chars: int = 200, keep_thumbnails: bool = True, index_size: int = 10000,
+                 keep_content: bool = True):
+        self.retention_days = retention_days
+        self.max_articles = max_articles
+        self.snippet_chars = snippet_chars
+        self.keep_thumbnails = keep_thumbnails
+        self.keep_content = keep_content
+        self._trimmed: List[int] = []
+        self._sequence = 0
+        self._sources: List[str] = []
+        self._source_index: Dict[str, int] = {}
+        # Rows are [seq, fingerprint, date, title, link, source_idx, snippet, simhash, entities], ordered by seq
+        self._rows: List[list] = []
+        self._seqs: List[int] = []
+        # The same rows partitioned by date, each partition in seq order
+        self._by_date: Dict[str, List[list]] = {}
+        # The index must at least cover every retained article
+        self._index = FingerprintIndex(max(index_size, max_articles) if index_size else 0)
+        self._thumbnails: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def cursor(self) -> int:
+        """Sequence number the next article will get"""
+        return self._sequence
+
+    def contains(self, fingerprint: int) -> bool:
+        return fingerprint in self._index
+
+    def add(self, article: Article) -> Optional[Dict]:
+        """Add an article, returns it in expanded form or None if it is a duplicate"""
+        title = article.title
+        link = article.link
+        article_date = article.date
+        key = article_fingerprint(title, link, article_date)
+        if not self._index.add(key):
+            return None
+
+        source = article.source
+        snippet = article.snippet or ''
+        if len(snippet) > self.snippet_chars:
+            snippet = snippet[:self.snippet_chars - 1].rstrip() + '…'
+
+        if self.keep_content:
+            row = [self._sequence, key, article_date, title, link,
+                   self._intern_source(source), snippet, article.simhash, list(article.entities)]
+        else:
+            row = [self._sequence, key, article_date, '', '', self._intern_source(''), '', article.simhash,
+                   list(article.entities)]
+        self._rows.append(row)
+        self._seqs.append(self._sequence)
+        self._by_date.setdefault(article_date, []).append(row)
+        self._sequence += 1
+
+        thumbnail = article.thumbnail
+        if self.keep_content and self.keep_thumbnails and thumbnail and len(thumbnail) <= MAX_THUMBNAIL_CHARS:
+            self._thumbnails[key] = thumbnail
+        # The caller still gets the article it passed in, e.g. for notifications
+        return dict(self._expand(row), title=title, link=link, source=source, snippet=snippet)
+
+    def trim(self) -> int:
+        """Drop articles outside the retention window, returns how many were removed"""
+        keep = self._rows
+        cutoff = self._cutoff_date()
+        if cutoff is not None:
+            keep = [row for row in keep if not row[2] or row[2] >= cutoff]
+        if self.max_articles and len(keep) > self.max_articles:
+            keep = keep[-self.max_articles:]
+
+        removed = len(self._rows) - len(keep)
+        if removed:
+            # Fingerprints stay in the index, only the article data goes
+            kept = set(row[0] for row in keep)
+            for row in self._rows:
+                if row[0] not in kept:
+                    self._thumbnails.pop(row[1], None)
+                    if not self.keep_content:
+                        self._trimmed.append(row[0])
+            self._rows = keep
+            self._seqs = [row[0] for row in keep]
+            self._partition()
+        return removed
+
+    def drain_trimmed(self) -> List[int]:
+        """Sequence numbers trimmed since the last call, only tracked without keep_content"""
+        trimmed, self._trimmed = self._trimmed, []
+        return trimmed
+
+    def drop_content(self) -> None:
+        """Switch to keeping references only, e.g. once the articles have been written to the store"""
+        self.keep_content = False
+        blank = self._intern_source('')
+        for row in self._rows:
+            row[3:7] = ['', '', blank, '']
+        self._thumbnails = {}
+
+    def articles(self) -> List[Dict]:
+        return [self._expand(row) for row in self._rows]
+
+    def since(self, cursor: int) -> Dict:
+        """Articles added at or after the cursor, in the shape of get_results_since"""
+        reset = cursor < 0 or cursor > self._sequence
+        start = 0 if reset else bisect.bisect_left(self._seqs, cursor)
+        return {
+            'cursor': self._sequence,
+            'reset': reset,
+            'articles': [self._expand(row) for row in self._rows[start:]],
+            'dates': self.dates(),
+            'dateCounts': self.date_counts()
+        }
+
+    def date_counts(self) -> List[Dict]:
+        """Dates with articles and how many each has, newest first"""
+        return [{'date': article_date, 'count': len(self._by_date[article_date])}
+                for article_date in sorted(self._by_date, reverse=True)]
+
+    def page(self, article_date: str, page: int = 0, page_size: int = 20) -> Dict:
+        """One page of a date's articles, in the order they were found"""
+        rows = self._by_date.get(article_date, [])
+        page_size = max(1, page_size)
+        start = max(0, page) * page_size
+        return {
+            'date': article_date,
+            'page': page,
+            'pageSize': page_size,
+            'total': len(rows),
+            'pages': (len(rows) + page_size - 1) // page_size,
+            'articles': [self._expand(row) for row in rows[start:start + page_size]]
+        }
+
+    def overview(self, page_size: int = 20) -> Dict:
+        """Dates with counts plus the first page of the newest date, for rendering a feed"""
+        date_counts = self.date_counts()
+        return {
+            'cursor': self._sequence,
+            'dates': self.dates(),
+            'dateCounts': date_counts,
+            'page': self.page(date_counts[0]['date'], 0, page_size) if date_counts else None
+        }
+
+    def simhashes(self) -> List[int]:
+        """Headline fingerprints of the retained articles, for near-duplicate checks"""
+        return [row[7] for row in self._rows if row[7]]
+
+    def dates(self) -> List[str]:
+        return sorted(article_date for article_date in self._by_date if article_date)
+
+    def to_payload(self) -> Dict:
+        """Compact form carried across continue-as-new, unused sources are dropped"""
+        sources: List[str] = []
+        index: Dict[int, int] = {}
+        rows = []
+        for row in self._rows:
+            source_idx = row[5]
+            if source_idx not in index:
+                index[source_idx] = len(sources)
+                sources.append(self._sources[source_idx])
+            rows.append(row[:5] + [index[source_idx]] + row[6:])
+        return {
+            'version': STATE_VERSION,
+            'sequence': self._sequence,
+            'sources': sources,
+            'rows': rows,
+            'index': self._index.to_payload(),
+            # JSON object keys must be strings
+            'thumbnails': {f"{key:016x}": thumbnail for key, thumbnail in self._thumbnails.items()}
+                          if self.keep_thumbnails else {}
+        }
+
+    def load_payload(self, payload: Dict) -> None:
+        self._sequence = payload.get('sequence', 0)
+        self._sources = list(payload.get('sources', []))
+        self._source_index = {source: idx for idx, source in enumerate(self._sources)}
+        self._rows = [list(row) for row in payload.get('rows', [])]
+        if payload.get('version', 1) < 2:
+            # Version 1 rows carried the fingerprint as hex and had no index
+            for row in self._rows:
+                row[1] = int(row[1], 16)
+        if payload.get('version', 1) < 3:
+            # Articles from before near-duplicate detection have no headline fingerprint
+            for row in self._rows:
+                row.append(0)
+        if payload.get('version', 1) < 4:
+            # Articles from before watchlist tagging mention no entities
+            for row in self._rows:
+                row.append([])
+        self._thumbnails = {int(key, 16): thumbnail for key, thumbnail in payload.get('thumbnails', {}).items()} \
+            if self.keep_thumbnails else {}
+        rekeyed = []
+        if payload.get('version', 1) < 5:
+            # Fingerprints from before links were keyed canonically, recomputed where the row still has
+            # its title and link. Rows without content and articles already trimmed keep the old ones
+            for row in self._rows:
+                if row[3] or row[4]:
+                    key = article_fingerprint(row[3], row[4], row[2])
+                    if key != row[1]:
+                        if row[1] in self._thumbnails:
+                            self._thumbnails[key] = self._thumbnails.pop(row[1])
+                        row[1] = key
+                        rekeyed.append(key)
+        self._seqs = [row[0] for row in self._rows]
+        self._partition()
+        if 'index' in payload:
+            self._index.load_payload(payload['index'])
+            self._index.load_fingerprints(rekeyed)
+        else:
+            self._index.load_fingerprints(row[1] for row in self._rows)
+
+    def load_articles(self, articles: List[Dict]) -> None:
+        """Rebuild from a plain list of article dicts (previousResults from older runs)"""
+        for article in articles:
+            self.add(Article.from_result(article))
+
+    def _partition(self) -> None:
+        self._by_date = {}
+        for row in self._rows:
+            self._by_date.setdefault(row[2], []).append(row)
+
+    def _intern_source(self, source: str) -> int:
+        idx = self._source_index.get(source)
+        if idx is None:
+            idx = len(self._sources)
+            self._sources.append(source)
+            self._source_index[source] = idx
+        return idx
+
+    def _expand(self, row: list) -> Dict:
+        seq, key, article_date, title, link, source_idx, snippet, _simhash, entities = row
+        return {
+            'id': f"{key:016x}",
+            'seq': seq,
+            'title': title,
+            'link': link,
+            'source': self._sources[source_idx],
+            'date': article_date,
+            'thumbnail': self._thumbnails.get(key, ''),
+            'snippet': snippet,
+            'entities': entities
+        }
+
+    def _cutoff_date(self) -> Optional[str]:
+        if not self.retention_days or not self._rows:
+            return None
+        newest = max(row[2] for row in self._rows)
+        try:
+            newest_date = date.fromisoformat(newest)
+        except ValueError:
+            # Dates that aren't YYYY-MM-DD can't be windowed, fall back to the count limit
+            return None
+        return str(newest_date - timedelta(days=self.retention_days - 1))
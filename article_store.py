@@ -0,0 +1,312 @@
+import abc
+import coloredlogs
+import dataclasses
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from logging import getLogger
+from typing import Dict, Iterable, List, Optional
+
+from article_state import article_id
+from config import get_config
+from news_data import Article
+
+logger = getLogger(__name__)
+coloredlogs.install(level='INFO')
+
+# Bodies no feed links to are kept this long, search_news stores them before the workflow links them
+ORPHAN_BODY_SECONDS = 24 * 60 * 60
+
+
+class ArticleStore(abc.ABC):
+    """
+    Article bodies and each feed's article list, outside workflow state.
+
+    search_news writes the bodies (title, link, snippet, thumbnail...)
+    keyed by article ID. The feed workflow only keeps IDs, sequence
+    numbers and dates, and links its articles to a feed with
+    link_articles. The web tier reads feeds from here by feed ID and date.
+    Subclasses implement the storage, this one defines the interface.
+
+    Sequence numbers are only unique within a run that starts at 0. A
+    replacement workflow, or a continue-as-new that dropped its state,
+    links with reset so the previous run's rows don't come back in pages,
+    counts or since().
+    """
+
+    @abc.abstractmethod
+    def store_bodies(self, articles: Iterable[Dict]) -> None:
+        ...
+
+    @abc.abstractmethod
+    def link_articles(self, feed_id: str, cursor: int, articles: Iterable[Dict], removed_seqs: Iterable[int],
+                      reset: bool = False) -> None:
+        ...
+
+    @abc.abstractmethod
+    def snippets(self, article_ids: Iterable[str]) -> Dict[str, str]:
+        ...
+
+    @abc.abstractmethod
+    def since(self, feed_id: str, cursor: int) -> Dict:
+        ...
+
+    @abc.abstractmethod
+    def date_counts(self, feed_id: str) -> List[Dict]:
+        ...
+
+    @abc.abstractmethod
+    def page(self, feed_id: str, article_date: str, page: int = 0, page_size: int = 20) -> Dict:
+        ...
+
+    def overview(self, feed_id: str, page_size: int = 20) -> Dict:
+        """Same shape as ArticleState.overview"""
+        date_counts = self.date_counts(feed_id)
+        return {
+            'cursor': self.cursor(feed_id),
+            'dates': sorted(entry['date'] for entry in date_counts),
+            'dateCounts': date_counts,
+            'page': self.page(feed_id, date_counts[0]['date'], 0, page_size) if date_counts else None
+        }
+
+    @abc.abstractmethod
+    def cursor(self, feed_id: str) -> int:
+        ...
+
+
+class SqliteArticleStore(ArticleStore):
+    """Article store in a local SQLite file, shared by the workers and web tier on one host"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS article_bodies ("
+            "  article_id TEXT PRIMARY KEY, title TEXT NOT NULL, link TEXT NOT NULL, source TEXT NOT NULL,"
+            "  snippet TEXT NOT NULL, thumbnail TEXT NOT NULL, stored_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS feed_articles ("
+            "  feed_id TEXT NOT NULL, seq INTEGER NOT NULL, article_id TEXT NOT NULL, date TEXT NOT NULL,"
+            "  PRIMARY KEY (feed_id, seq)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS feed_articles_by_date ON feed_articles(feed_id, date, seq);"
+            "CREATE INDEX IF NOT EXISTS feed_articles_by_article ON feed_articles(article_id);"
+            "CREATE TABLE IF NOT EXISTS feeds (feed_id TEXT PRIMARY KEY, cursor INTEGER NOT NULL, updated_at REAL NOT NULL);"
+        )
+        # Watchlist entities are per feed article, stores from before watchlist tagging lack the column
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(feed_articles)")]
+        if 'entities' not in columns:
+            self._db.execute("ALTER TABLE feed_articles ADD COLUMN entities TEXT NOT NULL DEFAULT '[]'")
+
+    def store_bodies(self, articles: Iterable[Dict]) -> None:
+        now = time.time()
+        rows = [(article['id'], article.get('title', 'No Title'), article.get('link', '#'),
+                 article.get('source', 'Unknown'), article.get('snippet', '') or '',
+                 article.get('thumbnail', '') or '', now) for article in articles]
+        if not rows:
+            return
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT INTO article_bodies(article_id, title, link, source, snippet, thumbnail, stored_at) "
+                "VALUES(?, ?, ?, ?, ?, ?, ?) ON CONFLICT(article_id) DO UPDATE SET stored_at = excluded.stored_at",
+                rows
+            )
+
+    def link_articles(self, feed_id: str, cursor: int, articles: Iterable[Dict], removed_seqs: Iterable[int],
+                      reset: bool = False) -> None:
+        rows = [(feed_id, article['seq'], article['id'], article['date'], json.dumps(article.get('entities') or []))
+                for article in articles]
+        removed = [(feed_id, seq) for seq in removed_seqs]
+        with self._transaction() as db:
+            if reset:
+                db.execute("DELETE FROM feed_articles WHERE feed_id = ?", (feed_id,))
+            db.executemany(
+                "INSERT INTO feed_articles(feed_id, seq, article_id, date, entities) VALUES(?, ?, ?, ?, ?) "
+                "ON CONFLICT(feed_id, seq) DO UPDATE SET article_id = excluded.article_id, date = excluded.date, "
+                "entities = excluded.entities",
+                rows
+            )
+            db.executemany("DELETE FROM feed_articles WHERE feed_id = ? AND seq = ?", removed)
+            db.execute(
+                "INSERT INTO feeds(feed_id, cursor, updated_at) VALUES(?, ?, ?) "
+                "ON CONFLICT(feed_id) DO UPDATE SET cursor = excluded.cursor, updated_at = excluded.updated_at",
+                (feed_id, cursor, time.time())
+            )
+            if removed or reset:
+                # Bodies nothing links to any more, old enough not to be waiting for a link
+                db.execute(
+                    "DELETE FROM article_bodies WHERE stored_at < ? AND NOT EXISTS "
+                    "(SELECT 1 FROM feed_articles WHERE feed_articles.article_id = article_bodies.article_id)",
+                    (time.time() - ORPHAN_BODY_SECONDS,)
+                )
+
+    def snippets(self, article_ids: Iterable[str]) -> Dict[str, str]:
+        article_ids = list(dict.fromkeys(article_ids))
+        rows = []
+        with self._lock:
+            # SQLite caps the number of bound parameters, look them up in chunks
+            for start in range(0, len(article_ids), 500):
+                chunk = article_ids[start:start + 500]
+                rows += self._db.execute(
+                    f"SELECT article_id, snippet FROM article_bodies WHERE article_id IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+        return dict(rows)
+
+    @contextmanager
+    def _transaction(self):
+        """One transaction on the shared connection, rolled back if anything in it fails. Reads in it see one snapshot"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                yield self._db
+                self._db.execute("COMMIT")
+            except BaseException:
+                # Left open, every later BEGIN on this connection would fail
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+
+    def cursor(self, feed_id: str) -> int:
+        with self._transaction() as db:
+            return self._cursor(db, feed_id)
+
+    def since(self, feed_id: str, cursor: int) -> Dict:
+        """Same shape as ArticleState.since"""
+        # The cursor, the rows before it and the counts come from one snapshot, rows committed
+        # meanwhile are left for the next call instead of being sent twice
+        with self._transaction() as db:
+            current = self._cursor(db, feed_id)
+            reset = cursor < 0 or cursor > current
+            rows = db.execute(
+                "SELECT f.seq, f.article_id, f.date, b.title, b.link, b.source, b.snippet, b.thumbnail, f.entities "
+                "FROM feed_articles f JOIN article_bodies b ON b.article_id = f.article_id "
+                "WHERE f.feed_id = ? AND f.seq >= ? AND f.seq < ? ORDER BY f.seq",
+                (feed_id, 0 if reset else cursor, current)
+            ).fetchall()
+            date_counts = self._date_counts(db, feed_id)
+        return {
+            'cursor': current,
+            'reset': reset,
+            'articles': [self._expand(row) for row in rows],
+            'dates': sorted(entry['date'] for entry in date_counts),
+            'dateCounts': date_counts
+        }
+
+    def overview(self, feed_id: str, page_size: int = 20) -> Dict:
+        with self._transaction() as db:
+            date_counts = self._date_counts(db, feed_id)
+            return {
+                'cursor': self._cursor(db, feed_id),
+                'dates': sorted(entry['date'] for entry in date_counts),
+                'dateCounts': date_counts,
+                'page': self._page(db, feed_id, date_counts[0]['date'], 0, page_size) if date_counts else None
+            }
+
+    def date_counts(self, feed_id: str) -> List[Dict]:
+        with self._transaction() as db:
+            return self._date_counts(db, feed_id)
+
+    def page(self, feed_id: str, article_date: str, page: int = 0, page_size: int = 20) -> Dict:
+        with self._transaction() as db:
+            return self._page(db, feed_id, article_date, page, page_size)
+
+    @staticmethod
+    def _cursor(db, feed_id: str) -> int:
+        row = db.execute("SELECT cursor FROM feeds WHERE feed_id = ?", (feed_id,)).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _date_counts(db, feed_id: str) -> List[Dict]:
+        rows = db.execute(
+            "SELECT date, COUNT(*) FROM feed_articles WHERE feed_id = ? GROUP BY date ORDER BY date DESC",
+            (feed_id,)
+        ).fetchall()
+        return [{'date': article_date, 'count': count} for article_date, count in rows if article_date]
+
+    def _page(self, db, feed_id: str, article_date: str, page: int, page_size: int) -> Dict:
+        page_size = max(1, page_size)
+        total = db.execute("SELECT COUNT(*) FROM feed_articles WHERE feed_id = ? AND date = ?",
+                           (feed_id, article_date)).fetchone()[0]
+        rows = db.execute(
+            "SELECT f.seq, f.article_id, f.date, b.title, b.link, b.source, b.snippet, b.thumbnail, f.entities "
+            "FROM feed_articles f JOIN article_bodies b ON b.article_id = f.article_id "
+            "WHERE f.feed_id = ? AND f.date = ? ORDER BY f.seq LIMIT ? OFFSET ?",
+            (feed_id, article_date, page_size, max(0, page) * page_size)
+        ).fetchall()
+        return {
+            'date': article_date,
+            'page': page,
+            'pageSize': page_size,
+            'total': total,
+            'pages': (total + page_size - 1) // page_size,
+            'articles': [self._expand(row) for row in rows]
+        }
+
+    @staticmethod
+    def _expand(row) -> Dict:
+        seq, article_id, article_date, title, link, source, snippet, thumbnail, entities = row
+        return {
+            'id': article_id,
+            'seq': seq,
+            'title': title,
+            'link': link,
+            'source': source,
+            'date': article_date,
+            'thumbnail': thumbnail,
+            'snippet': snippet,
+            'entities': json.loads(entities)
+        }
+
+
+def store_search_results(store: ArticleStore, topic_date: str, results: List[Article]) -> List[Article]:
+    """
+    Write search results to the store and return them without their bodies.
+
+    The ID stored is the fingerprint the workflow computes from the title,
+    link and date it gets back (article_fingerprint keys the link in its
+    canonical form, the link stored is the one the outlet gave).
+    """
+    slim = [Article(title=item.title, link=item.link, source=item.source, date=topic_date, snippet='')
+            for item in results]
+    store.store_bodies({'id': article_id(article.title, article.link, topic_date),
+                        'title': article.title,
+                        'link': article.link,
+                        'source': article.source,
+                        'snippet': item.snippet,
+                        'thumbnail': item.thumbnail} for article, item in zip(slim, results))
+    return slim
+
+
+def with_stored_snippets(store: ArticleStore, results: Dict[str, List[Article]]) -> Dict[str, List[Article]]:
+    """The results with the snippets store_search_results left out read back from the store"""
+    ids = {id(item): article_id(item.title, item.link, item.date)
+           for items in results.values() for item in items if not item.snippet}
+    if not ids:
+        return results
+    snippets = store.snippets(ids.values())
+    return {date_key: [dataclasses.replace(item, snippet=snippets.get(ids[id(item)], '')) if id(item) in ids else item
+                       for item in items]
+            for date_key, items in results.items()}
+
+
+def create_article_store(store_cfg: dict) -> Optional[ArticleStore]:
+    """Build the article store selected in config.py's newsfeed.article_store section, None when it is off"""
+    if not store_cfg.get('enabled'):
+        return None
+    backend = store_cfg.get('backend') or 'sqlite'
+    if backend == 'sqlite':
+        return SqliteArticleStore(store_cfg.get('path') or 'articles.db')
+    raise ValueError(f"Unknown article store backend: {backend}")
+
+
+_article_store = None
+
+
+def get_article_store() -> Optional[ArticleStore]:
+    """The process wide article store, None unless ARTICLE_STORE_ENABLED is set"""
+    global _article_store
+    if _article_store is None:
+        _article_store = create_article_store(get_config()['newsfeed']['article_store'])
+    return _article_store
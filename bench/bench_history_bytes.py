@@ -0,0 +1,84 @@
+"""
+History bytes per search, raw SerpAPI results vs projected Articles.
+
+Each feed search puts the search_news result plus the
+collapse_near_duplicates input and result into workflow history. This
+converts those payloads with the default data converter twice: once as
+raw news_results dicts (what search_news used to return), once as the
+Article records it returns now. With --serpapi-fields the fake results
+get the extra fields live SerpAPI news results carry (nested source,
+iso_date, small thumbnails, related stories...).
+
+    python bench/bench_history_bytes.py --results 100 --searches 50
+"""
+import argparse
+import dataclasses
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import temporalio.converter  # noqa: E402
+
+from fake_serpapi import fake_news_results  # noqa: E402
+from near_duplicates import simhash, title_tokens  # noqa: E402
+from news_data import Article, NearDuplicateInput  # noqa: E402
+
+SEARCH_DATE = '2025-01-01'
+
+
+def with_serpapi_fields(item: dict) -> dict:
+    """Approximate a live SerpAPI Google News result around the fake one"""
+    digest = item['link'].rsplit('/', 1)[-1].split('?')[0]
+    return dict(
+        item,
+        source={'name': item['source'], 'icon': f"https://encrypted-tbn0.gstatic.com/faviconV2?url={digest}",
+                'authors': [f"Reporter {digest[:4]}"]},
+        iso_date='2025-01-01T08:00:00Z',
+        thumbnail_small=f"https://news.example.com/thumbs/{digest}-small.jpg",
+        story_token=f"CAAqNggKIjBDQklTSGpvSmMzUnZjbmt0TXpZd1NoRUtEd2pzZ{digest}",
+        stories=[{'position': n + 1, 'title': f"Related {digest} {n}", 'link': f"https://other.example.com/{digest}/{n}",
+                  'source': {'name': f"Other {n}"}, 'date': "3 hours ago", 'iso_date': '2025-01-01T05:00:00Z'}
+                 for n in range(3)],
+    )
+
+
+def payload_bytes(converter, *values) -> int:
+    return sum(payload.ByteSize() for payload in converter.to_payloads(list(values)))
+
+
+def collapsed_raw(items: list) -> list:
+    # What collapse_near_duplicates returned for raw dicts, every field plus simhash
+    return [dict(item, simhash=simhash(title_tokens(item['title'])))
+            for item in items]
+
+
+def main(args) -> None:
+    converter = temporalio.converter.default().payload_converter
+    raw_total = projected_total = 0
+    for search in range(args.searches):
+        raw = fake_news_results(f"topic {search}", args.results)
+        if args.serpapi_fields:
+            raw = [with_serpapi_fields(item) for item in raw]
+        articles = [Article.from_result(item, SEARCH_DATE) for item in raw]
+        collapsed = [dataclasses.replace(article, simhash=simhash(title_tokens(article.title))) for article in articles]
+
+        raw_total += payload_bytes(converter, {SEARCH_DATE: raw},
+                                   NearDuplicateInput({SEARCH_DATE: raw}), {SEARCH_DATE: collapsed_raw(raw)})
+        projected_total += payload_bytes(converter, {SEARCH_DATE: articles},
+                                         NearDuplicateInput({SEARCH_DATE: articles}), {SEARCH_DATE: collapsed})
+
+    print(f"{args.searches} searches of {args.results} results"
+          f"{' with SerpAPI fields' if args.serpapi_fields else ''}")
+    print(f"  raw news_results : {raw_total:,} bytes ({raw_total // args.searches:,} per search)")
+    print(f"  Article records  : {projected_total:,} bytes ({projected_total // args.searches:,} per search)")
+    print(f"  saved            : {1 - projected_total / raw_total:.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--results', type=int, default=100, help="results per search")
+    parser.add_argument('--searches', type=int, default=50)
+    parser.add_argument('--serpapi-fields', action=argparse.BooleanOptionalAction, default=True,
+                        help="add the extra fields live SerpAPI results have")
+    main(parser.parse_args())
@@ -0,0 +1,100 @@
+"""
+Startup import time of the web tier, workflows and workers, with a guard on heavy imports.
+
+Each entry point is imported in a fresh interpreter with -X importtime,
+a few times, and the fastest run is reported with its heaviest direct
+imports. The web tier and the workflow modules (which the sandbox
+re-imports for every workflow run) must not pull in the HTTP, Slack,
+scraping or AWS clients the activities load lazily. The script exits
+with status 1 if one of them does, or if an entry point is over
+--max-ms. Also times preparing the workflows in the sandbox.
+
+    python bench/bench_import_time.py --runs 3
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only activities may load these, and only when they run
+HEAVY = ['slack_sdk', 'httpx', 'aiohttp', 'scrapegraphai', 'serpapi', 'boto3', 'pandas', 'smtplib',
+         'watchlist_tagger', 'news_search', 'slack_notify']
+# Entry point -> whether it has to stay clear of HEAVY
+ENTRY_POINTS = {
+    'run_web': True,
+    'newsfeed_workflow': True,
+    'term_collector_workflow': True,
+    'search_schedule': True,
+    'activities': True,
+    'run_worker': True,
+}
+
+SANDBOX_SCRIPT = """
+import asyncio, time
+from temporalio.worker.workflow_sandbox import SandboxedWorkflowRunner
+from temporalio.workflow import _Definition
+from newsfeed_workflow import NewsfeedWorkflow
+from term_collector_workflow import TermCollectorWorkflow
+from search_schedule import SearchTickWorkflow
+
+async def main():
+    start = time.perf_counter()
+    for workflow in (NewsfeedWorkflow, TermCollectorWorkflow, SearchTickWorkflow):
+        SandboxedWorkflowRunner().prepare_workflow(_Definition.must_from_class(workflow))
+    print(time.perf_counter() - start)
+
+asyncio.run(main())
+"""
+
+
+def import_times(module: str) -> list:
+    """(depth, cumulative microseconds, name) for every import made by importing the module"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        entries.append((depth, int(cumulative), name.strip()))
+    return entries
+
+
+def main(args) -> None:
+    failures = []
+    for module, must_be_light in ENTRY_POINTS.items():
+        runs = [import_times(module) for _ in range(args.runs)]
+        entries = min(runs, key=lambda run: run[-1][1])
+        total = entries[-1][1] / 1000
+        imported = set(name for _, _, name in entries)
+        heavy = sorted(name for name in HEAVY if name in imported)
+        direct = sorted((entry for entry in entries if entry[0] == 1), key=lambda entry: -entry[1])[:args.top]
+        print(f"{module}: {total:.0f}ms, {len(entries)} modules")
+        print("  " + ", ".join(f"{name} {cumulative / 1000:.0f}ms" for _, cumulative, name in direct))
+        if must_be_light and heavy:
+            failures.append(f"{module} imports {', '.join(heavy)}")
+        if args.max_ms and total > args.max_ms:
+            failures.append(f"{module} takes {total:.0f}ms to import (over {args.max_ms}ms)")
+
+    result = subprocess.run([sys.executable, '-c', SANDBOX_SCRIPT], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode == 0:
+        print(f"sandbox: {float(result.stdout.split()[-1]) * 1000:.0f}ms to prepare the three workflows")
+    else:
+        failures.append(f"sandbox preparation failed:\n{result.stderr[-2000:]}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=3, help="imports per entry point, the fastest is kept")
+    parser.add_argument('--top', type=int, default=5, help="heaviest direct imports to list")
+    parser.add_argument('--max-ms', type=float, default=0, help="fail any entry point slower than this, 0 for no limit")
+    main(parser.parse_args())
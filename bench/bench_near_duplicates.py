@@ -0,0 +1,95 @@
+"""
+Near-duplicate detection throughput and accuracy on synthetic articles.
+
+Generates distinct stories, then re-shares some of them the way
+aggregators do: another outlet's suffix on the headline, tracking
+parameters and AMP links, reworded stopwords. Reports articles per second
+for the full collapse and how many copies were caught or wrongly merged.
+
+    python bench/bench_near_duplicates.py --stories 20000 --copies 0.5
+"""
+import argparse
+import dataclasses
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from near_duplicates import canonical_url, collapse_near_duplicates, simhash, title_tokens  # noqa: E402
+from news_data import Article  # noqa: E402
+
+OUTLETS = ['Reuters', 'AP News', 'CNN', 'BBC', 'The Guardian', 'Bloomberg', 'Yahoo News', 'Fox News']
+VOCABULARY = [f"word{i}" for i in range(5000)]
+
+
+def make_story(rng: random.Random, i: int) -> Article:
+    words = rng.sample(VOCABULARY, rng.randint(6, 12))
+    return Article(
+        title=' '.join(words).capitalize(),
+        link=f"https://news{i % 97}.example.com/{i}/{'-'.join(words[:4])}",
+        source=rng.choice(OUTLETS),
+        snippet=' '.join(rng.sample(VOCABULARY, 20)),
+        # Which story a copy came from, carried through the collapse
+        thumbnail=str(i),
+    )
+
+
+def make_copy(rng: random.Random, story: Article) -> Article:
+    words = story.title.split()
+    variant = rng.randrange(3)
+    if variant == 0:
+        title = f"{story.title} - {rng.choice(OUTLETS)}"
+    elif variant == 1:
+        title = ' '.join(words[:2] + ['the'] + words[2:]).upper()
+    else:
+        title = f"{story.title}!"
+    link = rng.choice([
+        f"{story.link}?utm_source=twitter&utm_medium=social",
+        f"{story.link.replace('https://', 'http://www.')}/amp/",
+        f"https://syndicated.example.org/{story.thumbnail}-{rng.randrange(1000)}",
+    ])
+    return dataclasses.replace(story, title=title, link=link)
+
+
+def main(args) -> None:
+    rng = random.Random(args.seed)
+    stories = [make_story(rng, i) for i in range(args.stories)]
+    copies = [make_copy(rng, rng.choice(stories)) for _ in range(int(args.stories * args.copies))]
+    articles = stories + copies
+    rng.shuffle(articles)
+    total = len(articles)
+
+    start = time.perf_counter()
+    for article in articles:
+        canonical_url(article.link)
+    canonical = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for article in articles:
+        simhash(title_tokens(article.title))
+    hashing = time.perf_counter() - start
+
+    start = time.perf_counter()
+    collapsed, dropped = collapse_near_duplicates({'2025-01-01': articles}, max_distance=args.distance)
+    collapse = time.perf_counter() - start
+
+    kept_stories = [article.thumbnail for article in collapsed['2025-01-01']]
+    missed = len(kept_stories) - len(set(kept_stories))
+    wrongly_merged = args.stories - len(set(kept_stories))
+
+    print(f"{total} articles ({args.stories} stories, {len(copies)} copies), max distance {args.distance}")
+    print(f"  canonical_url   : {canonical:.2f}s ({total / canonical:,.0f} articles/s)")
+    print(f"  headline simhash: {hashing:.2f}s ({total / hashing:,.0f} articles/s)")
+    print(f"  full collapse   : {collapse:.2f}s ({total / collapse:,.0f} articles/s)")
+    print(f"  dropped {dropped}, copies missed {missed}, distinct stories merged {wrongly_merged}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stories', type=int, default=20000)
+    parser.add_argument('--copies', type=float, default=0.5, help="re-shared copies per story")
+    parser.add_argument('--distance', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,77 @@
+"""
+Payload bytes and codec throughput for typical newsfeed payloads.
+
+Converts a search_news result (the fake server's news_results projected
+onto Article) and a full ArticleState continue-as-new payload
+with the default data converter, then compresses them with each
+available algorithm. Reports bytes on the wire and encode/decode speed.
+
+    python bench/bench_payload_codec.py --results 100 --articles 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import temporalio.converter  # noqa: E402
+
+from article_state import ArticleState  # noqa: E402
+from fake_serpapi import fake_news_results  # noqa: E402
+from news_data import Article  # noqa: E402
+from payload_codec import CompressionCodec, ZSTD_ENCODING  # noqa: E402
+
+
+def sample_payloads(results: int, articles: int) -> dict:
+    converter = temporalio.converter.default().payload_converter
+    search_result = {'2025-01-01': [Article.from_result(item, '2025-01-01')
+                                    for item in fake_news_results("bitcoin Apple OpenAI", results)]}
+    state = ArticleState(max_articles=articles)
+    for i in range(articles):
+        for item in fake_news_results(f"topic {i % 50}", 1):
+            state.add(Article.from_result(dict(item, title=f"{item['title']} {i}"), f"2025-01-{1 + i % 7:02d}"))
+    return {
+        f"search_news result ({results} articles)": converter.to_payloads([search_result])[0],
+        f"continue-as-new state ({articles} articles)": converter.to_payloads([state.to_payload()])[0],
+    }
+
+
+async def measure(codec: CompressionCodec, payload, rounds: int) -> tuple:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        encoded = await codec.encode([payload])
+    encode_time = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        decoded = await codec.decode(encoded)
+    decode_time = (time.perf_counter() - start) / rounds
+    assert decoded[0] == payload
+    return encoded[0].ByteSize(), encode_time, decode_time
+
+
+async def main(args) -> None:
+    codecs = {'zlib': CompressionCodec('zlib', threshold=0, level=args.level)}
+    zstd = CompressionCodec('zstd', threshold=0, level=args.level)
+    if zstd.encoding == ZSTD_ENCODING:
+        codecs['zstd'] = zstd
+    else:
+        print("zstandard is not installed, only measuring zlib")
+
+    for name, payload in sample_payloads(args.results, args.articles).items():
+        raw = payload.ByteSize()
+        print(f"{name}: {raw:,} bytes uncompressed")
+        for algorithm, codec in codecs.items():
+            size, encode_time, decode_time = await measure(codec, payload, args.rounds)
+            print(f"  {algorithm:4}: {size:,} bytes ({size / raw:.0%}), "
+                  f"encode {encode_time * 1000:.2f}ms, decode {decode_time * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--results', type=int, default=100, help="articles in the search result")
+    parser.add_argument('--articles', type=int, default=1000, help="articles in the workflow state")
+    parser.add_argument('--level', type=int, default=6)
+    parser.add_argument('--rounds', type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,76 @@
+"""
+Search throughput: pooled async search_news vs one blocking search at a time.
+
+Starts bench/fake_serpapi.py in-process and runs the same number of
+searches through both paths. The blocking path mirrors the previous
+GoogleSearch activity on a single-thread executor. The search cache is
+turned off, so repeated runs measure the same thing.
+
+    python bench/bench_search.py --searches 50 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import requests
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_serpapi import create_app  # noqa: E402
+from news_data import NewsfeedInput  # noqa: E402
+
+PORT = 8089
+
+
+def blocking_searches(url: str, queries: list) -> None:
+    for query in queries:
+        # New connection per call, like GoogleSearch(params).get_dict()
+        requests.get(url, params={'q': query, 'tbm': 'nws'}).json()
+
+
+async def pooled_searches(queries: list) -> None:
+    from activities import NewsActivities
+    await asyncio.gather(*(NewsActivities.search_news(NewsfeedInput('2025-01-01', query, []))
+                           for query in queries))
+
+
+async def main(args) -> None:
+    url = f"http://localhost:{PORT}/search.json"
+    os.environ['SERPAPI_URL'] = url
+    os.environ.setdefault('SEARCH_CONCURRENCY', str(args.concurrency))
+    # Every search has to reach the fake SerpAPI, a warm search cache would serve them all from disk
+    os.environ['SEARCH_CACHE_MAX_ENTRIES'] = '0'
+    # Import after the environment is set, and outside the timed section
+    import news_search  # noqa: F401
+
+    runner = web.AppRunner(create_app(args.latency, args.results))
+    await runner.setup()
+    await web.TCPSite(runner, 'localhost', PORT).start()
+
+    queries = [f"topic {i}" for i in range(args.searches)]
+    try:
+        start = time.perf_counter()
+        await asyncio.to_thread(blocking_searches, url, queries)
+        blocking = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await pooled_searches(queries)
+        pooled = time.perf_counter() - start
+    finally:
+        await runner.cleanup()
+
+    print(f"{args.searches} searches, {args.latency}s simulated latency")
+    print(f"  blocking, one at a time : {blocking:.2f}s ({args.searches / blocking:.1f} searches/s)")
+    print(f"  pooled async (x{args.concurrency})     : {pooled:.2f}s ({args.searches / pooled:.1f} searches/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--searches', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--results', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,55 @@
+"""
+Slack notification volume: batched notify_slack against bench/fake_slack.py.
+
+Sends a day's worth of articles through the activity with the stub
+rate limiting every few requests, and reports how many Slack calls were
+made compared to the previous one-message-per-article loop.
+
+    python bench/bench_slack.py --articles 100 --rate-limit-every 3
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_slack import create_app  # noqa: E402
+
+PORT = 8090
+
+
+async def main(args) -> None:
+    os.environ['SLACK_API_URL'] = f"http://localhost:{PORT}/api/"
+    os.environ.setdefault('SLACKAPI_KEY', 'xoxb-bench')
+    os.environ.setdefault('SLACK_MESSAGE_INTERVAL_SECONDS', '0.1')
+    from activities import NewsActivities
+
+    app = create_app(args.rate_limit_every, retry_after=1)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, 'localhost', PORT).start()
+
+    articles = [{'title': f"Story {i} <bench>", 'link': f"https://news.example.com/{i}", 'source': 'Example News'}
+                for i in range(args.articles)]
+    try:
+        start = time.perf_counter()
+        await NewsActivities.notify_slack(articles)
+        elapsed = time.perf_counter() - start
+    finally:
+        await runner.cleanup()
+
+    stats = app['stats']
+    print(f"{args.articles} articles in {elapsed:.2f}s")
+    print(f"  messages posted : {stats['messages']} (previously {args.articles})")
+    print(f"  requests made   : {stats['requests']} ({stats['rate_limited']} rate limited and retried)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--articles', type=int, default=100)
+    parser.add_argument('--rate-limit-every', type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""
+Watchlist matching: one SQL query per keyword vs the in-process matcher.
+
+The SQL path runs check_keyword's soundex UNION levenshtein_less_equal
+query once per keyword. The stand-in is SQLite with soundex and
+levenshtein_less_equal registered as functions that behave like
+Postgres' fuzzystrmatch. No Postgres or Data API is available locally,
+so --rtt-ms adds the Data API round trip each statement would pay. The
+matcher path builds a WatchlistMatcher once and matches the whole batch.
+Both paths must return the same entries for every keyword.
+
+    python bench/bench_watchlist.py --entities 20000 --keywords 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from watchlist_matcher import WatchlistMatcher, bounded_levenshtein, soundex  # noqa: E402
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'sen', 'tor', 'vi', 'del', 'an', 'gro', 'shi', 'ba', 'quo', 'ne', 'ul', 'ric']
+ENTITY_TYPES = ['person', 'organization', 'product']
+
+KEYWORD_QUERY = ("SELECT entity, entity_type FROM watchlist WHERE soundex(lower(entity)) = soundex(lower(:kw)) "
+                 "UNION "
+                 "SELECT entity, entity_type FROM watchlist WHERE levenshtein_less_equal(lower(entity), lower(:kw), 2) <= 2")
+
+
+def make_name(rng: random.Random) -> str:
+    words = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+             for _ in range(rng.randint(1, 3))]
+    return ' '.join(words)
+
+
+def make_typo(rng: random.Random, name: str) -> str:
+    chars = list(name)
+    for _ in range(rng.randint(1, 2)):
+        pos = rng.randrange(len(chars))
+        edit = rng.randrange(3)
+        if edit == 0:
+            chars[pos] = rng.choice('abcdefghijklmnopqrstuvwxyz')
+        elif edit == 1 and len(chars) > 1:
+            del chars[pos]
+        else:
+            chars.insert(pos, rng.choice('abcdefghijklmnopqrstuvwxyz'))
+    return ''.join(chars)
+
+
+def sql_stand_in(entries: list) -> sqlite3.Connection:
+    db = sqlite3.connect(':memory:')
+    db.create_function('soundex', 1, soundex, deterministic=True)
+    db.create_function('levenshtein_less_equal', 3, bounded_levenshtein, deterministic=True)
+    db.execute("CREATE TABLE watchlist (entity TEXT, entity_type TEXT, PRIMARY KEY (entity, entity_type))")
+    db.executemany("INSERT OR IGNORE INTO watchlist VALUES (?, ?)",
+                   [(entry['entity'], entry['entity_type']) for entry in entries])
+    return db
+
+
+def main(args) -> None:
+    rng = random.Random(args.seed)
+    entries = list({(name, rng.choice(ENTITY_TYPES)): None
+                    for name in (make_name(rng) for _ in range(args.entities))})
+    entries = [{'entity': name, 'entity_type': entity_type} for name, entity_type in entries]
+    keywords = []
+    for _ in range(args.keywords):
+        kind = rng.randrange(3)
+        name = rng.choice(entries)['entity']
+        keywords.append(name if kind == 0 else make_typo(rng, name) if kind == 1 else make_name(rng))
+
+    db = sql_stand_in(entries)
+    start = time.perf_counter()
+    sql_results = [sorted(db.execute(KEYWORD_QUERY, {'kw': keyword}).fetchall()) for keyword in keywords]
+    sql_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher = WatchlistMatcher(entries)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    matches = matcher.match_batch(keywords)
+    match_time = time.perf_counter() - start
+
+    mismatches = sum(sql != sorted((entry['entity'], entry['entity_type']) for entry in matched)
+                     for sql, matched in zip(sql_results, matches))
+    rtt = args.rtt_ms / 1000 * len(keywords)
+    print(f"{len(entries)} watchlist entries, {len(keywords)} keywords, "
+          f"{sum(len(matched) for matched in matches)} matches")
+    print(f"  SQL per keyword : {sql_time:.2f}s queries + {rtt:.2f}s round trips at {args.rtt_ms}ms "
+          f"({(sql_time + rtt) / len(keywords) * 1000:.1f}ms per keyword)")
+    print(f"  matcher build   : {build_time:.2f}s (once per watchlist version)")
+    print(f"  matcher batch   : {match_time:.3f}s ({match_time / len(keywords) * 1000:.2f}ms per keyword)")
+    print(f"  keywords with different results: {mismatches}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entities', type=int, default=20000)
+    parser.add_argument('--keywords', type=int, default=200)
+    parser.add_argument('--rtt-ms', type=float, default=20, help="Data API round trip per statement")
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
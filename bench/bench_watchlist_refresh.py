@@ -0,0 +1,192 @@
+"""
+Watchlist refresh: one INSERT per row vs batched inserts and a table swap.
+
+The old refresh truncated the watchlist and inserted every row with its
+own execute_statement call, each one committed on its own. The new one
+streams the CSV into batch_execute_statement calls against a staging
+table and swaps it in within one transaction. No Postgres or Data API
+is available locally, so a small rds-data stand-in runs the statements
+on SQLite, and --rtt-ms adds the round trip each Data API call would
+pay. A reader thread counts the watchlist during each refresh to show
+what check_keyword could see half way through.
+
+    python bench/bench_watchlist_refresh.py --entities 20000 --batch-size 1000
+"""
+import argparse
+import io
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_watchlist import ENTITY_TYPES, make_name  # noqa: E402
+from watchlist_refresh import bulk_load_watchlist, iter_watchlist_csv, record_parameters, watchlist_table_sql  # noqa: E402
+
+DB_ARGS = {'secretArn': 'secret', 'resourceArn': 'cluster', 'database': 'postgres'}
+ROW_INSERT_SQL = ("INSERT INTO watchlist(entity, entity_type, create_datetime) "
+                  "VALUES(:entity, :entity_type, timezone('UTC', now()))")
+
+
+class SqliteDataApi:
+    """The rds-data calls the refresh makes, run on SQLite and counted"""
+
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.create_function('now', 0, lambda: time.strftime('%Y-%m-%d %H:%M:%S'))
+        self.db.create_function('timezone', 2, lambda zone, value: value)
+        self.calls = 0
+        self.transaction = None
+
+    def _sql(self, sql: str):
+        sql = sql.strip().rstrip(';')
+        lowered = sql.lower()
+        # Postgres only: the extension, index renames and the bare commit the old refresh sent
+        if lowered.startswith(('create extension', 'alter index', 'commit')):
+            return None
+        if lowered.startswith('truncate table'):
+            return 'DELETE FROM' + sql[len('truncate table'):]
+        return re.sub(r'ON CONFLICT DO NOTHING', '', sql, flags=re.I).replace('INSERT INTO', 'INSERT OR IGNORE INTO')
+
+    @staticmethod
+    def _params(parameters) -> dict:
+        return {param['name']: next(iter(param['value'].values())) for param in parameters or []}
+
+    def _check_transaction(self, transactionId):
+        if transactionId is not None and transactionId != self.transaction:
+            raise ValueError(f"unknown transaction {transactionId}")
+
+    def execute_statement(self, sql, parameters=None, transactionId=None, **db):
+        self.calls += 1
+        self._check_transaction(transactionId)
+        sql = self._sql(sql)
+        if sql is not None:
+            self.db.execute(sql, self._params(parameters))
+        return {'numberOfRecordsUpdated': 1}
+
+    def batch_execute_statement(self, sql, parameterSets, transactionId=None, **db):
+        self.calls += 1
+        self._check_transaction(transactionId)
+        rows = [self._params(params) for params in parameterSets]
+        if transactionId is not None:
+            self.db.executemany(self._sql(sql), rows)
+        else:
+            # Each call is its own transaction unless it is part of one
+            with self.db:
+                self.db.execute("BEGIN")
+                self.db.executemany(self._sql(sql), rows)
+        return {'updateResults': [{} for _ in parameterSets]}
+
+    def begin_transaction(self, **db):
+        self.calls += 1
+        self.transaction = uuid.uuid4().hex
+        self.db.execute("BEGIN IMMEDIATE")
+        return {'transactionId': self.transaction}
+
+    def commit_transaction(self, transactionId, **arns):
+        self.calls += 1
+        self._check_transaction(transactionId)
+        self.db.execute("COMMIT")
+        self.transaction = None
+        return {'transactionStatus': 'Transaction Committed'}
+
+    def rollback_transaction(self, transactionId, **arns):
+        self.calls += 1
+        self._check_transaction(transactionId)
+        self.db.execute("ROLLBACK")
+        self.transaction = None
+        return {'transactionStatus': 'Rollback Complete'}
+
+
+def row_by_row_refresh(client, records) -> int:
+    """What refresh did before: truncate, then one committed INSERT per row"""
+    client.execute_statement(watchlist_table_sql(), **DB_ARGS)
+    client.execute_statement("truncate table watchlist", **DB_ARGS)
+    client.execute_statement('create extension IF NOT EXISTS fuzzystrmatch;', **DB_ARGS)
+    sent = 0
+    for record in records:
+        client.execute_statement(ROW_INSERT_SQL, record_parameters(record), **DB_ARGS)
+        sent += 1
+    client.execute_statement('commit;', **DB_ARGS)
+    return sent
+
+
+class Reader(threading.Thread):
+    """Counts the watchlist in a loop, like check_keyword loading it mid-refresh"""
+
+    def __init__(self, path: str):
+        super().__init__(daemon=True)
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.counts = set()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                self.counts.add(self.db.execute("SELECT count(*) FROM watchlist").fetchone()[0])
+            except sqlite3.OperationalError:
+                # The table can be missing for a moment, check_keyword would fail here
+                pass
+            time.sleep(0.001)
+
+
+def make_csv(rng: random.Random, entities: int) -> bytes:
+    lines = ["entity,entity_type"]
+    lines += [f"{make_name(rng)},{rng.choice(ENTITY_TYPES)}" for _ in range(entities)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def run(path: str, label: str, refresh, csv_body: bytes, previous: int, rtt_ms: float) -> int:
+    client = SqliteDataApi(path)
+    reader = Reader(path)
+    reader.start()
+    start = time.perf_counter()
+    sent = refresh(client, iter_watchlist_csv(io.BytesIO(csv_body)))
+    elapsed = time.perf_counter() - start
+    reader.running = False
+    reader.join()
+    loaded = client.db.execute("SELECT count(*) FROM watchlist").fetchone()[0]
+    partial = sorted(count for count in reader.counts if count not in (previous, loaded))
+    rtt = client.calls * rtt_ms / 1000
+    print(f"  {label:12}: {client.calls:,} Data API calls, {elapsed:.2f}s local + {rtt:.1f}s round trips "
+          f"at {rtt_ms}ms, {sent:,} sent, {loaded:,} loaded")
+    print(f"  {'':12}  reader saw {len(partial):,} partial watchlists"
+          f"{f' (from {partial[0]:,} to {partial[-1]:,} rows)' if partial else ''}")
+    return loaded
+
+
+def main(args) -> None:
+    rng = random.Random(args.seed)
+    csv_body = make_csv(rng, args.entities)
+    start = time.perf_counter()
+    parsed = sum(1 for _ in iter_watchlist_csv(io.BytesIO(csv_body)))
+    print(f"{parsed:,} CSV rows ({len(csv_body):,} bytes) streamed in {time.perf_counter() - start:.3f}s")
+
+    path = os.path.join(args.dir, 'bench_watchlist_refresh.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    print("refresh over a previous watchlist half the size")
+    for label, refresh in [('row by row', row_by_row_refresh),
+                           ('batched', lambda client, records: bulk_load_watchlist(client, DB_ARGS, records,
+                                                                                   args.batch_size))]:
+        # Both refreshes start from the same previous watchlist, which readers should keep seeing
+        previous_csv = make_csv(random.Random(args.seed + 1), args.entities // 2)
+        bulk_load_watchlist(SqliteDataApi(path), DB_ARGS, iter_watchlist_csv(io.BytesIO(previous_csv)))
+        previous = SqliteDataApi(path).db.execute("SELECT count(*) FROM watchlist").fetchone()[0]
+        run(path, label, refresh, csv_body, previous, args.rtt_ms)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entities', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=1000, help="parameter sets per batch_execute_statement")
+    parser.add_argument('--rtt-ms', type=float, default=20, help="Data API round trip per call")
+    parser.add_argument('--dir', default='/tmp')
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
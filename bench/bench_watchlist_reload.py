@@ -0,0 +1,112 @@
+"""
+Watchlist reload while checks are running: drop-and-rebuild vs versioned snapshots.
+
+Checker threads match keyword batches back to back while the watchlist
+is reloaded a few times. In the old scheme refresh set the worker's
+matcher to None, and the next check rebuilt it inline while every other
+check waited for it. With VersionedWatchlist the new version is built in
+a background thread and swapped in, and checks keep using the snapshot
+they have. Reports check latency (median, p99 and max) during the reloads.
+
+    python bench/bench_watchlist_reload.py --entities 20000 --reloads 3
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_watchlist import ENTITY_TYPES, make_name, make_typo  # noqa: E402
+from watchlist_matcher import WatchlistMatcher  # noqa: E402
+from watchlist_snapshot import VersionedWatchlist  # noqa: E402
+
+
+class DropAndRebuild:
+    """What get_watchlist_matcher did before: a global rebuilt on first use after refresh"""
+
+    def __init__(self, load):
+        self._load = load
+        self._matcher = None
+        self._lock = threading.Lock()
+
+    def get(self) -> WatchlistMatcher:
+        if self._matcher is None:
+            with self._lock:
+                if self._matcher is None:
+                    self._matcher = self._load()[1]
+        return self._matcher
+
+    def refresh(self) -> None:
+        self._matcher = None
+
+
+def run(label: str, source, refresh, keywords: list, args) -> None:
+    latencies = []
+    done = threading.Event()
+
+    def check():
+        rng = random.Random()
+        while not done.is_set():
+            batch = rng.sample(keywords, args.batch)
+            start = time.perf_counter()
+            source.get().match_batch(batch)
+            latencies.append(time.perf_counter() - start)
+
+    source.get()
+    threads = [threading.Thread(target=check) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for _ in range(args.reloads):
+        time.sleep(args.interval)
+        refresh()
+    time.sleep(args.interval)
+    done.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"  {label:16}: {len(latencies):,} checks, median {statistics.median(latencies) * 1000:.1f}ms, "
+          f"p99 {p99 * 1000:.1f}ms, max {latencies[-1] * 1000:.0f}ms")
+
+
+def main(args) -> None:
+    rng = random.Random(args.seed)
+    names = list(dict.fromkeys(make_name(rng) for _ in range(args.entities)))
+    entries = [{'entity': name, 'entity_type': rng.choice(ENTITY_TYPES)} for name in names]
+    keywords = [make_typo(rng, rng.choice(names)) for _ in range(500)]
+
+    version = [0]
+
+    def load():
+        return str(version[0]), WatchlistMatcher(entries)
+
+    start = time.perf_counter()
+    load()
+    print(f"{len(entries)} watchlist entries, {time.perf_counter() - start:.2f}s to build a matcher, "
+          f"{args.threads} checker threads, {args.reloads} reloads")
+
+    old = DropAndRebuild(load)
+    run('drop and rebuild', old, old.refresh, keywords, args)
+
+    snapshots = VersionedWatchlist('bench watchlist', lambda: str(version[0]), load, poll_seconds=0.05)
+
+    def bump():
+        version[0] += 1
+
+    run('snapshots', snapshots, bump, keywords, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entities', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=5, help="keywords per check")
+    parser.add_argument('--reloads', type=int, default=3)
+    parser.add_argument('--interval', type=float, default=3, help="seconds between reloads")
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
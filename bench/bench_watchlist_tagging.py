@@ -0,0 +1,99 @@
+"""
+Watchlist tagging of search results: per-candidate lookups vs the tagger.
+
+Builds a watchlist and batches of fake articles whose titles and
+snippets mention some of its names, exactly or with a typo. The naive
+path sends every word n-gram of each article to WatchlistMatcher.match
+(check_keyword's semantics, one lookup per candidate). The tagger
+finds exact names with one Aho-Corasick pass and only looks up the
+capitalised n-grams that aren't exact names, edit distance only.
+Reports time per batch and how many of the planted mentions each finds.
+The tagger misses typos that lowercase a name's first letter, those
+aren't capitalised candidates any more.
+
+    python bench/bench_watchlist_tagging.py --entities 20000 --articles 100 --batches 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_watchlist import ENTITY_TYPES, make_name, make_typo  # noqa: E402
+from fake_serpapi import fake_news_results  # noqa: E402
+from news_data import Article  # noqa: E402
+from watchlist_matcher import WatchlistMatcher  # noqa: E402
+from watchlist_tagger import WatchlistTagger, normalize_name  # noqa: E402
+
+MAX_NGRAM = 3
+
+
+def make_batch(rng: random.Random, entries: list, articles: int) -> tuple:
+    """A search result where about a third of the articles mention a watchlist name"""
+    items, planted = [], []
+    for item in fake_news_results(f"topic {rng.random()}", articles):
+        mention = None
+        if rng.random() < 0.33:
+            name = rng.choice(entries)['entity']
+            mention = (name, name if rng.random() < 0.5 else make_typo(rng, name))
+            item = dict(item, title=f"{item['title']} as {mention[1]} weighs in")
+        planted.append(mention)
+        items.append(Article.from_result(item, '2025-01-01'))
+    return {'2025-01-01': items}, planted
+
+
+def naive_tags(matcher: WatchlistMatcher, article: Article) -> list:
+    words = normalize_name(f"{article.title}\n{article.snippet}").split()
+    ngrams = [' '.join(words[start:start + size]) for start in range(len(words))
+              for size in range(1, min(MAX_NGRAM, len(words) - start) + 1)]
+    return list(dict.fromkeys(entry['entity'] for matched in matcher.match_batch(ngrams) for entry in matched))
+
+
+def found(tags: list, planted: list) -> int:
+    return sum(mention is not None and mention[0] in article_tags for article_tags, mention in zip(tags, planted))
+
+
+def main(args) -> None:
+    rng = random.Random(args.seed)
+    names = list(dict.fromkeys(make_name(rng) for _ in range(args.entities)))
+    entries = [{'entity': name, 'entity_type': rng.choice(ENTITY_TYPES)} for name in names]
+    batches = [make_batch(rng, entries, args.articles) for _ in range(args.batches)]
+    planted = sum(mention is not None for _, mentions in batches for mention in mentions)
+
+    start = time.perf_counter()
+    matcher = WatchlistMatcher(entries)
+    tagger = WatchlistTagger(entries)
+    print(f"{len(entries)} watchlist entries, matcher and tagger built in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    naive_found = naive_tag_count = 0
+    for results, mentions in batches:
+        tags = [naive_tags(matcher, article) for article in results['2025-01-01']]
+        naive_found += found(tags, mentions)
+        naive_tag_count += sum(len(article_tags) for article_tags in tags)
+    naive_time = (time.perf_counter() - start) / args.batches
+
+    start = time.perf_counter()
+    tagger_found = tagger_tag_count = 0
+    for results, mentions in batches:
+        tagged, _ = tagger.tag_articles(results)
+        tags = [article.entities for article in tagged['2025-01-01']]
+        tagger_found += found(tags, mentions)
+        tagger_tag_count += sum(len(article_tags) for article_tags in tags)
+    tagger_time = (time.perf_counter() - start) / args.batches
+
+    print(f"{args.batches} batches of {args.articles} articles, {planted} planted mentions (half with typos)")
+    print(f"  n-gram lookups : {naive_time * 1000:.1f}ms per batch, found {naive_found}, {naive_tag_count} tags "
+          f"(soundex matches most words to something)")
+    print(f"  tagger         : {tagger_time * 1000:.1f}ms per batch, found {tagger_found}, {tagger_tag_count} tags")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entities', type=int, default=20000)
+    parser.add_argument('--articles', type=int, default=100, help="articles per search batch")
+    parser.add_argument('--batches', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
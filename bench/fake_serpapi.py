@@ -0,0 +1,53 @@
+"""
+Local stand-in for the SerpAPI Google News endpoint.
+
+Serves /search.json with synthetic news_results so search throughput can
+be measured without spending search credits. Point the worker at it with
+SERPAPI_URL=http://localhost:8089/search.json
+"""
+import argparse
+import asyncio
+import hashlib
+from aiohttp import web
+
+
+def fake_news_results(query: str, count: int) -> list:
+    results = []
+    for position in range(count):
+        # Stable per query so repeated searches return the same articles
+        digest = hashlib.md5(f"{query}-{position}".encode()).hexdigest()[:12]
+        results.append({
+            'position': position + 1,
+            'title': f"{query} story {digest}",
+            'link': f"https://news.example.com/{digest}?utm_source=serpapi",
+            'source': f"Example News {position % 7}",
+            'date': "1 hour ago",
+            'snippet': f"Synthetic snippet about {query} for benchmarking ({digest}).",
+            'thumbnail': f"https://news.example.com/thumbs/{digest}.jpg",
+        })
+    return results
+
+
+def create_app(latency: float = 0.2, results: int = 10) -> web.Application:
+    async def search(request: web.Request) -> web.Response:
+        # Simulate SerpAPI's response time
+        await asyncio.sleep(latency)
+        query = request.query.get('q', '')
+        return web.json_response({
+            'search_metadata': {'status': 'Success'},
+            'search_parameters': dict(request.query),
+            'news_results': fake_news_results(query, results),
+        })
+
+    app = web.Application()
+    app.router.add_get('/search.json', search)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds per search")
+    parser.add_argument('--results', type=int, default=10, help="articles per search")
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency, args.results), port=args.port)
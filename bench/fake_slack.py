@@ -0,0 +1,47 @@
+"""
+Local stand-in for Slack's chat.postMessage.
+
+Accepts messages, counts them, and answers every Nth request with a 429
+and a Retry-After header so rate limit handling can be exercised. Point
+the worker at it with SLACK_API_URL=http://localhost:8090/api/
+"""
+import argparse
+import time
+from aiohttp import web
+
+
+def create_app(rate_limit_every: int = 0, retry_after: int = 1) -> web.Application:
+    stats = {'requests': 0, 'messages': 0, 'blocks': 0, 'rate_limited': 0}
+
+    async def post_message(request: web.Request) -> web.Response:
+        stats['requests'] += 1
+        if rate_limit_every and stats['requests'] % rate_limit_every == 0:
+            stats['rate_limited'] += 1
+            return web.json_response({'ok': False, 'error': 'ratelimited'}, status=429,
+                                     headers={'Retry-After': str(retry_after)})
+
+        if request.content_type == 'application/json':
+            body = await request.json()
+        else:
+            body = dict(await request.post())
+        stats['messages'] += 1
+        stats['blocks'] += len(body.get('blocks') or [])
+        return web.json_response({'ok': True, 'channel': body.get('channel'), 'ts': f"{time.time():.6f}"})
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application()
+    app['stats'] = stats
+    app.router.add_post('/api/chat.postMessage', post_message)
+    app.router.add_get('/stats', get_stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="answer every Nth request with a 429")
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+    web.run_app(create_app(args.rate_limit_every, args.retry_after), port=args.port)
@@ -0,0 +1,65 @@
+"""
+Codec server so the Temporal UI and CLI can show compressed payloads.
+
+Point the UI's codec endpoint (or `temporal --codec-endpoint`) at this
+server, it runs the same CompressionCodec as the workers and web tier.
+
+    hypercorn codec_server:app --bind 0.0.0.0:8081
+"""
+import coloredlogs
+import os
+from logging import getLogger
+
+from google.protobuf import json_format
+from quart import Quart, request
+from temporalio.api.common.v1 import Payloads
+
+from payload_codec import CompressionCodec, create_payload_codec
+
+logger = getLogger(__name__)
+coloredlogs.install(level='INFO')
+
+# Origins allowed to call the codec, the local Temporal UI by default
+CODEC_SERVER_CORS_ORIGINS = os.getenv('CODEC_SERVER_CORS_ORIGINS', 'http://localhost:8233').split(',')
+
+app = Quart(__name__)
+# Decoding must work even where compression is switched off for new payloads
+app.codec = create_payload_codec() or CompressionCodec()
+
+
+def cors_headers() -> dict:
+    origin = request.headers.get('Origin', '')
+    if origin not in CODEC_SERVER_CORS_ORIGINS:
+        return {}
+    return {
+        'Access-Control-Allow-Origin': origin,
+        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+        'Access-Control-Allow-Headers': 'content-type, x-namespace, authorization',
+        'Access-Control-Allow-Credentials': 'true',
+    }
+
+
+async def apply_codec(encode: bool):
+    payloads = json_format.Parse(await request.get_data(as_text=True), Payloads())
+    codec = app.codec
+    converted = await (codec.encode(payloads.payloads) if encode else codec.decode(payloads.payloads))
+    body = json_format.MessageToJson(Payloads(payloads=converted))
+    return body, 200, dict(cors_headers(), **{'Content-Type': 'application/json'})
+
+
+@app.route('/encode', methods=['POST', 'OPTIONS'])
+async def encode():
+    if request.method == 'OPTIONS':
+        return '', 200, cors_headers()
+    return await apply_codec(encode=True)
+
+
+@app.route('/decode', methods=['POST', 'OPTIONS'])
+async def decode():
+    if request.method == 'OPTIONS':
+        return '', 200, cors_headers()
+    return await apply_codec(encode=False)
+
+
+if __name__ == '__main__':
+    app.run(port=int(os.getenv('CODEC_SERVER_PORT', '8081')))
@@ -21,14 +21,78 @@ def get_config() -> dict:
                 # 'web_port': os.getenv('TEMPORAL_CONNECTION_WEB_PORT')
             },
             'worker': {
-                'task_queue': os.getenv('TEMPORAL_TASK_QUEUE')
+                'task_queue': os.getenv('TEMPORAL_TASK_QUEUE'),
+                # Which task queues this worker process polls: any of workflow, search, notify
+                'roles': os.getenv('WORKER_ROLES', 'workflow,search,notify').split(','),
+                # Worker processes started per host, all polling the same task queues
+                'processes': int(os.getenv('WORKER_PROCESSES', '1')),
+                # Threads for sync activities
+                'activity_executor_workers': int(os.getenv('WORKER_ACTIVITY_EXECUTOR_WORKERS', '4')),
+                'max_concurrent_activities': int(os.getenv('WORKER_MAX_CONCURRENT_ACTIVITIES', '20')),
+                'max_concurrent_workflow_tasks': int(os.getenv('WORKER_MAX_CONCURRENT_WORKFLOW_TASKS', '20')),
+            },
+            # Compression of workflow, activity and query payloads, shared by workers, web and codec server.
+            # 'zstd' falls back to zlib when the zstandard package is missing.
+            'payload_codec': {
+                'compression': os.getenv('PAYLOAD_COMPRESSION', 'none'),
+                # Payloads smaller than this many bytes are sent as they are
+                'threshold': int(os.getenv('PAYLOAD_COMPRESSION_THRESHOLD', '1024')),
+                'level': int(os.getenv('PAYLOAD_COMPRESSION_LEVEL', '6')),
             },
             # 'api': {
             #     'port': os.getenv('CALLER_API_PORT')
             # }
         },
+        'newsfeed': {
+            # Search each topic term in its own activity instead of one combined query
+            'fan_out': os.getenv('NEWSFEED_FAN_OUT', 'false').lower() == 'true',
+            'max_parallel_searches': int(os.getenv('NEWSFEED_MAX_PARALLEL_SEARCHES', '3')),
+            # Feeds subscribe to one shared collector workflow per term instead of searching themselves
+            'collectors': os.getenv('NEWSFEED_COLLECTORS', 'false').lower() == 'true',
+            # Real cadence from one Temporal Schedule per topic (or per term with collectors)
+            # instead of the 15 second demo loop. Topics can pick their own interval in the UI.
+            'schedule': {
+                'enabled': os.getenv('NEWSFEED_SCHEDULED', 'false').lower() == 'true',
+                'interval_minutes': int(os.getenv('NEWSFEED_SCHEDULE_INTERVAL_MINUTES', '1440')),
+                'jitter_seconds': int(os.getenv('NEWSFEED_SCHEDULE_JITTER_SECONDS', '600')),
+            },
+            # Retention window and compaction of the articles kept in workflow state
+            'retention_days': int(os.getenv('NEWSFEED_RETENTION_DAYS', '7')),
+            'max_articles': int(os.getenv('NEWSFEED_MAX_ARTICLES', '1000')),
+            'snippet_chars': int(os.getenv('NEWSFEED_SNIPPET_CHARS', '200')),
+            'keep_thumbnails': os.getenv('NEWSFEED_KEEP_THUMBNAILS', 'true').lower() == 'true',
+            'dedupe_index_size': int(os.getenv('NEWSFEED_DEDUPE_INDEX_SIZE', '10000')),
+            'near_duplicate_distance': int(os.getenv('NEWSFEED_NEAR_DUPLICATE_DISTANCE', '3')),
+            # Articles per page, the UI loads one date a page at a time
+            'page_size': int(os.getenv('NEWSFEED_PAGE_SIZE', '20')),
+            # Article bodies in a store next to the search workers, workflow state keeps IDs and counts.
+            # The web tier reads feeds from it directly, so it has to reach the same file.
+            'article_store': {
+                'enabled': os.getenv('ARTICLE_STORE_ENABLED', 'false').lower() == 'true',
+                # Only 'sqlite' for now, see article_store.py for the interface another backend implements
+                'backend': os.getenv('ARTICLE_STORE_BACKEND', 'sqlite'),
+                'path': os.getenv('ARTICLE_STORE_PATH', 'articles.db'),
+            },
+            # Tag new articles with the watchlist entities they mention, from a CSV on the search workers
+            # in the same entity,entity_type format as the refresh bucket's watchlist/watchlist.csv
+            'watchlist': {
+                'tagging': os.getenv('WATCHLIST_TAGGING', 'false').lower() == 'true',
+                'path': os.getenv('WATCHLIST_PATH', 'watchlist.csv'),
+                # Candidates and names shorter than this are only matched exactly
+                'min_fuzzy_chars': int(os.getenv('WATCHLIST_MIN_FUZZY_CHARS', '6')),
+                # Workers reload the file when it changes, checked this often
+                'poll_seconds': float(os.getenv('WATCHLIST_VERSION_POLL_SECONDS', '30')),
+            },
+        },
         'web': {
             'url': web_url,
+            'workflow_store': {
+                # 'sqlite' (default) or 'json' for the original single file
+                'backend': os.getenv('WORKFLOW_STORE_BACKEND', 'sqlite'),
+                'path': os.getenv('WORKFLOW_STORE_PATH', 'workflow_mappings.db'),
+                # Existing mappings in this file are imported on first start
+                'legacy_json_path': os.getenv('WORKFLOW_MAPPINGS_FILE', 'workflow_mappings.json'),
+            },
             'connection': {
                 'mtls': {
                     'key_file': os.getenv('WEB_CONNECTION_MTLS_KEY_FILE'),
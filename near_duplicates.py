@@ -0,0 +1,168 @@
+import dataclasses
+import hashlib
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from news_data import Article
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'igshid', 'yclid',
+    'ref', 'ref_src', 'cmpid', 'smid', 'ocid', 'ncid', 'taid', 'guccounter', 'amp',
+}
+TRACKING_PREFIXES = ('utm_', 'at_', 'itm_', '_hs')
+
+# Words that change between rewrites of the same headline without changing the story
+STOPWORDS = {
+    'a', 'an', 'the', 'and', 'or', 'but', 'of', 'to', 'in', 'on', 'for', 'with', 'by', 'at', 'from',
+    'as', 'is', 'are', 'was', 'were', 'be', 'been', 'after', 'amid', 'over', 'into', 'its', 'it',
+    'this', 'that', 'says', 'said', 'report', 'reports', 'new', 'latest', 'update', 'live',
+}
+
+_WORD = re.compile(r"\w+")
+# Syndicated headlines usually end in " - Outlet" or " | Outlet"
+_SOURCE_SUFFIX = re.compile(r"\s+[-|–—]\s+[^-|–—]{1,60}$")
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalise a link so the same article compares equal however it was shared.
+
+    Lowercases the scheme and host, drops "www.", default ports, fragments,
+    AMP paths, trailing slashes and tracking parameters, and sorts what is
+    left of the query string. Links that don't parse are returned unchanged.
+    """
+    if not url or url == '#':
+        return url
+    try:
+        parts = urlsplit(url.strip())
+        host = (parts.hostname or '').lower()
+        port = parts.port
+    except ValueError:
+        return url
+    if not host:
+        return url
+
+    scheme = parts.scheme.lower() or 'https'
+    if scheme == 'http':
+        scheme = 'https'
+    if host.startswith('www.'):
+        host = host[4:]
+    if host.startswith('amp.'):
+        host = host[4:]
+    netloc = host if port in (None, 80, 443) else f"{host}:{port}"
+
+    path = re.sub(r"/+", "/", parts.path or '/')
+    if path.endswith('/amp') or path.endswith('/amp/'):
+        path = path[:path.rindex('/amp')] or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)]
+    return urlunsplit((scheme, netloc, path, urlencode(sorted(query)), ''))
+
+
+def title_tokens(title: str) -> List[str]:
+    """Distinct words of a headline, without the outlet suffix or stopwords"""
+    words = _WORD.findall(_SOURCE_SUFFIX.sub('', title or '').casefold())
+    return sorted(set(word for word in words if word not in STOPWORDS))
+
+
+def simhash(tokens: Iterable[str]) -> int:
+    """64-bit SimHash, similar token sets give fingerprints a small Hamming distance apart"""
+    # Count the set bits in each column of the token hashes, a bit is set in
+    # the fingerprint when it is set in more than half of them
+    rows = [f"{int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'big'):064b}"
+            for token in tokens]
+    if not rows:
+        return 0
+    half = len(rows) / 2
+    return int(''.join('1' if column.count('1') > half else '0' for column in zip(*rows)), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class SimHashIndex:
+    """
+    Finds fingerprints within max_distance bits of a query.
+
+    The 64 bits are split into max_distance + 1 bands. Two fingerprints
+    that differ in at most max_distance bits must agree exactly on at
+    least one band, so only fingerprints sharing a band value are compared.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self._bands = max_distance + 1
+        self._width = 64 // self._bands
+        self._mask = (1 << self._width) - 1
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(self._bands)]
+
+    def _keys(self, fingerprint: int):
+        for band in range(self._bands):
+            yield band, fingerprint >> (band * self._width) & self._mask
+
+    def find(self, fingerprint: int) -> Optional[int]:
+        """A stored fingerprint within max_distance of this one, or None"""
+        for band, key in self._keys(fingerprint):
+            for candidate in self._tables[band].get(key, ()):
+                if hamming(candidate, fingerprint) <= self.max_distance:
+                    return candidate
+        return None
+
+    def add(self, fingerprint: int) -> None:
+        for band, key in self._keys(fingerprint):
+            self._tables[band].setdefault(key, []).append(fingerprint)
+
+
+def collapse_near_duplicates(results: Dict[str, List[Article]], known: Iterable[int] = (),
+                             max_distance: int = 3) -> Tuple[Dict[str, List[Article]], int]:
+    """
+    Keep one representative of each cluster of near-duplicate articles.
+
+    Headlines are short, so a single changed word already moves a SimHash
+    by several bits. The default max_distance of 3 therefore merges
+    rewrites that differ only in punctuation, stopwords, word order or
+    outlet suffix, and leaves genuinely different stories (iPhone vs
+    iPad) apart.
+
+    Each kept article gets the SimHash of its headline, its link is left as
+    the outlet gave it. An article is dropped if its canonical link was
+    already seen, or its headline is within max_distance bits of
+    an earlier article in the batch or of the known fingerprints (articles
+    already in the feed, which may be from other days). Returns the
+    filtered results, keyed by date as before, and how many were dropped.
+    """
+    index = SimHashIndex(max_distance)
+    for fingerprint in known:
+        if fingerprint:
+            index.add(fingerprint)
+
+    seen_links = set()
+    dropped = 0
+    collapsed: Dict[str, List[Article]] = {}
+    for date_key, items in results.items():
+        kept = []
+        for item in items:
+            # Canonical links are only the dedupe key, the real link is what gets stored and shown
+            link = canonical_url(item.link)
+            if link != '#' and link in seen_links:
+                dropped += 1
+                continue
+
+            tokens = title_tokens(item.title)
+            fingerprint = simhash(tokens) if tokens else 0
+            if fingerprint and max_distance >= 0 and index.find(fingerprint) is not None:
+                dropped += 1
+                continue
+
+            seen_links.add(link)
+            if fingerprint:
+                index.add(fingerprint)
+            kept.append(dataclasses.replace(item, simhash=fingerprint))
+        collapsed[date_key] = kept
+    return collapsed, dropped
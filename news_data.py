@@ -1,7 +1,48 @@
+import hashlib
 import os
 from dataclasses import dataclass, field
-from typing import List, Dict
+from typing import List, Dict, Optional
 NEWS_TASK_QUEUE = os.environ.get("NEWS_TASK_QUEUE", "NewsTaskQueue")
+# Activities can be routed to their own queues so slow SerpAPI or Slack calls
+# get dedicated workers, both default to the workflow task queue
+NEWS_SEARCH_TASK_QUEUE = os.environ.get("NEWS_SEARCH_TASK_QUEUE", NEWS_TASK_QUEUE)
+NEWS_NOTIFY_TASK_QUEUE = os.environ.get("NEWS_NOTIFY_TASK_QUEUE", NEWS_TASK_QUEUE)
+
+
+@dataclass(slots=True)
+class Article:
+    '''One search result, only the fields a feed uses.
+
+    search_news projects SerpAPI's news_results onto this, so the rest of
+    each result never reaches activity payloads, signals or history.
+    '''
+    title: str = 'No Title'
+    link: str = '#'
+    source: str = 'Unknown'
+    # The date the feed files the article under, not SerpAPI's "2 hours ago"
+    date: str = ''
+    snippet: str = 'No description available'
+    thumbnail: str = ''
+    # Headline SimHash, set by near-duplicate detection
+    simhash: int = 0
+    # Watchlist entities mentioned in the title or snippet, set by watchlist tagging
+    entities: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_result(cls, item: Dict, article_date: str = '') -> 'Article':
+        '''Project a SerpAPI news result (or an article dict from older state) onto an Article'''
+        source = item.get('source') or 'Unknown'
+        if isinstance(source, dict):
+            # Newer SerpAPI responses nest the outlet with its icon and authors
+            source = source.get('name') or 'Unknown'
+        return cls(title=item.get('title') or 'No Title',
+                   link=item.get('link') or '#',
+                   source=source,
+                   date=article_date or item.get('date', ''),
+                   snippet=item.get('snippet') or 'No description available',
+                   thumbnail=item.get('thumbnail') or '',
+                   simhash=item.get('simhash', 0),
+                   entities=list(item.get('entities') or []))
 
 
 @dataclass
@@ -10,5 +51,105 @@ class NewsfeedInput:
     topicDate: str
     topicString: str
     previousResults: List[Dict]
+    # Search each term of topicString separately and merge the results
+    fanOut: bool = False
+    # Upper bound on concurrent per-term searches (SerpAPI rate limits)
+    maxParallelSearches: int = 3
+    # Compact article state carried across continue-as-new (see article_state.py)
+    state: Optional[Dict] = None
+    # Retention window for accumulated articles, by days and by count
+    retentionDays: int = 7
+    maxArticles: int = 1000
+    # Snippets are truncated to this many characters in workflow state
+    snippetChars: int = 200
+    keepThumbnails: bool = True
+    # Fingerprints remembered for dedupe, including articles already trimmed
+    dedupeIndexSize: int = 10000
+    # SimHash distance under which headlines count as the same story, -1 disables
+    nearDuplicateDistance: int = 3
+    # Subscribe to shared per-term collectors instead of searching from this workflow
+    useCollectors: bool = False
+    # Search when a Temporal Schedule ticks (see search_schedule.py) instead of sleeping in a loop
+    scheduled: bool = False
+    # Article bodies go to the article store (see article_store.py), state keeps only references
+    articleStore: bool = False
+    # Key of this feed in the article store, the same across replacement workflows
+    feedId: str = ''
+    # Tag each batch with the watchlist entities it mentions (see watchlist_tagger.py)
+    watchlistTagging: bool = False
+
+
+@dataclass
+class NearDuplicateInput:
+    '''Search results to collapse, plus headline fingerprints already in the feed'''
+    results: Dict[str, List[Article]]
+    knownSimhashes: List[int] = field(default_factory=list)
+    maxDistance: int = 3
+
+
+@dataclass
+class TermCollectorInput:
+    '''One search term collected on behalf of every feed subscribed to it'''
+    term: str
+    topicDate: str
+    subscribers: List[str] = field(default_factory=list)
+    # Most recent search results, sent to feeds that subscribe between searches
+    latest: Dict[str, List[Article]] = field(default_factory=dict)
+    intervalSeconds: int = 15
+    scheduled: bool = False
+    articleStore: bool = False
+
+
+@dataclass
+class StoreArticlesInput:
+    '''Articles to link to a feed in the article store, plus the ones it has trimmed'''
+    feedId: str
+    cursor: int
+    # seq, id and date of each article, with title, link... for bodies not stored by search_news
+    articles: List[Dict]
+    removedSeqs: List[int] = field(default_factory=list)
+    # The run numbers its articles from 0 again, drop the rows earlier runs linked first
+    reset: bool = False
+
+
+@dataclass
+class PageRequest:
+    '''One page of a single date's articles'''
+    date: str
+    page: int = 0
+    pageSize: int = 20
+
+
+@dataclass
+class SearchTickInput:
+    '''Feed or term collector a schedule tick is for'''
+    targetWorkflowId: str
+
+
+@dataclass
+class TermResults:
+    '''Search results for one term, delivered by a collector to a feed'''
+    term: str
+    results: Dict[str, List[Article]]
+
+
+def term_collector_id(term: str) -> str:
+    '''Workflow ID of the collector for a term, the same for any casing'''
+    return f"term-collector-{hashlib.md5(term.strip().casefold().encode()).hexdigest()[:12]}"
+
+
+def split_topic_terms(topic_string: str) -> List[str]:
+    '''Split a topic string into search terms.
+
+    Comma separated strings keep multi-word terms together ("Open AI, bitcoin"),
+    otherwise every word is a term. Duplicates are dropped, order is kept.
+    '''
+    separator = ',' if ',' in topic_string else None
+    terms = []
+    for term in topic_string.split(separator):
+        term = term.strip()
+        if term and term.casefold() not in (t.casefold() for t in terms):
+            terms.append(term)
+    return terms
 
 
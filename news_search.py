@@ -0,0 +1,49 @@
+import asyncio
+import coloredlogs
+import os
+from logging import getLogger
+
+import httpx
+
+SERPAPI_KEY = os.getenv('SERPAPI_KEY')
+# Point at a local fake server (bench/fake_serpapi.py) to run without credits
+SERPAPI_URL = os.getenv('SERPAPI_URL', 'https://serpapi.com/search.json')
+# Connection pool size and number of searches in flight per worker process
+SEARCH_MAX_CONNECTIONS = int(os.getenv('SEARCH_MAX_CONNECTIONS', '10'))
+SEARCH_CONCURRENCY = int(os.getenv('SEARCH_CONCURRENCY', '5'))
+SEARCH_TIMEOUT_SECONDS = float(os.getenv('SEARCH_TIMEOUT_SECONDS', '20'))
+
+logger = getLogger(__name__)
+coloredlogs.install(level='INFO')
+
+
+# Shared across all search activities in the worker so connections are kept alive
+_search_client = None
+_search_semaphore = None
+
+
+def get_search_client() -> httpx.AsyncClient:
+    global _search_client
+    if _search_client is None:
+        # HTTP/2 needs the optional h2 package, fall back to keep-alive HTTP/1.1
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+        _search_client = httpx.AsyncClient(
+            http2=http2,
+            timeout=SEARCH_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=SEARCH_MAX_CONNECTIONS,
+                                max_keepalive_connections=SEARCH_MAX_CONNECTIONS,
+                                keepalive_expiry=60),
+        )
+        logger.info(f"Created search HTTP client (http2={http2}, pool={SEARCH_MAX_CONNECTIONS})")
+    return _search_client
+
+
+def get_search_semaphore() -> asyncio.Semaphore:
+    global _search_semaphore
+    if _search_semaphore is None:
+        _search_semaphore = asyncio.Semaphore(SEARCH_CONCURRENCY)
+    return _search_semaphore
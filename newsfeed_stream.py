@@ -0,0 +1,171 @@
+import asyncio
+import bisect
+import coloredlogs
+from logging import getLogger
+from article_store import ArticleStore
+from newsfeed_workflow import NewsfeedWorkflow
+from temporal_client import TemporalClientManager
+
+logger = getLogger(__name__)
+coloredlogs.install(level='INFO')
+
+
+class Subscription:
+    """A single connected viewer of a workflow's newsfeed"""
+
+    def __init__(self, workflow_id: str, cursor: int, max_pending: int):
+        self.workflow_id = workflow_id
+        self.cursor = cursor
+        self.events = asyncio.Queue(maxsize=max_pending)
+
+    async def get(self):
+        """Wait for the next event, None means the stream was closed"""
+        return await self.events.get()
+
+
+class _Feed:
+    """Articles seen so far for one workflow and everyone watching it"""
+
+    def __init__(self, workflow_id: str, feed_id: str = None):
+        self.workflow_id = workflow_id
+        self.feed_id = feed_id
+        self.articles = []
+        self.dates = []
+        self.date_counts = []
+        self.cursor = 0
+        self.ready = False
+        self.subscribers = set()
+        self.task = None
+
+
+class NewsfeedBroadcaster:
+    """
+    Fans out one Temporal poller per workflow to every connected viewer.
+
+    Each workflow with at least one subscriber gets a single polling task
+    that queries get_results_since on an interval and pushes the delta to
+    all subscribers, so query load grows with the number of workflows
+    being watched rather than the number of open tabs. Everything runs on
+    the web server's event loop, so no locking is needed.
+
+    Feeds backed by the article store are polled from the store instead
+    of the workflow, whose state only has article references.
+    """
+
+    def __init__(self, client_manager: TemporalClientManager, interval: float = 15, max_pending: int = 100,
+                 max_articles: int = 1000, article_store: ArticleStore = None):
+        self._clients = client_manager
+        self._article_store = article_store
+        self._interval = interval
+        self._max_pending = max_pending
+        self._max_articles = max_articles
+        self._feeds = {}
+        self._queries = 0
+
+    def subscribe(self, workflow_id: str, cursor: int = 0, feed_id: str = None) -> Subscription:
+        subscription = Subscription(workflow_id, cursor, self._max_pending)
+        feed = self._feeds.get(workflow_id)
+        if feed is None:
+            feed = _Feed(workflow_id, feed_id)
+            self._feeds[workflow_id] = feed
+        feed.subscribers.add(subscription)
+
+        # Late joiners catch up from what the poller already has
+        if feed.ready:
+            self._deliver(feed, subscription)
+
+        if feed.task is None:
+            feed.task = asyncio.create_task(self._poll_loop(feed), name=f"newsfeed-poller-{workflow_id}")
+        logger.info(f"New subscriber for {workflow_id} ({len(feed.subscribers)} watching)")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        feed = self._feeds.get(subscription.workflow_id)
+        if feed is not None:
+            feed.subscribers.discard(subscription)
+            logger.info(f"Subscriber left {feed.workflow_id} ({len(feed.subscribers)} watching)")
+
+    async def close(self) -> None:
+        """Stop all pollers and end every open stream"""
+        feeds = list(self._feeds.values())
+        self._feeds = {}
+        for feed in feeds:
+            if feed.task is not None:
+                feed.task.cancel()
+            for subscription in feed.subscribers:
+                self._close_subscription(subscription)
+        await asyncio.gather(*(feed.task for feed in feeds if feed.task is not None), return_exceptions=True)
+
+    def metrics(self) -> dict:
+        return {
+            'workflows': len(self._feeds),
+            'subscribers': sum(len(feed.subscribers) for feed in self._feeds.values()),
+            'queries': self._queries,
+        }
+
+    async def _poll_loop(self, feed: _Feed) -> None:
+        while True:
+            # Stop polling once the last viewer has gone
+            if not feed.subscribers:
+                self._feeds.pop(feed.workflow_id, None)
+                logger.info(f"No subscribers left, stopping poller for {feed.workflow_id}")
+                return
+
+            try:
+                delta = await self._query(feed)
+                self._publish(feed, delta)
+            except Exception as e:
+                logger.error(f"Error polling {feed.workflow_id}: {e}")
+
+            await asyncio.sleep(self._interval)
+
+    async def _query(self, feed: _Feed) -> dict:
+        self._queries += 1
+        if self._article_store is not None and feed.feed_id:
+            return await asyncio.to_thread(self._article_store.since, feed.feed_id, feed.cursor)
+        client = await self._clients.get_client()
+        handle = client.get_workflow_handle(feed.workflow_id)
+        return await handle.query(NewsfeedWorkflow.get_results_since, feed.cursor)
+
+    def _publish(self, feed: _Feed, delta: dict) -> None:
+        if delta['reset']:
+            feed.articles = list(delta['articles'])
+        else:
+            feed.articles.extend(delta['articles'])
+        # Mirror the workflow's retention rather than growing without bound
+        del feed.articles[:-self._max_articles]
+        changed = not feed.ready or delta['cursor'] != feed.cursor or delta['reset']
+        feed.cursor = delta['cursor']
+        feed.dates = delta['dates']
+        feed.date_counts = delta['dateCounts']
+        feed.ready = True
+
+        if changed:
+            for subscription in list(feed.subscribers):
+                self._deliver(feed, subscription, full=delta['reset'])
+
+    def _deliver(self, feed: _Feed, subscription: Subscription, full: bool = False) -> None:
+        # Send the subscriber whatever it has not seen yet
+        reset = full or subscription.cursor > feed.cursor
+        # Cursors are article sequence numbers, not list positions
+        start = 0 if reset else bisect.bisect_left(feed.articles, subscription.cursor, key=lambda article: article['seq'])
+        event = {
+            'mode': 'full' if reset else 'delta',
+            'cursor': feed.cursor,
+            'articles': feed.articles[start:],
+            'dates': feed.dates,
+            'dateCounts': feed.date_counts
+        }
+        try:
+            subscription.events.put_nowait(event)
+            subscription.cursor = feed.cursor
+        except asyncio.QueueFull:
+            # Slow consumer, drop it rather than buffering without bound
+            logger.warning(f"Dropping slow subscriber on {feed.workflow_id}")
+            feed.subscribers.discard(subscription)
+            self._close_subscription(subscription)
+
+    def _close_subscription(self, subscription: Subscription) -> None:
+        while not subscription.events.empty():
+            subscription.events.get_nowait()
+        subscription.events.put_nowait(None)
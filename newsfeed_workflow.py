@@ -1,17 +1,21 @@
 import coloredlogs
+import dataclasses
 from datetime import timedelta
 from logging import getLogger
-from news_data import NewsfeedInput
+from news_data import (Article, NearDuplicateInput, NewsfeedInput, NEWS_NOTIFY_TASK_QUEUE, NEWS_SEARCH_TASK_QUEUE,
+                       PageRequest, split_topic_terms, StoreArticlesInput, term_collector_id, TermResults)
 from temporalio import workflow
 from temporalio.common import RetryPolicy
 from temporalio.exceptions import ActivityError, ApplicationError
-from typing import List, Dict
+from typing import List, Dict, Optional
 import asyncio
 import sys
 
 with workflow.unsafe.imports_passed_through():
     from activities import NewsActivities
 
+from article_state import ArticleState
+
 logger = getLogger(__name__)
 coloredlogs.install(level='INFO')
 
@@ -42,25 +46,49 @@ def getNextDate(today_date):
     # Format back to string
     new_date = f"{year}-{month:02d}-{day:02d}"
     logger.info(f"Updated date from {today_date} to {new_date}")
-    input.topicDate = new_date
     return new_date
 
+# Interleave per-term search results so one busy term can't crowd out the others
+def merge_term_results(term_results: List[Dict[str, List[Article]]]) -> Dict[str, List[Article]]:
+    merged: Dict[str, List[Article]] = {}
+    for date_key in sorted(set(key for result in term_results for key in result)):
+        seen_links = set()
+        items = []
+        term_lists = [result.get(date_key) or [] for result in term_results]
+        for idx in range(max(len(term_list) for term_list in term_lists)):
+            for term_list in term_lists:
+                if idx < len(term_list):
+                    item = term_list[idx]
+                    # The same article often shows up for several terms
+                    link = item.link
+                    if link != '#' and link in seen_links:
+                        continue
+                    seen_links.add(link)
+                    items.append(item)
+        merged[date_key] = items
+    return merged
+
+
 @workflow.defn
 class NewsfeedWorkflow:
     def __init__(self) -> None:
-        self._email_details = EmailDetails()
         self._start_date = None  # To track when we started collecting results
         self._day_count = 0  # To track how many days we've been running    
         self._sched_to_close_timeout = timedelta(seconds=30)
+        self._notify_timeout = timedelta(minutes=2)  # Slack pacing and Retry-After waits need longer
         self._retry_policy = RetryPolicy(initial_interval=timedelta(seconds=1),
                                         backoff_coefficient=2,
                                         maximum_interval=timedelta(seconds=30),
                                         maximum_attempts=2,
                                         non_retryable_error_types=['Exception'])
-        self._newsfeed_result: List[Dict] = []
+        self._articles = ArticleState()  # Compact, size-bounded article store
         self._exit: bool = False
         self._processed_dates: set = set()  # Set to track all the dates we've processed
         self._last_signal_time = None  # To track when we last received a signal
+        self._first_batch_merged: bool = False  # Set once the first search of this run has been merged
+        self._deliveries: List[TermResults] = []  # Results sent by term collectors, not merged yet
+        self._tick_date: Optional[str] = None  # Date sent by the latest schedule tick, not searched yet
+        self._feed_id: Optional[str] = None  # Key in the article store, None when state keeps the articles
 
     @workflow.run
     async def run(self, input: NewsfeedInput) -> list:
@@ -79,30 +107,40 @@ class NewsfeedWorkflow:
         self._processed_dates = set()
 
         # Initialize or restore workflow state from previous runs
-        if input.previousResults and len(input.previousResults) > 0:
-            self._newsfeed_result = input.previousResults
-            logger.info(f"Restored {len(self._newsfeed_result)} previous results")
-            
-            # Extract dates from existing results to track what dates we've processed
-            for article in self._newsfeed_result:
-                if 'date' in article:
-                    self._processed_dates.add(article['date'])
-            
-            logger.info(f"Extracted {len(self._processed_dates)} unique dates from previous results: {self._processed_dates}")
+        self._articles = ArticleState(retention_days=input.retentionDays,
+                                      max_articles=input.maxArticles,
+                                      snippet_chars=input.snippetChars,
+                                      keep_thumbnails=input.keepThumbnails,
+                                      index_size=input.dedupeIndexSize,
+                                      keep_content=not input.articleStore)
+        if input.state:
+            self._articles.load_payload(input.state)
+            logger.info(f"Restored {len(self._articles)} previous results from compact state")
+        elif input.previousResults:
+            self._articles.load_articles(input.previousResults)
+            logger.info(f"Restored {len(self._articles)} previous results")
         else:
-            self._newsfeed_result = []
             logger.info("Starting with empty results")
 
-        # Create a set of existing article identifiers to prevent duplicates
-        # We'll use title + link + date as a unique identifier for articles
-        # This ensures that the same article on different days is treated as different
-        existing_article_ids = set()
-        for article in self._newsfeed_result:
-            # Create a unique ID using title, link, and date
-            article_id = f"{article.get('title', '')}-{article.get('link', '')}-{article.get('date', '')}"
-            existing_article_ids.add(article_id)
-        
-        logger.info(f"Tracking {len(existing_article_ids)} unique articles to prevent duplicates")
+        if input.articleStore:
+            self._feed_id = input.feedId or workflow.info().workflow_id
+            # State from a run that kept full articles, move them to the store once
+            legacy = [article for article in self._articles.articles() if article['title']]
+            if legacy:
+                await self._store_articles(legacy)
+                self._articles.drop_content()
+                logger.info(f"Moved {len(legacy)} articles from workflow state to the article store")
+            elif self._articles.cursor == 0 and workflow.patched('article-store-reset'):
+                # Sequence numbers start over, rows an earlier run linked to this feed would show up again
+                await self._store_articles([], reset=True)
+
+        # Extract dates from existing results to track what dates we've processed
+        self._processed_dates.update(self._articles.dates())
+        logger.info(f"Extracted {len(self._processed_dates)} unique dates from previous results: {self._processed_dates}")
+
+        # The article state keeps 64-bit fingerprints of title + link + date to prevent
+        # duplicates, so the same article on different days is treated as different
+        logger.info(f"Tracking {len(self._articles)} unique articles to prevent duplicates")
 
         self._day_count += 1
         logger.info(f"This is day {self._day_count} of running this workflow")
@@ -118,63 +156,88 @@ class NewsfeedWorkflow:
                 self._processed_dates.add(today_date)
                 logger.info(f"Now tracking {len(self._processed_dates)} unique dates: {sorted(list(self._processed_dates))}")
                 
-                activity_result = await workflow.execute_activity(
-                    NewsActivities.search_news,
-                    input,
-                    schedule_to_close_timeout=self._sched_to_close_timeout,
-                    retry_policy=self._retry_policy
-                )
+                if input.useCollectors:
+                    # Term collectors do the searching, wait for them to deliver
+                    activity_result = await self._next_delivery()
+                    if activity_result is None:
+                        break
+                else:
+                    activity_result = await self._search(input)
+                activity_result = await self._collapse_near_duplicates(input, activity_result)
+                activity_result = await self._tag_watchlist_entities(input, activity_result)
                 
                 logger.info(f"Received activity result of type: {type(activity_result)}")
                 
                 # Track how many new items we add in this run
                 new_items_count = 0
                 duplicate_count = 0
+                new_items: List[Dict] = []
                 
                 # Handle the activity result based on its type
                 if isinstance(activity_result, dict):
                     # If it's a dictionary with date keys
                     logger.info(f"Processing dictionary result with {len(activity_result)} date entries")
                     for date_key, news_items in activity_result.items():
-                        for idx, item in enumerate(news_items):
-                            # Create a dictionary with all the necessary fields
-                            news_item = {
-                                'position': idx,
-                                'title': item.get('title', 'No Title'),
-                                'link': item.get('link', '#'),
-                                'source': item.get('source', 'Unknown'),
-                                'date': date_key,
-                                'thumbnail': item.get('thumbnail', ''),
-                                'snippet': item.get('snippet', 'No description available')
-                            }
+                        for news_item in news_items:
+                            # Articles are filed under the date they were searched for
+                            if news_item.date != date_key:
+                                news_item = dataclasses.replace(news_item, date=date_key)
                             
-                            # Check if this is a duplicate article
-                            article_id = f"{news_item['title']}-{news_item['link']}-{news_item['date']}"
-                            if article_id in existing_article_ids:
+                            # Add unless it's a duplicate article
+                            added = self._articles.add(news_item)
+                            if added is None:
                                 duplicate_count += 1
                                 continue
                             
-                            # Not a duplicate, add to results and tracking set
-                            self._newsfeed_result.append(news_item)
-                            existing_article_ids.add(article_id)
+                            new_items.append(added)
                             new_items_count += 1
+
+                    # Keep the state inside the retention window
+                    trimmed = self._articles.trim()
+                    if trimmed:
+                        logger.info(f"Trimmed {trimmed} articles outside the retention window")
+
+                    # search_news already stored the bodies, link the new IDs to this feed
+                    if self._feed_id is not None:
+                        await self._store_articles([{'seq': item['seq'], 'id': item['id'], 'date': item['date'],
+                                                     'entities': item['entities']} for item in new_items])
                             
                 else:
                     # Unexpected result type
                     logger.warning(f"Unexpected result type from activity: {type(activity_result)}")
+
+                # Release anyone waiting on wait_for_first_results
+                self._first_batch_merged = True
                 
-                # Comment out for now until we are ready to notify results
-                await workflow.execute_activity(NewsActivities.notify_slack,
-                                                self._newsfeed_result,
-                                                schedule_to_close_timeout=self._sched_to_close_timeout,
-                                                retry_policy=self._retry_policy)
+                # Only notify about the articles merged in this run
+                if new_items:
+                    await workflow.execute_activity(NewsActivities.notify_slack,
+                                                    new_items,
+                                                    task_queue=NEWS_NOTIFY_TASK_QUEUE,
+                                                    schedule_to_close_timeout=self._notify_timeout,
+                                                    retry_policy=self._retry_policy)
                 logger.info(f"Added {new_items_count} new items for {today_date} (skipped {duplicate_count} duplicates)")
-                logger.info(f"Total items across all dates: {len(self._newsfeed_result)}")
+                logger.info(f"Total items across all dates: {len(self._articles)}")
 
-                # Check if a continue-as-new is suggested (for workflow history size limitations)
-                if workflow.info().is_continue_as_new_suggested():
+                # Check if a continue-as-new is suggested (for workflow history size limitations),
+                # deliveries that arrived meanwhile are merged first so they aren't lost
+                if workflow.info().is_continue_as_new_suggested() and not self._deliveries:
                     logger.info("Continue-as-new suggested, continuing with current results")
-                    workflow.continue_as_new(input, self._newsfeed_result)
+                    workflow.continue_as_new(dataclasses.replace(input, previousResults=[],
+                                                                 state=self._articles.to_payload()))
+
+                # Collectors set the pace in collector mode, no sleep or date of our own
+                if input.useCollectors:
+                    continue
+
+                # Scheduled mode searches when the topic's schedule ticks, for the real date
+                if input.scheduled:
+                    tick_date = await self._next_tick()
+                    if tick_date is None:
+                        break
+                    input.topicDate = tick_date
+                    self._processed_dates.add(tick_date)
+                    continue
 
                 # Sleep for the daily interval (for demo purposes, we'll use 30 seconds)
                 logger.info(f"Workflow sleeping before next daily run")
@@ -212,6 +275,7 @@ class NewsfeedWorkflow:
                 
                 # Update the date for the next run
                 next_date = getNextDate(today_date)
+                input.topicDate = next_date
                 # Also add this to our processed dates tracking
                 self._processed_dates.add(next_date)
 
@@ -226,26 +290,196 @@ class NewsfeedWorkflow:
                 raise ApplicationError("An Unknown Error has occured")
         
         logger.info("Workflow exiting due to exit signal")
-        return self._newsfeed_result
+        if input.useCollectors:
+            await self._unsubscribe_collectors(input)
+        return self._articles.articles()
+
+    async def _next_delivery(self) -> Optional[Dict]:
+        """Wait for term collectors to deliver, returns the batch merged by date or None on exit"""
+        await workflow.wait_condition(lambda: bool(self._deliveries) or self._exit)
+        if not self._deliveries:
+            return None
+        deliveries, self._deliveries = self._deliveries, []
+        for delivery in deliveries:
+            self._processed_dates.update(delivery.results)
+        logger.info(f"Merging results for {', '.join(delivery.term for delivery in deliveries)}")
+        return merge_term_results([delivery.results for delivery in deliveries])
+
+    async def _next_tick(self) -> Optional[str]:
+        """Wait for the schedule to tick, returns the date to search or None on exit"""
+        await workflow.wait_condition(lambda: self._tick_date is not None or self._exit)
+        tick_date, self._tick_date = self._tick_date, None
+        return None if self._exit else tick_date
+
+    async def _unsubscribe_collectors(self, input: NewsfeedInput) -> None:
+        feed_id = workflow.info().workflow_id
+        for term in split_topic_terms(input.topicString):
+            try:
+                await workflow.get_external_workflow_handle(term_collector_id(term)).signal("unsubscribe", feed_id)
+            except Exception as e:
+                # Collectors drop feeds they can no longer deliver to anyway
+                logger.warning(f"Could not unsubscribe from '{term}': {e}")
+
 
+    async def _search(self, input: NewsfeedInput) -> Dict:
+        """Run the search activity, either for the whole topic string or one activity per term"""
+        terms = split_topic_terms(input.topicString)
+        # The search doesn't need the accumulated results
+        search_input = dataclasses.replace(input, previousResults=[], state=None)
+        if not input.fanOut or len(terms) < 2:
+            return await workflow.execute_activity(
+                NewsActivities.search_news,
+                search_input,
+                task_queue=NEWS_SEARCH_TASK_QUEUE,
+                schedule_to_close_timeout=self._sched_to_close_timeout,
+                retry_policy=self._retry_policy
+            )
+
+        # Bound how many searches are in flight to stay inside SerpAPI rate limits
+        semaphore = asyncio.Semaphore(max(1, input.maxParallelSearches))
+
+        async def search_term(term: str) -> Dict:
+            async with semaphore:
+                term_input = dataclasses.replace(search_input, topicString=term)
+                return await workflow.execute_activity(
+                    NewsActivities.search_news,
+                    term_input,
+                    task_queue=NEWS_SEARCH_TASK_QUEUE,
+                    schedule_to_close_timeout=self._sched_to_close_timeout,
+                    retry_policy=self._retry_policy
+                )
+
+        logger.info(f"Fanning out search over {len(terms)} terms, {input.maxParallelSearches} at a time")
+        term_results = await asyncio.gather(*(search_term(term) for term in terms), return_exceptions=True)
+
+        successful = []
+        for term, term_result in zip(terms, term_results):
+            if isinstance(term_result, BaseException):
+                logger.error(f"Search for term '{term}' failed: {term_result}")
+            else:
+                successful.append(term_result)
+        if not successful:
+            raise ApplicationError("Search failed for every topic term")
+
+        return merge_term_results(successful)
+
+    async def _collapse_near_duplicates(self, input: NewsfeedInput, results: Dict) -> Dict:
+        """Drop copies of stories already in this batch or the feed, best effort"""
+        if input.nearDuplicateDistance < 0 or not isinstance(results, dict):
+            return results
+        try:
+            return await workflow.execute_activity(
+                NewsActivities.collapse_near_duplicates,
+                NearDuplicateInput(results, self._articles.simhashes(), input.nearDuplicateDistance),
+                task_queue=NEWS_SEARCH_TASK_QUEUE,
+                schedule_to_close_timeout=self._sched_to_close_timeout,
+                retry_policy=self._retry_policy
+            )
+        except ActivityError as ae:
+            # Exact dedupe still applies, better some repeats than no results
+            logger.error(f"Near-duplicate detection failed, merging results as is: {ae}")
+            return results
+
+    async def _tag_watchlist_entities(self, input: NewsfeedInput, results: Dict) -> Dict:
+        """Tag the batch with the watchlist entities it mentions, one activity per batch, best effort"""
+        if not input.watchlistTagging or not isinstance(results, dict) or not any(results.values()):
+            return results
+        try:
+            return await workflow.execute_activity(
+                NewsActivities.tag_watchlist_entities,
+                results,
+                task_queue=NEWS_SEARCH_TASK_QUEUE,
+                schedule_to_close_timeout=self._sched_to_close_timeout,
+                retry_policy=self._retry_policy
+            )
+        except ActivityError as ae:
+            # Untagged articles are still worth merging
+            logger.error(f"Watchlist tagging failed, merging results untagged: {ae}")
+            return results
+
+    async def _store_articles(self, articles: List[Dict], reset: bool = False) -> None:
+        """Link articles to this feed in the article store and drop the ones trimmed since last time"""
+        removed = self._articles.drain_trimmed()
+        if not articles and not removed and not reset:
+            return
+        await workflow.execute_activity(
+            NewsActivities.store_articles,
+            StoreArticlesInput(self._feed_id, self._articles.cursor, articles, removed, reset),
+            task_queue=NEWS_SEARCH_TASK_QUEUE,
+            schedule_to_close_timeout=self._sched_to_close_timeout,
+            retry_policy=self._retry_policy
+        )
 
     @workflow.update
     async def append_result(self, new_result: Dict) -> List[Dict]:
-        self._newsfeed_result.append(new_result)
-        return self._newsfeed_result
+        article = Article.from_result(new_result)
+        added = self._articles.add(article)
+        if added is not None and self._feed_id is not None:
+            # Nothing stored this one's body yet
+            await self._store_articles([dict(added, thumbnail=article.thumbnail)])
+        return self._articles.articles()
+
+    @workflow.update
+    async def wait_for_first_results(self, page_size: int) -> Dict:
+        """Update that completes as soon as the first search batch has been merged,
+        returns the same shape as get_overview"""
+        await workflow.wait_condition(lambda: self._first_batch_merged)
+        return self._articles.overview(page_size)
 
     @workflow.query
     def newsfeed_details(self) -> List[Dict]:
-        return self._newsfeed_result
+        return self._articles.articles()
     
     @workflow.query
     def get_current_results(self) -> List[Dict]:
         """Query to get current accumulated results"""
-        return self._newsfeed_result
+        return self._articles.articles()
+
+    @workflow.query
+    def get_overview(self, page_size: int) -> Dict:
+        """Query for the dates available with their counts, the first page of the
+        newest date and the cursor to stream updates from"""
+        return self._articles.overview(page_size)
+
+    @workflow.query
+    def get_dates(self) -> List[Dict]:
+        """Query for the dates available, newest first, with article counts"""
+        return self._articles.date_counts()
+
+    @workflow.query
+    def get_page(self, request: PageRequest) -> Dict:
+        """Query for page K of the articles found on date D"""
+        return self._articles.page(request.date, request.page, request.pageSize)
+
+    @workflow.query
+    def get_state(self) -> Dict:
+        """Query for the compact article state, used to seed a replacement workflow"""
+        return self._articles.to_payload()
+
+    @workflow.query
+    def get_results_since(self, cursor: int) -> Dict:
+        """Query to get only the results added after the given cursor.
+
+        The cursor is the sequence number returned by the previous call (0 to
+        start), the returned cursor is the one to send next time. If the caller
+        is ahead of this workflow (e.g. it was replaced) everything is returned
+        with reset set so the caller can start over.
+        """
+        return self._articles.since(cursor)
 
     @workflow.signal
     def exit(self) -> None:
         self._exit = True
+
+    @workflow.signal
+    def search_now(self, search_date: str) -> None:
+        """Signal from this topic's schedule (SearchTickWorkflow) to run the next search"""
+        self._tick_date = search_date
+
+    @workflow.signal
+    def deliver_articles(self, batch: TermResults) -> None:
+        """Signal from a TermCollectorWorkflow with the latest results for one of our terms"""
+        self._deliveries.append(batch)
         
     @workflow.signal
     def is_running(self) -> None:
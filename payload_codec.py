@@ -0,0 +1,89 @@
+import dataclasses
+import zlib
+from typing import Iterable, List
+
+import temporalio.converter
+from temporalio.api.common.v1 import Payload
+from temporalio.converter import PayloadCodec
+
+from config import get_config
+
+ZLIB_ENCODING = b'binary/zlib'
+ZSTD_ENCODING = b'binary/zstd'
+
+
+def _zstd():
+    # zstandard is optional, zlib is always there
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+class CompressionCodec(PayloadCodec):
+    """
+    Compresses Temporal payloads at or above threshold bytes.
+
+    The whole serialized payload (metadata and data) is compressed and
+    wrapped in a payload whose encoding names the algorithm, so decode can
+    tell compressed payloads from plain ones. Plain payloads pass through,
+    which lets workflows started before compression was turned on keep
+    running. Payloads that don't shrink are sent as they are.
+    """
+
+    def __init__(self, algorithm: str = 'zlib', threshold: int = 1024, level: int = 6):
+        if algorithm not in ('zlib', 'zstd'):
+            raise ValueError(f"Unknown payload compression: {algorithm}")
+        zstandard = _zstd() if algorithm == 'zstd' else None
+        self.threshold = threshold
+        self.level = level
+        # Fall back to zlib when zstandard isn't installed, decode handles both either way
+        self.encoding = ZSTD_ENCODING if zstandard else ZLIB_ENCODING
+        self._zstd_compressor = zstandard.ZstdCompressor(level=level) if zstandard else None
+
+    async def encode(self, payloads: Iterable[Payload]) -> List[Payload]:
+        return [self._encode(payload) for payload in payloads]
+
+    async def decode(self, payloads: Iterable[Payload]) -> List[Payload]:
+        return [self._decode(payload) for payload in payloads]
+
+    def _encode(self, payload: Payload) -> Payload:
+        data = payload.SerializeToString()
+        if len(data) < self.threshold:
+            return payload
+        if self._zstd_compressor is not None:
+            compressed = self._zstd_compressor.compress(data)
+        else:
+            compressed = zlib.compress(data, self.level)
+        if len(compressed) >= len(data):
+            return payload
+        return Payload(metadata={'encoding': self.encoding}, data=compressed)
+
+    @staticmethod
+    def _decode(payload: Payload) -> Payload:
+        encoding = payload.metadata.get('encoding', b'')
+        if encoding == ZLIB_ENCODING:
+            return Payload.FromString(zlib.decompress(payload.data))
+        if encoding == ZSTD_ENCODING:
+            zstandard = _zstd()
+            if zstandard is None:
+                raise RuntimeError("Payload is zstd compressed but the zstandard package is not installed")
+            return Payload.FromString(zstandard.ZstdDecompressor().decompress(payload.data))
+        return payload
+
+
+def create_payload_codec(codec_cfg: dict = None):
+    """The codec selected in config.py's temporal.payload_codec section, None when compression is off"""
+    codec_cfg = codec_cfg or get_config()['temporal']['payload_codec']
+    if codec_cfg['compression'] in ('', 'none'):
+        return None
+    return CompressionCodec(codec_cfg['compression'], codec_cfg['threshold'], codec_cfg['level'])
+
+
+def create_data_converter() -> temporalio.converter.DataConverter:
+    """Default data converter plus the configured payload codec, shared by workers, web and codec server"""
+    codec = create_payload_codec()
+    if codec is None:
+        return temporalio.converter.default()
+    return dataclasses.replace(temporalio.converter.default(), payload_codec=codec)
@@ -4,18 +4,26 @@ import os
 import uuid
 from datetime import date, timedelta
 from dotenv import load_dotenv
-from flask import Flask, current_app, render_template, request
+from quart import Quart, Response, current_app, render_template, request
 from logging import getLogger
 from newsfeed_workflow import NewsfeedWorkflow
-from news_data import NewsfeedInput, NEWS_TASK_QUEUE
+from news_data import NewsfeedInput, NEWS_TASK_QUEUE, PageRequest, split_topic_terms, term_collector_id, TermCollectorInput
 from temporalio.client import Client
 from temporalio.exceptions import WorkflowAlreadyStartedError
+from temporalio.service import RPCError, RPCStatusCode
 from typing import List, Dict
 import hashlib
 import json
 from pathlib import Path
 
-from temporal_client import NewTemporalClient
+from article_store import get_article_store
+from config import get_config
+from newsfeed_stream import NewsfeedBroadcaster
+from term_collector_workflow import TermCollectorWorkflow
+from search_schedule import ensure_search_schedule
+from search_cache import get_search_cache
+from temporal_client import temporal_clients
+from workflow_store import create_workflow_mapping_store
 
 logger = getLogger(__name__)
 coloredlogs.install(level='INFO')
@@ -24,47 +32,68 @@ load_dotenv()
 
 NEWS_TOPIC = os.getenv("NEWS_TOPIC", "bitoin Apple OpenAI")
 
-# Store workflow ID mappings in a JSON file for persistence between app restarts
-WORKFLOW_MAPPINGS_FILE = 'workflow_mappings.json'
+# How often the shared stream poller queries each watched workflow, and how
+# often an idle stream sends a keepalive comment
+STREAM_POLL_SECONDS = float(os.getenv("NEWSFEED_STREAM_POLL_SECONDS", "15"))
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("NEWSFEED_STREAM_KEEPALIVE_SECONDS", "20"))
 
-app = Flask(__name__, template_folder='./ui/templates',
+# Maximum time a new search waits for the workflow's first batch of results
+FIRST_RESULTS_TIMEOUT_SECONDS = float(os.getenv("NEWSFEED_FIRST_RESULTS_TIMEOUT_SECONDS", "30"))
+
+# Store workflow ID mappings for persistence between app restarts (SQLite by default)
+cfg = get_config()
+
+# Articles per page when a feed is rendered or paged through one date at a time
+PAGE_SIZE = cfg['newsfeed']['page_size']
+
+# ASGI app, every request runs on the one server event loop and shares one Temporal client.
+# Serve with: hypercorn run_web:app
+app = Quart(__name__, template_folder='./ui/templates',
             static_folder='./ui/static')
-app.env = "development"
+app.temporal_clients = temporal_clients
+schedule_cfg = cfg['newsfeed']['schedule']
+# Intervals offered in the UI when topics run on schedules, in minutes
+SCHEDULE_CADENCES = {60: 'Hourly', 360: 'Every 6 hours', 720: 'Twice a day', 1440: 'Daily'}
+app.workflow_mappings = create_workflow_mapping_store(cfg['web']['workflow_store'])
+# Feeds read straight from the article store when it is enabled, None otherwise
+app.article_store = get_article_store()
+app.newsfeed_broadcaster = NewsfeedBroadcaster(temporal_clients, interval=STREAM_POLL_SECONDS,
+                                               max_articles=cfg['newsfeed']['max_articles'],
+                                               article_store=app.article_store)
 
 
-async def connect_temporal(app):
-    client: Client = await NewTemporalClient()
-    app.temporal_client = client
+# RPC failures that mean the shared channel itself is unusable
+RECONNECT_STATUS_CODES = (RPCStatusCode.UNAVAILABLE, RPCStatusCode.UNAUTHENTICATED)
 
 
-def get_client() -> Client:
-    return current_app.temporal_client
+@app.before_serving
+async def connect_temporal():
+    # Connect once at startup, requests share this client from then on
+    try:
+        await app.temporal_clients.get_client()
+    except Exception as e:
+        logger.error(f"Could not connect to Temporal at startup, will retry on first request: {e}")
 
 
-@app.route('/', methods=['GET'])
-async def index():
-    search_id = str(uuid.uuid4().int)[:6]
-    return render_template(template_name_or_list='index.html', title="Newsfeed Aggregator", search_id=search_id)
+@app.after_serving
+async def close_streams():
+    await app.newsfeed_broadcaster.close()
 
 
-# Function to load existing workflow mappings
-def load_workflow_mappings():
-    if os.path.exists(WORKFLOW_MAPPINGS_FILE):
-        try:
-            with open(WORKFLOW_MAPPINGS_FILE, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading workflow mappings: {e}")
-    return {}
+async def get_client() -> Client:
+    return await current_app.temporal_clients.get_client()
 
 
-# Function to save workflow mappings
-def save_workflow_mappings(mappings):
-    try:
-        with open(WORKFLOW_MAPPINGS_FILE, 'w') as f:
-            json.dump(mappings, f)
-    except Exception as e:
-        logger.error(f"Error saving workflow mappings: {e}")
+def check_client_error(client: Client, err: Exception):
+    # Drop the shared client on connection level errors so the next request reconnects
+    if isinstance(err, RPCError) and err.status in RECONNECT_STATUS_CODES:
+        current_app.temporal_clients.invalidate(client)
+
+
+@app.route('/', methods=['GET'])
+async def index():
+    search_id = str(uuid.uuid4().int)[:6]
+    return await render_template(template_name_or_list='index.html', title="Newsfeed Aggregator", search_id=search_id)
 
 
 # Create a unique ID for a search query
@@ -73,6 +102,55 @@ def create_query_id(topic_string):
     return hashlib.md5(topic_string.encode()).hexdigest()[:8]
 
 
+@app.context_processor
+async def schedule_options():
+    return {'cadences': SCHEDULE_CADENCES if schedule_cfg['enabled'] else {},
+            'default_cadence': schedule_cfg['interval_minutes']}
+
+
+async def subscribe_to_collectors(client: Client, workflow_id: str, topic_string: str, topic_date: str,
+                                  cadence_minutes: int = None):
+    """Subscribe a feed to the collector of each of its terms, starting collectors that aren't running"""
+    async def subscribe(term):
+        collector_id = term_collector_id(term)
+        await client.start_workflow(
+            TermCollectorWorkflow.run,
+            TermCollectorInput(term, topic_date, scheduled=cadence_minutes is not None,
+                               articleStore=current_app.article_store is not None),
+            id=collector_id,
+            task_queue=NEWS_TASK_QUEUE,
+            start_signal='subscribe',
+            start_signal_args=[workflow_id],
+        )
+        if cadence_minutes is not None:
+            await ensure_search_schedule(client, f"{collector_id}-schedule", collector_id,
+                                         cadence_minutes, schedule_cfg['jitter_seconds'], shared=True)
+    await asyncio.gather(*(subscribe(term) for term in split_topic_terms(topic_string)))
+
+
+async def render_feed(topic_string: str, query_id: str, overview: Dict = None):
+    """Render a feed from get_overview, only the first page of the newest date is sent"""
+    if current_app.article_store is not None:
+        # The workflow only has references, the articles themselves are in the store
+        overview = await asyncio.to_thread(current_app.article_store.overview, query_id, PAGE_SIZE)
+    overview = overview or {'cursor': 0, 'dates': [], 'dateCounts': [], 'page': None}
+    page = overview['page'] or {'date': None, 'articles': [], 'total': 0}
+    logger.info(f"Rendering page of {len(page['articles'])} articles over {len(overview['dates'])} dates")
+    return await render_template(
+        'index.html',
+        title="Newsfeed Aggregator",
+        topic=topic_string,
+        articles=page['articles'],
+        first_page=page,
+        date_counts=overview['dateCounts'],
+        total=sum(entry['count'] for entry in overview['dateCounts']),
+        dates=overview['dates'],
+        query_id=query_id,
+        cursor=overview['cursor'],
+        page_size=PAGE_SIZE
+    )
+
+
 @app.route('/newsfeed', methods=['POST'])
 async def get_newsfeed():
     """
@@ -80,26 +158,34 @@ async def get_newsfeed():
     This is a simplified implementation focused on reliability.
     """
     # Get topic string from form
-    topicString = request.form.get('topicString')
+    form = await request.form
+    topicString = form.get('topicString')
     if not topicString:
         logger.warning("No topic string provided in request")
-        return render_template('index.html', title="Newsfeed Aggregator")
+        return await render_template('index.html', title="Newsfeed Aggregator")
     
     # Create a consistent query ID
     query_id = create_query_id(topicString)
+
+    # Each topic can choose how often it runs when schedules are on
+    cadence_minutes = None
+    if schedule_cfg['enabled']:
+        cadence_minutes = form.get('cadenceMinutes', type=int)
+        if cadence_minutes not in SCHEDULE_CADENCES:
+            cadence_minutes = schedule_cfg['interval_minutes']
     
     # Get today's date
     dt = str(date.today())
     logger.info(f"NEWSFEED REQUEST: topic='{topicString}', date={dt}, query_id={query_id}")
     
     # Initialize client and results container
-    client = await NewTemporalClient()
-    articles = []
+    client = await get_client()
+    overview = None
     workflow_id = None
     
-    # Load existing workflow mappings
-    workflow_mappings = load_workflow_mappings()
-    existing_workflow_id = workflow_mappings.get(query_id)
+    # Look up the workflow already serving this query
+    workflow_mappings = current_app.workflow_mappings
+    existing_workflow_id = await asyncio.to_thread(workflow_mappings.get, query_id)
     
     # STEP 1: Try to get results from an existing workflow
     if existing_workflow_id:
@@ -108,44 +194,36 @@ async def get_newsfeed():
         try:
             # Get handle to existing workflow and query for results
             handle = client.get_workflow_handle(existing_workflow_id)
-            articles = await handle.query(NewsfeedWorkflow.get_current_results)
+            results = await handle.query(NewsfeedWorkflow.get_overview, PAGE_SIZE)
             
             # Send a signal to ensure it keeps running
             try:
                 await handle.signal(NewsfeedWorkflow.is_running)
-                logger.info(f"Signal sent to existing workflow, got {len(articles)} articles")
+                logger.info(f"Signal sent to existing workflow, got {len(results['dateCounts'])} dates")
             except Exception as e:
                 logger.warning(f"Failed to send signal: {e}")
             
             # If we got results, use the existing workflow
-            if articles:
-                logger.info(f"SUCCESS: Using existing workflow with {len(articles)} results")
+            if results['dateCounts']:
+                logger.info(f"SUCCESS: Using existing workflow with results for {results['dates']}")
                 
                 # Return results to the frontend
-                unique_dates = set(article.get('date', '') for article in articles if 'date' in article)
-                logger.info(f"Dates in results: {unique_dates}")
-                
-                return render_template(
-                    'index.html',
-                    title="Newsfeed Aggregator",
-                    topic=topicString,
-                    articles=articles,
-                    dates=list(unique_dates),
-                    query_id=query_id
-                )
+                return await render_feed(topicString, query_id, results)
         
         except Exception as e:
             logger.error(f"ERROR accessing existing workflow: {e}")
+            check_client_error(client, e)
             # Will continue to create a new workflow
     
     # STEP 2: Create a new workflow (either no existing one or it failed)
     # Get any existing results if we had a workflow
-    existing_results = []
+    existing_state = None
     if existing_workflow_id:
         try:
             handle = client.get_workflow_handle(existing_workflow_id)
-            existing_results = await handle.query(NewsfeedWorkflow.get_current_results)
-            logger.info(f"Retrieved {len(existing_results)} results from previous workflow")
+            # The compact state carries the dedupe index, no need to rebuild it from full articles
+            existing_state = await handle.query(NewsfeedWorkflow.get_state)
+            logger.info(f"Retrieved {len(existing_state['rows'])} results from previous workflow")
         except Exception as e:
             logger.warning(f"Could not get existing results: {e}")
     
@@ -155,7 +233,22 @@ async def get_newsfeed():
     
     try:
         # Start the workflow
-        newsfeedInput = NewsfeedInput(dt, topicString, existing_results)
+        newsfeed_cfg = cfg['newsfeed']
+        newsfeedInput = NewsfeedInput(dt, topicString, [],
+                                      state=existing_state,
+                                      fanOut=newsfeed_cfg['fan_out'],
+                                      maxParallelSearches=newsfeed_cfg['max_parallel_searches'],
+                                      retentionDays=newsfeed_cfg['retention_days'],
+                                      maxArticles=newsfeed_cfg['max_articles'],
+                                      snippetChars=newsfeed_cfg['snippet_chars'],
+                                      keepThumbnails=newsfeed_cfg['keep_thumbnails'],
+                                      dedupeIndexSize=newsfeed_cfg['dedupe_index_size'],
+                                      nearDuplicateDistance=newsfeed_cfg['near_duplicate_distance'],
+                                      useCollectors=newsfeed_cfg['collectors'],
+                                      scheduled=cadence_minutes is not None,
+                                      articleStore=current_app.article_store is not None,
+                                      feedId=query_id,
+                                      watchlistTagging=newsfeed_cfg['watchlist']['tagging'])
         workflow = await client.start_workflow(
             NewsfeedWorkflow.run,
             newsfeedInput,
@@ -164,32 +257,30 @@ async def get_newsfeed():
         )
         
         # Save the new workflow ID
-        workflow_mappings[query_id] = workflow_id
-        save_workflow_mappings(workflow_mappings)
+        await asyncio.to_thread(workflow_mappings.set, query_id, workflow_id)
         logger.info(f"New workflow started and mapping saved")
+
+        if newsfeedInput.useCollectors:
+            await subscribe_to_collectors(client, workflow_id, topicString, dt, cadence_minutes)
+            logger.info(f"Subscribed {workflow_id} to term collectors")
+        elif cadence_minutes is not None:
+            # The schedule ticks whichever workflow currently serves this query
+            await ensure_search_schedule(client, f"newsfeed-schedule-{query_id}", workflow_id,
+                                         cadence_minutes, schedule_cfg['jitter_seconds'])
         
-        # Wait for initial results with a timeout
+        # Wait for the first search to be merged, one round trip instead of polling
         logger.info("Waiting for initial results...")
-        wait_time = 0
-        max_wait = 30  # Maximum seconds to wait
-        
-        while wait_time < max_wait:
-            try:
-                articles = await workflow.query(NewsfeedWorkflow.get_current_results)
-                if articles:
-                    logger.info(f"Got {len(articles)} initial results after {wait_time}s")
-                    break
-                
-                # Wait a bit before trying again
-                await asyncio.sleep(3)
-                wait_time += 3
-                logger.info(f"Waiting... ({wait_time}/{max_wait}s)")
-            except Exception as e:
-                logger.warning(f"Error querying workflow: {e}")
-                await asyncio.sleep(3)
-                wait_time += 3
-        
-        logger.info(f"Final result count: {len(articles)}")
+        try:
+            overview = await asyncio.wait_for(
+                workflow.execute_update(NewsfeedWorkflow.wait_for_first_results, PAGE_SIZE),
+                timeout=FIRST_RESULTS_TIMEOUT_SECONDS
+            )
+            logger.info(f"Got initial results for {overview['dates']}")
+        except asyncio.TimeoutError:
+            logger.warning(f"No initial results after {FIRST_RESULTS_TIMEOUT_SECONDS}s, the page will fill in via updates")
+        except Exception as e:
+            logger.warning(f"Error waiting for initial results: {e}")
+ 
     
     except WorkflowAlreadyStartedError as e:
         # Handle the case where the workflow was already started
@@ -197,28 +288,41 @@ async def get_newsfeed():
         handle = e.get_existing_workflow_handle()
         
         try:
-            articles = await handle.query(NewsfeedWorkflow.get_current_results)
-            logger.info(f"Retrieved {len(articles)} articles from existing workflow")
+            overview = await handle.query(NewsfeedWorkflow.get_overview, PAGE_SIZE)
+            logger.info(f"Retrieved results for {overview['dates']} from existing workflow")
         except Exception as query_error:
             logger.error(f"Failed to query existing workflow: {query_error}")
     
     except Exception as e:
         logger.error(f"Error starting workflow: {str(e)}", exc_info=True)
-    
-    # Extract unique dates for the template
-    unique_dates = set(article.get('date', '') for article in articles if 'date' in article)
-    logger.info(f"Dates in results: {unique_dates}")
+        check_client_error(client, e)
     
     # Return results to the frontend
-    logger.info(f"Rendering template with {len(articles)} articles")
-    return render_template(
-        'index.html',
-        title="Newsfeed Aggregator",
-        topic=topicString,
-        articles=articles,
-        dates=list(unique_dates),
-        query_id=query_id
-    )
+    return await render_feed(topicString, query_id, overview)
+
+
+@app.route('/api/newsfeed/<query_id>/dates/<article_date>', methods=['GET'])
+async def get_newsfeed_page(query_id, article_date):
+    """API endpoint for page K of one date's articles, ?page=K (from 0)"""
+    workflow_id = await asyncio.to_thread(current_app.workflow_mappings.get, query_id)
+    if not workflow_id:
+        return json.dumps({"status": "error", "message": "No workflow found for this query"}), 404, {'ContentType': 'application/json'}
+
+    page = request.args.get('page', default=0, type=int)
+    store = current_app.article_store
+    if store is not None:
+        result = await asyncio.to_thread(store.page, query_id, article_date, page, PAGE_SIZE)
+        return json.dumps(dict(result, status="success")), 200, {'ContentType': 'application/json'}
+
+    client = await get_client()
+    try:
+        handle = client.get_workflow_handle(workflow_id)
+        result = await handle.query(NewsfeedWorkflow.get_page, PageRequest(article_date, page, PAGE_SIZE))
+        return json.dumps(dict(result, status="success")), 200, {'ContentType': 'application/json'}
+    except Exception as e:
+        logger.error(f"Error fetching page {page} of {article_date}: {str(e)}")
+        check_client_error(client, e)
+        return json.dumps({"status": "error", "message": str(e)}), 500, {'ContentType': 'application/json'}
 
 
 @app.route('/api/newsfeed/<query_id>', methods=['GET'])
@@ -226,9 +330,8 @@ async def get_newsfeed_updates(query_id):
     """API endpoint to fetch latest newsfeed results for auto-refresh functionality"""
     logger.info(f"API request for updates on query_id: {query_id}")
     
-    # Load workflow mappings
-    workflow_mappings = load_workflow_mappings()
-    workflow_id = workflow_mappings.get(query_id)
+    # Look up the workflow serving this query
+    workflow_id = await asyncio.to_thread(current_app.workflow_mappings.get, query_id)
     
     if not workflow_id:
         logger.warning(f"No workflow found for query_id: {query_id}")
@@ -239,27 +342,43 @@ async def get_newsfeed_updates(query_id):
             "dates": []
         }), 404, {'ContentType': 'application/json'}
     
-    # Connect to Temporal client
-    client = await NewTemporalClient()
-    
+    # Optional cursor, when present only articles after it are returned
+    since = request.args.get('since', type=int)
+
+    client = None
     try:
-        # Get workflow handle and query for results
-        handle = client.get_workflow_handle(workflow_id)
-        articles = await handle.query(NewsfeedWorkflow.get_current_results)
-        
-        # Extract unique dates
-        unique_dates = sorted(list(set(article.get('date', '') for article in articles if 'date' in article)))
-        
-        logger.info(f"API: Returning {len(articles)} articles with dates: {unique_dates}")
-        
+        store = current_app.article_store
+        if store is not None:
+            delta = await asyncio.to_thread(store.since, query_id, since or 0)
+        else:
+            # Reuse the shared Temporal client
+            client = await get_client()
+
+            # Get workflow handle and query for results after the cursor
+            handle = client.get_workflow_handle(workflow_id)
+            delta = await handle.query(NewsfeedWorkflow.get_results_since, since or 0)
+
+        # The ETag changes whenever the workflow, its cursor or the cursor asked for changes,
+        # the same feed state gives a different body for each since
+        etag = f'"{workflow_id}-{delta["cursor"]}-{"full" if since is None else since}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            logger.info(f"API: No new articles since cursor {delta['cursor']}")
+            return '', 304, {'ETag': etag}
+
+        logger.info(f"API: Returning {len(delta['articles'])} articles (cursor {delta['cursor']}) with dates: {delta['dates']}")
+
         return json.dumps({
             "status": "success",
-            "articles": articles,
-            "dates": unique_dates
-        }), 200, {'ContentType': 'application/json'}
+            "mode": "full" if since is None or delta['reset'] else "delta",
+            "cursor": delta['cursor'],
+            "articles": delta['articles'],
+            "dates": delta['dates'],
+            "dateCounts": delta['dateCounts']
+        }), 200, {'ContentType': 'application/json', 'ETag': etag}
         
     except Exception as e:
         logger.error(f"Error fetching updates: {str(e)}")
+        check_client_error(client, e)
         return json.dumps({
             "status": "error", 
             "message": f"Error: {str(e)}",
@@ -268,6 +387,67 @@ async def get_newsfeed_updates(query_id):
         }), 500, {'ContentType': 'application/json'}
 
 
+@app.route('/api/newsfeed/<query_id>/stream', methods=['GET'])
+async def stream_newsfeed_updates(query_id):
+    """Server-sent events stream of new articles, shared across every viewer of a workflow"""
+    workflow_id = await asyncio.to_thread(current_app.workflow_mappings.get, query_id)
+    if not workflow_id:
+        logger.warning(f"No workflow found for query_id: {query_id}")
+        return json.dumps({
+            "status": "error",
+            "message": "No workflow found for this query"
+        }), 404, {'ContentType': 'application/json'}
+
+    # Browsers send the last event id back when they reconnect on their own
+    cursor = request.headers.get('Last-Event-ID', type=int)
+    if cursor is None:
+        cursor = request.args.get('since', default=0, type=int)
+
+    broadcaster = current_app.newsfeed_broadcaster
+    subscription = broadcaster.subscribe(workflow_id, cursor, feed_id=query_id)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield f"id: {event['cursor']}\nevent: articles\ndata: {json.dumps(event)}\n\n".encode()
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    response = Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Streams stay open for as long as the viewer does
+    response.timeout = None
+    return response
+
+
+@app.route('/api/metrics/temporal-client', methods=['GET'])
+async def get_temporal_client_metrics():
+    """Connection reuse and handshake counters for the shared Temporal client"""
+    return json.dumps(current_app.temporal_clients.metrics()), 200, {'ContentType': 'application/json'}
+
+
+@app.route('/api/metrics/newsfeed-stream', methods=['GET'])
+async def get_newsfeed_stream_metrics():
+    """Watched workflows, connected viewers and queries issued by the stream poller"""
+    return json.dumps(current_app.newsfeed_broadcaster.metrics()), 200, {'ContentType': 'application/json'}
+
+
+@app.route('/api/metrics/search-cache', methods=['GET'])
+async def get_search_cache_metrics():
+    """Hit and miss counters of the search cache shared by workers on this host"""
+    cache = get_search_cache()
+    if cache is None:
+        return json.dumps({'enabled': False}), 200, {'ContentType': 'application/json'}
+    metrics = await asyncio.to_thread(cache.metrics)
+    return json.dumps(dict(metrics, enabled=True)), 200, {'ContentType': 'application/json'}
+
+
 if __name__ == "__main__":
-    asyncio.run(connect_temporal(app))
     app.run(debug=True, port=3000)
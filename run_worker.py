@@ -1,61 +1,118 @@
+import argparse
 import asyncio
 import coloredlogs
 import logging
+import multiprocessing
 from dotenv import load_dotenv
 from temporal_client import NewTemporalClient
 from temporalio.worker import Worker
 from newsfeed_workflow import NewsfeedWorkflow
+from term_collector_workflow import TermCollectorWorkflow
+from search_schedule import SearchTickWorkflow
 from activities import NewsActivities
-from news_data import NEWS_TASK_QUEUE
+from news_data import NEWS_NOTIFY_TASK_QUEUE, NEWS_SEARCH_TASK_QUEUE, NEWS_TASK_QUEUE
+from config import get_config
 import concurrent.futures
 
 load_dotenv()
 
 interrupt_event = asyncio.Event()
 
+# Task queues a worker process can poll, see build_task_queues
+KNOWN_ROLES = ('workflow', 'search', 'notify')
 
-async def main() -> None:
+
+def build_task_queues(roles: list) -> dict:
+    """Group the workflows and activities for this process's roles by task queue"""
+    # A worker without a known role would start and poll nothing
+    unknown = [role for role in roles if role not in KNOWN_ROLES]
+    if unknown or not roles:
+        raise ValueError(f"Worker roles must be some of {', '.join(KNOWN_ROLES)}, "
+                         f"got {', '.join(roles) or 'none'}")
+    task_queues = {}
+
+    def add(task_queue, workflows=(), activities=()):
+        entry = task_queues.setdefault(task_queue, {'workflows': [], 'activities': []})
+        entry['workflows'].extend(workflows)
+        entry['activities'].extend(activities)
+
+    if 'workflow' in roles:
+        add(NEWS_TASK_QUEUE, workflows=[NewsfeedWorkflow, TermCollectorWorkflow, SearchTickWorkflow])
+    if 'search' in roles:
+        add(NEWS_SEARCH_TASK_QUEUE, activities=[NewsActivities.search_news,
+                                                NewsActivities.collapse_near_duplicates,
+                                                NewsActivities.tag_watchlist_entities,
+                                                NewsActivities.store_articles])
+    if 'notify' in roles:
+        add(NEWS_NOTIFY_TASK_QUEUE, activities=[NewsActivities.notify_slack])
+    return task_queues
+
+
+async def main(roles: list) -> None:
     logging.basicConfig(level=logging.INFO,
                         format="%(asctime)s | %(levelname)s | %(filename)s:%(lineno)s | %(message)s")
+    worker_cfg = get_config()['temporal']['worker']
+
     # Start client
     client = await NewTemporalClient()
 
-    # Run a worker for the workflow
-    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as activity_executor:
-        worker = Worker(
-            client,
-            task_queue=NEWS_TASK_QUEUE,
-            workflows=[NewsfeedWorkflow],
-            activities=[NewsActivities.search_news,
-                        NewsActivities.notify_slack],
-            activity_executor=activity_executor,
-        )
-        await worker.run()
-
-    # Setup schedule for daily execution
-    # await client.create_schedule(
-    #     "daily-result-accumulator",
-    #     client.schedule_client.Schedule(
-    #         action=client.schedule_client.Schedule.Action(
-    #             start_workflow=client.schedule_client.Schedule.Action.StartWorkflow(
-    #                 workflow="NewsfeedWorkflow",
-    #                 id="weekly-news-workflow",
-    #                 task_queue=NEWS_TASK_QUEUE,
-    #             )
-    #         ),
-    #         spec=client.schedule_client.ScheduleSpec(
-    #             cron_expressions=["0 0 * * *"]  # Daily at midnight
-    #         )
-    #     )
-    # )
+    # Run one worker per task queue, queues with the same name share a worker
+    with concurrent.futures.ThreadPoolExecutor(max_workers=worker_cfg['activity_executor_workers']) as activity_executor:
+        workers = []
+        for task_queue, registrations in build_task_queues(roles).items():
+            logging.info(f"Polling {task_queue} for {len(registrations['workflows'])} workflows "
+                         f"and {len(registrations['activities'])} activities")
+            workers.append(Worker(
+                client,
+                task_queue=task_queue,
+                workflows=registrations['workflows'],
+                activities=registrations['activities'],
+                activity_executor=activity_executor,
+                max_concurrent_activities=worker_cfg['max_concurrent_activities'],
+                max_concurrent_workflow_tasks=worker_cfg['max_concurrent_workflow_tasks'],
+            ))
+        await asyncio.gather(*(worker.run() for worker in workers))
 
-if __name__ == "__main__":
+    # Per-topic schedules are created by the web tier, see search_schedule.py
+
+
+def run_process(roles: list) -> None:
     logger = logging.getLogger(__name__)
     coloredlogs.install(level='INFO')
     loop = asyncio.new_event_loop()
     try:
-        loop.run_until_complete(main())
+        loop.run_until_complete(main(roles))
     except KeyboardInterrupt:
         interrupt_event.set()
         loop.run_until_complete(loop.shutdown_asyncgens())
     # asyncio.run(main())
+
+
+if __name__ == "__main__":
+    worker_cfg = get_config()['temporal']['worker']
+    parser = argparse.ArgumentParser(description="Run Newsfeed Temporal workers")
+    parser.add_argument('--processes', type=int, default=worker_cfg['processes'],
+                        help="worker processes to start on this host")
+    parser.add_argument('--roles', default=','.join(worker_cfg['roles']),
+                        help=f"comma separated task queues to poll: {', '.join(KNOWN_ROLES)}")
+    args = parser.parse_args()
+    roles = [role.strip() for role in args.roles.split(',') if role.strip()]
+    try:
+        build_task_queues(roles)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.processes <= 1:
+        run_process(roles)
+    else:
+        # Every process polls the same task queues, Temporal spreads tasks across them
+        processes = [multiprocessing.Process(target=run_process, args=(roles,), name=f"newsfeed-worker-{i}")
+                     for i in range(args.processes)]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
@@ -0,0 +1,132 @@
+import coloredlogs
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from logging import getLogger
+from typing import List, Optional
+
+from news_data import split_topic_terms
+
+logger = getLogger(__name__)
+coloredlogs.install(level='INFO')
+
+# Shared by every worker process on the host, 0 entries turns the cache off
+SEARCH_CACHE_PATH = os.getenv('SEARCH_CACHE_PATH', 'search_cache.db')
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv('SEARCH_CACHE_TTL_SECONDS', '3600'))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '5000'))
+
+
+def search_cache_key(topic_string: str, topic_date: str, **params) -> str:
+    """
+    Cache key for a search, the same for any ordering or casing of the terms.
+
+    "Apple OpenAI" and "openai apple" share a key. The date and the
+    remaining SerpAPI parameters (tbs, gl, ...) are part of it, so only
+    searches over the same window are shared.
+    """
+    terms = sorted(set(term.casefold() for term in split_topic_terms(topic_string)))
+    return json.dumps([terms, topic_date, sorted(params.items())], separators=(',', ':'))
+
+
+class SearchCache:
+    """
+    TTL cache of search results in a local SQLite file with LRU eviction.
+
+    Entries older than ttl_seconds are never served. Once there are more
+    than max_entries, the least recently used ones are deleted. Hit and
+    miss counters live in the same file so they add up across worker
+    processes.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 3600, max_entries: int = 5000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, "
+            "results TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS search_cache_last_used ON search_cache(last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS search_cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def get(self, key: str) -> Optional[List]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT results, created_at FROM search_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] + self.ttl_seconds <= now:
+                self._count('misses' if row is None else 'expired')
+                return None
+            self._db.execute("UPDATE search_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._count('hits')
+        return json.loads(row[0])
+
+    def put(self, key: str, results: List) -> None:
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO search_cache(key, results, created_at, last_used) VALUES(?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET results = excluded.results, "
+                "created_at = excluded.created_at, last_used = excluded.last_used",
+                (key, json.dumps(results), now, now)
+            )
+            expired = db.execute("DELETE FROM search_cache WHERE created_at <= ?",
+                                 (now - self.ttl_seconds,)).rowcount
+            evicted = db.execute(
+                "DELETE FROM search_cache WHERE key IN "
+                "(SELECT key FROM search_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            if evicted:
+                self._count('evictions', evicted)
+        if expired or evicted:
+            logger.info(f"Search cache dropped {expired} expired and {evicted} least recently used entries")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._db.execute("SELECT name, value FROM search_cache_stats").fetchall())
+            entries = self._db.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        metrics = {name: stats.get(name, 0) for name in ('hits', 'misses', 'expired', 'evictions')}
+        lookups = metrics['hits'] + metrics['misses'] + metrics['expired']
+        metrics['entries'] = entries
+        metrics['hit_rate'] = round(metrics['hits'] / lookups, 3) if lookups else 0
+        return metrics
+
+    @contextmanager
+    def _transaction(self):
+        """One transaction on the shared connection, rolled back if anything in it fails"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                yield self._db
+                self._db.execute("COMMIT")
+            except BaseException:
+                # Left open, every later put on this connection would fail to BEGIN
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        self._db.execute(
+            "INSERT INTO search_cache_stats(name, value) VALUES(?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+
+_search_cache = None
+
+
+def get_search_cache() -> Optional[SearchCache]:
+    """The process wide cache, None when SEARCH_CACHE_MAX_ENTRIES is 0"""
+    global _search_cache
+    if _search_cache is None and SEARCH_CACHE_MAX_ENTRIES > 0:
+        _search_cache = SearchCache(SEARCH_CACHE_PATH, SEARCH_CACHE_TTL_SECONDS, SEARCH_CACHE_MAX_ENTRIES)
+    return _search_cache
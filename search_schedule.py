@@ -0,0 +1,95 @@
+import coloredlogs
+import hashlib
+from datetime import timedelta
+from logging import getLogger
+from news_data import NEWS_TASK_QUEUE, SearchTickInput
+from temporalio import workflow
+from temporalio.client import (Client, Schedule, ScheduleActionStartWorkflow, ScheduleAlreadyRunningError,
+                               ScheduleIntervalSpec, ScheduleOverlapPolicy, SchedulePolicy, ScheduleSpec,
+                               ScheduleUpdate, ScheduleUpdateInput)
+from temporalio.exceptions import ApplicationError
+
+logger = getLogger(__name__)
+coloredlogs.install(level='INFO')
+
+
+@workflow.defn
+class SearchTickWorkflow:
+    """
+    Started by a topic's Temporal Schedule, tells the feed or term collector
+    to run its next search for today's date.
+
+    If the target is gone the tick fails, and the schedule (created with
+    pause_on_failure) pauses itself until the topic is subscribed again.
+    """
+
+    @workflow.run
+    async def run(self, input: SearchTickInput) -> None:
+        search_date = workflow.now().date().isoformat()
+        try:
+            await workflow.get_external_workflow_handle(input.targetWorkflowId).signal("search_now", search_date)
+        except Exception as e:
+            raise ApplicationError(f"Could not tick {input.targetWorkflowId}: {e}", non_retryable=True)
+
+
+def build_search_schedule(schedule_id: str, target_workflow_id: str, interval_minutes: int,
+                          jitter_seconds: int) -> Schedule:
+    every = timedelta(minutes=interval_minutes)
+    # A stable per-topic offset spreads topics across the interval, jitter spreads them further
+    offset = timedelta(seconds=int(hashlib.md5(schedule_id.encode()).hexdigest(), 16) % int(every.total_seconds()))
+    return Schedule(
+        action=ScheduleActionStartWorkflow(
+            SearchTickWorkflow.run,
+            SearchTickInput(target_workflow_id),
+            id=f"{schedule_id}-tick",
+            task_queue=NEWS_TASK_QUEUE,
+            execution_timeout=timedelta(minutes=1),
+        ),
+        spec=ScheduleSpec(
+            intervals=[ScheduleIntervalSpec(every=every, offset=offset)],
+            jitter=timedelta(seconds=min(jitter_seconds, every.total_seconds() / 2)),
+        ),
+        policy=SchedulePolicy(
+            overlap=ScheduleOverlapPolicy.SKIP,
+            # Don't replay missed ticks after an outage, the next one searches anyway
+            catchup_window=every,
+            pause_on_failure=True,
+        ),
+    )
+
+
+async def ensure_search_schedule(client: Client, schedule_id: str, target_workflow_id: str,
+                                 interval_minutes: int, jitter_seconds: int, shared: bool = False) -> None:
+    """
+    Create the schedule ticking a feed or collector, or point an existing one at it and unpause it.
+
+    An existing schedule takes the interval asked for, with the policy built
+    for it. A shared schedule (a term collector's) only ever speeds up, so no
+    subscriber searches less often than it chose.
+    """
+    schedule = build_search_schedule(schedule_id, target_workflow_id, interval_minutes, jitter_seconds)
+    try:
+        await client.create_schedule(schedule_id, schedule)
+        logger.info(f"Created schedule {schedule_id} every {interval_minutes} minutes for {target_workflow_id}")
+        return
+    except ScheduleAlreadyRunningError:
+        pass
+
+    handle = client.get_schedule_handle(schedule_id)
+    chosen = [interval_minutes]
+
+    def update(input: ScheduleUpdateInput) -> ScheduleUpdate:
+        existing = input.description.schedule
+        if shared and existing.spec.intervals:
+            current = int(existing.spec.intervals[0].every.total_seconds() // 60)
+            chosen[0] = min(current, interval_minutes)
+        # Spec and policy are replaced together, the catchup window is one interval of the new cadence
+        replacement = build_search_schedule(schedule_id, target_workflow_id, chosen[0], jitter_seconds)
+        existing.action = replacement.action
+        existing.spec = replacement.spec
+        existing.policy = replacement.policy
+        return ScheduleUpdate(schedule=existing)
+
+    await handle.update(update)
+    await handle.unpause(note=f"Subscribed {target_workflow_id}")
+    logger.info(f"Updated schedule {schedule_id} every {chosen[0]} minutes for {target_workflow_id}")
@@ -0,0 +1,63 @@
+import coloredlogs
+import os
+from logging import getLogger
+
+from slack_sdk.http_retry.builtin_async_handlers import AsyncRateLimitErrorRetryHandler
+from slack_sdk.web.async_client import AsyncWebClient
+
+SLACKAPI_KEY = os.getenv('SLACKAPI_KEY')
+# Point at a local stub (bench/fake_slack.py) to run without a workspace
+SLACK_API_URL = os.getenv('SLACK_API_URL', 'https://slack.com/api/')
+# Slack allows 50 blocks per message, one is the header, and roughly one message per second per channel
+SLACK_ARTICLES_PER_MESSAGE = min(int(os.getenv('SLACK_ARTICLES_PER_MESSAGE', '20')), 49)
+SLACK_MESSAGE_INTERVAL_SECONDS = float(os.getenv('SLACK_MESSAGE_INTERVAL_SECONDS', '1'))
+SLACK_MAX_RATE_LIMIT_RETRIES = int(os.getenv('SLACK_MAX_RATE_LIMIT_RETRIES', '3'))
+# A section's text is capped at 3000 characters, long titles and tag lists are cut well short of it
+SLACK_TITLE_MAX_CHARS = 300
+SLACK_MAX_ENTITIES = 10
+SLACK_ENTITY_MAX_CHARS = 60
+
+logger = getLogger(__name__)
+coloredlogs.install(level='INFO')
+
+
+_slack_client = None
+
+
+def get_slack_client() -> AsyncWebClient:
+    global _slack_client
+    if _slack_client is None:
+        _slack_client = AsyncWebClient(token=SLACKAPI_KEY, base_url=SLACK_API_URL)
+        # Honour Retry-After on 429s instead of dropping the message
+        _slack_client.retry_handlers.append(
+            AsyncRateLimitErrorRetryHandler(max_retry_count=SLACK_MAX_RATE_LIMIT_RETRIES))
+    return _slack_client
+
+
+def slack_escape(text: str) -> str:
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def shorten(text: str, max_chars: int) -> str:
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + '…'
+
+
+def build_slack_blocks(articles: list, part: int, parts: int) -> list:
+    """One header plus one section per article, titles and watchlist tags cut to fit a section"""
+    header = f"*{len(articles)} new articles*"
+    if parts > 1:
+        header += f" ({part}/{parts})"
+    blocks = [{'type': 'section', 'text': {'type': 'mrkdwn', 'text': header}}]
+    for entry in articles:
+        title = slack_escape(shorten(entry.get('title', 'No Title'), SLACK_TITLE_MAX_CHARS))
+        source = slack_escape(entry.get('source', 'Unknown'))
+        entities = entry.get('entities') or []
+        tags = ', '.join(shorten(entity, SLACK_ENTITY_MAX_CHARS) for entity in entities[:SLACK_MAX_ENTITIES])
+        if len(entities) > SLACK_MAX_ENTITIES:
+            tags += f" and {len(entities) - SLACK_MAX_ENTITIES} more"
+        watchlist = f"\n:warning: Watchlist: {slack_escape(tags)}" if entities else ''
+        blocks.append({
+            'type': 'section',
+            'text': {'type': 'mrkdwn', 'text': f"<{entry.get('link', '#')}|{title}>\n_{source}_{watchlist}"}
+        })
+    return blocks
@@ -1,9 +1,12 @@
+import asyncio
 import coloredlogs
 import os
 from logging import getLogger
 from temporalio.client import Client, TLSConfig
 from dotenv import load_dotenv
 
+from payload_codec import create_data_converter
+
 # Create a logger object and use coloredlogs
 logger = getLogger(__name__)
 coloredlogs.install(level='INFO')
@@ -35,7 +38,8 @@ async def NewTemporalClient() -> Client:
         client = await Client.connect(target_host=targethost, namespace=namespacename,
                                       tls=TLSConfig(domain=targetdomain,
                                                     client_cert=clientcert,
-                                                    client_private_key=clientprivatekey)
+                                                    client_private_key=clientprivatekey),
+                                      data_converter=create_data_converter()
                                       )
         # client = await Client.connect(
         #     CLOUD_ADDR,
@@ -47,7 +51,71 @@ async def NewTemporalClient() -> Client:
         logger.info("Cloud Client started on " +
                     targethost)
     else:
-        client = await Client.connect('localhost:7233')
+        client = await Client.connect('localhost:7233', data_converter=create_data_converter())
         logger.info("Local Client started on localhost:7233")
 
     return client
+
+
+class TemporalClientManager:
+    """
+    Process-wide holder for a single Temporal client.
+
+    The client (and its gRPC channel / mTLS session) is created once and
+    handed out to every request on the event loop. If a caller reports the
+    client as broken via invalidate(), the next get_client() call reconnects.
+    """
+
+    def __init__(self, connect=NewTemporalClient):
+        self._connect = connect
+        self._client = None
+        self._connecting = asyncio.Lock()
+        self._handshakes = 0
+        self._reuses = 0
+        self._failures = 0
+        self._invalidations = 0
+
+    async def get_client(self) -> Client:
+        if self._client is not None:
+            self._reuses += 1
+            return self._client
+
+        # Requests arriving while we connect wait for the same handshake
+        async with self._connecting:
+            if self._client is not None:
+                self._reuses += 1
+                return self._client
+            try:
+                self._client = await self._connect()
+            except Exception:
+                self._failures += 1
+                raise
+            self._handshakes += 1
+            return self._client
+
+    def invalidate(self, client: Client = None) -> None:
+        """Drop the cached client so the next request reconnects"""
+        if self._client is None:
+            return
+        if client is not None and client is not self._client:
+            return
+        logger.warning("Discarding cached Temporal client, will reconnect on next request")
+        self._client = None
+        self._invalidations += 1
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None
+
+    def metrics(self) -> dict:
+        return {
+            'connected': self._client is not None,
+            'handshakes': self._handshakes,
+            'reuses': self._reuses,
+            'connect_failures': self._failures,
+            'invalidations': self._invalidations,
+        }
+
+
+# Shared manager used by the web tier
+temporal_clients = TemporalClientManager()
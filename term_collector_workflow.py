@@ -0,0 +1,137 @@
+import coloredlogs
+import dataclasses
+from datetime import timedelta
+from logging import getLogger
+from news_data import Article, NewsfeedInput, NEWS_SEARCH_TASK_QUEUE, TermCollectorInput, TermResults
+from temporalio import workflow
+from temporalio.common import RetryPolicy
+from temporalio.exceptions import ActivityError
+from typing import Dict, List, Optional
+import asyncio
+
+with workflow.unsafe.imports_passed_through():
+    from activities import NewsActivities
+
+from newsfeed_workflow import NewsfeedWorkflow, getNextDate
+
+logger = getLogger(__name__)
+coloredlogs.install(level='INFO')
+
+
+@workflow.defn
+class TermCollectorWorkflow:
+    """
+    Searches one term on a schedule and delivers the results to every feed
+    subscribed to it.
+
+    Feeds are NewsfeedWorkflows started with useCollectors. The web tier
+    subscribes a feed to the collector for each of its terms with
+    signal-with-start, so the collector is created by its first subscriber.
+    Search volume grows with the number of distinct terms instead of the
+    number of feeds. A collector with no subscribers left stops after its
+    next search. In scheduled mode it searches when its term's schedule
+    ticks instead of every intervalSeconds.
+    """
+
+    def __init__(self) -> None:
+        self._sched_to_close_timeout = timedelta(seconds=30)
+        self._retry_policy = RetryPolicy(initial_interval=timedelta(seconds=1),
+                                         backoff_coefficient=2,
+                                         maximum_interval=timedelta(seconds=30),
+                                         maximum_attempts=2,
+                                         non_retryable_error_types=['Exception'])
+        self._subscribers: List[str] = []
+        self._new_subscribers: List[str] = []
+        self._latest: Dict[str, List[Article]] = {}
+        self._tick_date: Optional[str] = None
+
+    @workflow.run
+    async def run(self, input: TermCollectorInput) -> None:
+        # Subscribers from the start signal may already be here
+        self._subscribers = list(dict.fromkeys(input.subscribers + self._subscribers))
+        self._latest = self._latest or input.latest
+        topic_date = input.topicDate
+        logger.info(f"Collecting '{input.term}' for {len(self._subscribers)} feeds")
+
+        while self._subscribers:
+            try:
+                self._latest = await workflow.execute_activity(
+                    NewsActivities.search_news,
+                    NewsfeedInput(topic_date, input.term, [], articleStore=input.articleStore),
+                    task_queue=NEWS_SEARCH_TASK_QUEUE,
+                    schedule_to_close_timeout=self._sched_to_close_timeout,
+                    retry_policy=self._retry_policy
+                )
+            except ActivityError as ae:
+                # Feeds keep what they have, try again next time round
+                logger.error(f"Search for '{input.term}' failed: {ae}")
+            else:
+                self._new_subscribers = []
+                await self._deliver(input.term, self._subscribers)
+
+            if workflow.info().is_continue_as_new_suggested():
+                workflow.continue_as_new(dataclasses.replace(input, topicDate=topic_date,
+                                                             subscribers=self._subscribers,
+                                                             latest=self._latest))
+
+            topic_date = await self._wait(input) or getNextDate(topic_date)
+
+        logger.info(f"No feeds subscribed to '{input.term}', collector exiting")
+
+    async def _wait(self, input: TermCollectorInput) -> Optional[str]:
+        """Sleep until the next search, catching up feeds that subscribe meanwhile.
+
+        Scheduled collectors wait for the schedule's tick and return its date,
+        otherwise this sleeps intervalSeconds and returns None.
+        """
+        wake_at = None if input.scheduled else workflow.now() + timedelta(seconds=input.intervalSeconds)
+        while True:
+            if self._tick_date is not None:
+                tick_date, self._tick_date = self._tick_date, None
+                return tick_date
+            remaining = None
+            if wake_at is not None:
+                remaining = (wake_at - workflow.now()).total_seconds()
+                if remaining <= 0:
+                    return None
+            try:
+                await workflow.wait_condition(lambda: bool(self._new_subscribers) or self._tick_date is not None,
+                                              timeout=remaining)
+            except asyncio.TimeoutError:
+                return None
+            new_subscribers, self._new_subscribers = self._new_subscribers, []
+            if self._latest:
+                await self._deliver(input.term, new_subscribers)
+
+    async def _deliver(self, term: str, feed_ids: List[str]) -> None:
+        batch = TermResults(term, self._latest)
+        deliveries = await asyncio.gather(
+            *(workflow.get_external_workflow_handle(feed_id).signal(NewsfeedWorkflow.deliver_articles, batch)
+              for feed_id in feed_ids),
+            return_exceptions=True)
+        for feed_id, delivery in zip(feed_ids, deliveries):
+            if isinstance(delivery, BaseException):
+                # The feed has finished or been replaced
+                logger.warning(f"Dropping feed {feed_id} from '{term}': {delivery}")
+                if feed_id in self._subscribers:
+                    self._subscribers.remove(feed_id)
+
+    @workflow.signal
+    def subscribe(self, feed_id: str) -> None:
+        if feed_id not in self._subscribers:
+            self._subscribers.append(feed_id)
+        self._new_subscribers.append(feed_id)
+
+    @workflow.signal
+    def search_now(self, search_date: str) -> None:
+        """Signal from this term's schedule (SearchTickWorkflow) to run the next search"""
+        self._tick_date = search_date
+
+    @workflow.signal
+    def unsubscribe(self, feed_id: str) -> None:
+        if feed_id in self._subscribers:
+            self._subscribers.remove(feed_id)
+
+    @workflow.query
+    def get_subscribers(self) -> List[str]:
+        return list(self._subscribers)
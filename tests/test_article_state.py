@@ -0,0 +1,197 @@
+import hashlib
+
+from article_state import STATE_VERSION, ArticleState, FingerprintIndex, article_fingerprint, article_id
+from news_data import Article
+from newsfeed_workflow import merge_term_results
+
+
+def make_article(n: int, **fields) -> Article:
+    defaults = {'title': f"Story {n}", 'link': f"https://example.com/{n}", 'source': f"Outlet {n % 3}",
+                'date': '2025-01-01', 'snippet': f"Snippet {n}"}
+    return Article(**{**defaults, **fields})
+
+
+def filled_state(count: int, **kwargs) -> ArticleState:
+    state = ArticleState(**kwargs)
+    for n in range(count):
+        state.add(make_article(n))
+    return state
+
+
+def test_since_returns_articles_from_the_cursor_on():
+    state = filled_state(5)
+    delta = state.since(3)
+    assert delta['cursor'] == 5
+    assert not delta['reset']
+    assert [article['seq'] for article in delta['articles']] == [3, 4]
+
+
+def test_since_the_current_cursor_is_empty():
+    state = filled_state(5)
+    delta = state.since(state.cursor)
+    assert delta['articles'] == []
+    assert not delta['reset']
+
+
+def test_since_a_cursor_ahead_of_the_feed_resets():
+    state = filled_state(3)
+    for cursor in (-1, 4):
+        delta = state.since(cursor)
+        assert delta['reset']
+        assert [article['seq'] for article in delta['articles']] == [0, 1, 2]
+
+
+def test_cursor_stays_valid_after_trimming():
+    state = filled_state(6, max_articles=3)
+    assert state.trim() == 3
+    # Sequence numbers don't move when old articles go, a client at 4 only misses nothing after it
+    assert [article['seq'] for article in state.since(4)['articles']] == [4, 5]
+    assert [article['seq'] for article in state.since(0)['articles']] == [3, 4, 5]
+    assert state.cursor == 6
+
+
+def test_duplicates_are_not_added_again_after_trimming():
+    state = filled_state(4, max_articles=2)
+    state.trim()
+    assert state.add(make_article(0)) is None
+    assert state.cursor == 4
+
+
+def test_tracking_variants_of_a_link_are_the_same_article():
+    state = ArticleState()
+    assert state.add(make_article(1)) is not None
+    shared = make_article(1, link="http://www.example.com/1/?utm_source=feed")
+    assert state.add(shared) is None
+
+
+def test_the_stored_link_is_the_one_given():
+    state = ArticleState()
+    link = "http://www.example.com/1/?utm_source=feed"
+    assert state.add(make_article(1, link=link))['link'] == link
+    assert state.articles()[0]['link'] == link
+
+
+def test_article_id_is_the_fingerprint_in_hex():
+    fingerprint = article_fingerprint("Title", "https://example.com/a", "2025-01-01")
+    assert article_id("Title", "https://example.com/a", "2025-01-01") == f"{fingerprint:016x}"
+
+
+def test_payload_round_trip():
+    state = filled_state(4)
+    state.add(make_article(9, simhash=12345, entities=["Luke Skywalker"]))
+    restored = ArticleState()
+    restored.load_payload(state.to_payload())
+    assert restored.articles() == state.articles()
+    assert restored.cursor == state.cursor
+    assert restored.simhashes() == [12345]
+    assert restored.add(make_article(2)) is None
+
+
+def test_version_1_payload_is_migrated():
+    fingerprint = article_fingerprint("Story 1", "https://example.com/1", "2025-01-01")
+    payload = {
+        'version': 1,
+        'sequence': 1,
+        'sources': ["Outlet"],
+        # Fingerprints as hex, no simhash or entities columns, no dedupe index
+        'rows': [[0, f"{fingerprint:016x}", "2025-01-01", "Story 1", "https://example.com/1", 0, "Snippet"]],
+    }
+    state = ArticleState()
+    state.load_payload(payload)
+    article, = state.articles()
+    assert article['id'] == f"{fingerprint:016x}"
+    assert article['entities'] == []
+    assert state.simhashes() == []
+    assert state.contains(fingerprint)
+    assert state.to_payload()['version'] == STATE_VERSION
+
+
+def test_version_3_payload_gets_empty_entities():
+    state = filled_state(2)
+    payload = state.to_payload()
+    payload['version'] = 3
+    payload['rows'] = [row[:8] for row in payload['rows']]
+    restored = ArticleState()
+    restored.load_payload(payload)
+    assert [article['entities'] for article in restored.articles()] == [[], []]
+    assert restored.since(1)['articles'][0]['title'] == "Story 1"
+
+
+def dated_state() -> ArticleState:
+    state = ArticleState()
+    for n in range(5):
+        state.add(make_article(n, date='2025-01-02'))
+    for n in range(5, 7):
+        state.add(make_article(n, date='2025-01-01'))
+    return state
+
+
+def test_date_counts_are_newest_first():
+    assert dated_state().date_counts() == [{'date': '2025-01-02', 'count': 5}, {'date': '2025-01-01', 'count': 2}]
+    assert ArticleState().date_counts() == []
+
+
+def test_pages_split_a_date_in_the_order_found():
+    state = dated_state()
+    first = state.page('2025-01-02', 0, 2)
+    assert (first['total'], first['pages'], first['pageSize']) == (5, 3, 2)
+    assert [article['title'] for article in first['articles']] == ["Story 0", "Story 1"]
+    assert [article['title'] for article in state.page('2025-01-02', 2, 2)['articles']] == ["Story 4"]
+    assert state.page('2025-01-02', 3, 2)['articles'] == []
+    assert state.page('2024-12-31', 0, 2)['total'] == 0
+    # A nonsense page size still gives pages of one
+    assert len(state.page('2025-01-02', 0, 0)['articles']) == 1
+
+
+def test_overview_has_the_first_page_of_the_newest_date():
+    overview = dated_state().overview(page_size=3)
+    assert overview['cursor'] == 7
+    assert overview['dateCounts'][0] == {'date': '2025-01-02', 'count': 5}
+    assert overview['page']['date'] == '2025-01-02'
+    assert [article['title'] for article in overview['page']['articles']] == ["Story 0", "Story 1", "Story 2"]
+    assert ArticleState().overview()['page'] is None
+
+
+def test_collector_deliveries_are_interleaved_and_deduped_per_date():
+    apple = {'2025-01-02': [make_article(1), make_article(2), make_article(3)],
+             '2025-01-01': [make_article(9)]}
+    openai = {'2025-01-02': [make_article(4), make_article(2)],
+              '2025-01-03': [make_article(5, link='#'), make_article(6, link='#')]}
+    merged = merge_term_results([apple, openai])
+    assert list(merged) == ['2025-01-01', '2025-01-02', '2025-01-03']
+    # Round robin over the terms, the article both terms found is kept once
+    assert [item.title for item in merged['2025-01-02']] == ["Story 1", "Story 4", "Story 2", "Story 3"]
+    assert [item.title for item in merged['2025-01-01']] == ["Story 9"]
+    # Articles without a link are never taken for duplicates
+    assert [item.title for item in merged['2025-01-03']] == ["Story 5", "Story 6"]
+    assert merge_term_results([]) == {}
+
+
+def test_version_4_fingerprints_are_rekeyed_on_the_canonical_link():
+    link = "https://example.com/1?utm_source=feed"
+    # Before version 5 the link was hashed as given
+    old_key = int.from_bytes(hashlib.blake2b(f"Story 1-{link}-2025-01-01".encode(), digest_size=8).digest(), 'big')
+    old_index = FingerprintIndex()
+    old_index.add(old_key)
+    old_index.add(123)
+    payload = {
+        'version': 4,
+        'sequence': 2,
+        'sources': ["Outlet"],
+        'rows': [[0, old_key, "2025-01-01", "Story 1", link, 0, "Snippet", 0, []],
+                 # A row whose content lives in the article store can't be recomputed
+                 [1, 123, "2025-01-01", "", "", 0, "", 0, []]],
+        'index': old_index.to_payload(),
+        'thumbnails': {f"{old_key:016x}": "https://example.com/1.jpg"},
+    }
+    state = ArticleState()
+    state.load_payload(payload)
+    first, second = state.articles()
+    assert first['id'] == article_id("Story 1", link, "2025-01-01")
+    assert first['link'] == link
+    assert first['thumbnail'] == "https://example.com/1.jpg"
+    assert second['id'] == f"{123:016x}"
+    # The same article without tracking parameters is now a duplicate
+    assert state.add(make_article(1)) is None
+    assert state.contains(old_key)
+    assert state.to_payload()['version'] == STATE_VERSION
@@ -0,0 +1,93 @@
+import sqlite3
+
+import pytest
+
+from article_state import ArticleState
+from article_store import ArticleStore, SqliteArticleStore, store_search_results, with_stored_snippets
+from news_data import Article
+
+DATE = '2025-01-01'
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SqliteArticleStore(str(tmp_path / 'articles.db'))
+
+
+def link_feed(store, articles, cursor=None):
+    """Store the bodies and link them to a feed the way the workflow does"""
+    slim = store_search_results(store, DATE, articles)
+    state = ArticleState(keep_content=False)
+    linked = [state.add(article) for article in slim]
+    store.link_articles('feed', state.cursor if cursor is None else cursor,
+                        [{'seq': article['seq'], 'id': article['id'], 'date': DATE} for article in linked], [])
+    return linked
+
+
+def make_articles(count):
+    return [Article(title=f"Story {n}", link=f"http://www.example.com/{n}?utm_source=feed", snippet=f"Snippet {n}")
+            for n in range(count)]
+
+
+def test_bodies_keep_the_original_link(store):
+    link_feed(store, make_articles(2))
+    assert [article['link'] for article in store.since('feed', 0)['articles']] == \
+        ["http://www.example.com/0?utm_source=feed", "http://www.example.com/1?utm_source=feed"]
+
+
+def test_since_matches_the_article_state(store):
+    linked = link_feed(store, make_articles(3))
+    delta = store.since('feed', 1)
+    assert delta['cursor'] == 3
+    assert not delta['reset']
+    assert [article['id'] for article in delta['articles']] == [article['id'] for article in linked[1:]]
+    assert delta['dateCounts'] == [{'date': DATE, 'count': 3}]
+    assert store.since('feed', 5)['reset']
+
+
+def test_since_leaves_rows_past_the_cursor_for_the_next_call(store):
+    link_feed(store, make_articles(3), cursor=2)
+    assert [article['seq'] for article in store.since('feed', 0)['articles']] == [0, 1]
+
+
+def test_stored_snippets_are_read_back(store):
+    slim = store_search_results(store, DATE, make_articles(2))
+    assert [article.snippet for article in slim] == ['', '']
+    filled = with_stored_snippets(store, {DATE: slim})
+    assert [article.snippet for article in filled[DATE]] == ["Snippet 0", "Snippet 1"]
+
+
+def test_a_failed_write_does_not_break_the_store(store):
+    # title is NOT NULL, the batch fails half way through its transaction
+    with pytest.raises(sqlite3.IntegrityError):
+        store.store_bodies([{'id': 'a', 'title': "Fine"}, {'id': 'b', 'title': None}])
+    with pytest.raises(sqlite3.IntegrityError):
+        store.link_articles('feed', 1, [{'seq': 0, 'id': None, 'date': DATE}], [])
+    link_feed(store, make_articles(2))
+    assert [article['title'] for article in store.since('feed', 0)['articles']] == ["Story 0", "Story 1"]
+    assert store.snippets(['a']) == {}
+
+
+def test_backends_must_implement_the_whole_interface():
+    class Partial(ArticleStore):
+        def store_bodies(self, articles):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_a_run_starting_over_replaces_the_previous_runs_rows(store):
+    link_feed(store, make_articles(3))
+    # A replacement run numbers its articles from 0 again
+    store.link_articles('feed', 0, [], [], reset=True)
+    assert store.since('feed', 0)['articles'] == []
+    assert store.date_counts('feed') == []
+    slim = store_search_results(store, DATE, [Article(title="New story", link="https://example.com/new")])
+    state = ArticleState(keep_content=False)
+    added = state.add(slim[0])
+    store.link_articles('feed', state.cursor, [{'seq': added['seq'], 'id': added['id'], 'date': DATE}], [])
+    assert [article['title'] for article in store.page('feed', DATE)['articles']] == ["New story"]
+    assert store.date_counts('feed') == [{'date': DATE, 'count': 1}]
+    # A client still at the old run's cursor starts over
+    assert store.since('feed', 3)['reset']
@@ -0,0 +1,82 @@
+import pytest
+
+from near_duplicates import canonical_url, collapse_near_duplicates, hamming, simhash, title_tokens
+from news_data import Article
+
+
+@pytest.mark.parametrize('url, expected', [
+    ("http://www.Example.com/story/", "https://example.com/story"),
+    ("https://example.com:443/story", "https://example.com/story"),
+    ("https://example.com:8443/story", "https://example.com:8443/story"),
+    ("https://amp.example.com/story/amp", "https://example.com/story"),
+    ("https://example.com//a//b/#comments", "https://example.com/a/b"),
+    ("https://example.com/story?utm_source=x&utm_medium=y&fbclid=z", "https://example.com/story"),
+    ("https://example.com/story?b=2&ref=home&a=1", "https://example.com/story?a=1&b=2"),
+    ("https://example.com/", "https://example.com/"),
+])
+def test_canonical_url(url, expected):
+    assert canonical_url(url) == expected
+
+
+@pytest.mark.parametrize('url', ['', '#', 'not a link', 'https://[::1'])
+def test_canonical_url_leaves_what_it_cannot_parse(url):
+    assert canonical_url(url) == url
+
+
+def test_canonical_url_is_idempotent():
+    url = "http://www.example.com/a/amp/?utm_source=x&b=2&a=1#top"
+    assert canonical_url(canonical_url(url)) == canonical_url(url)
+
+
+def test_title_tokens_drop_the_outlet_and_stopwords():
+    assert title_tokens("The Apple iPhone launch is delayed - Reuters") == ['apple', 'delayed', 'iphone', 'launch']
+
+
+def test_simhash_of_nothing_is_zero():
+    assert simhash([]) == 0
+
+
+def test_simhash_is_stable_and_64_bit():
+    tokens = title_tokens("Apple delays the iPhone launch")
+    assert simhash(tokens) == simhash(list(tokens))
+    assert 0 < simhash(tokens) < 2 ** 64
+
+
+def test_simhash_ignores_order_punctuation_and_stopwords():
+    a = simhash(title_tokens("Apple delays iPhone launch"))
+    assert a == simhash(title_tokens("Launch of the iPhone: Apple delays - The Verge"))
+
+
+def test_different_stories_are_far_apart():
+    a = simhash(title_tokens("Apple delays iPhone launch until spring"))
+    b = simhash(title_tokens("Central bank raises interest rates again"))
+    assert hamming(a, b) > 3
+
+
+def test_collapse_keeps_the_original_link():
+    link = "http://www.example.com/story/?utm_source=feed"
+    results, dropped = collapse_near_duplicates({'2025-01-01': [Article(title="Apple delays iPhone", link=link)]})
+    kept, = results['2025-01-01']
+    assert dropped == 0
+    assert kept.link == link
+    assert kept.simhash == simhash(title_tokens("Apple delays iPhone"))
+
+
+def test_collapse_drops_variants_of_a_link_and_rewritten_headlines():
+    items = [
+        Article(title="Apple delays iPhone launch", link="https://example.com/a"),
+        Article(title="Something else entirely", link="http://www.example.com/a?utm_source=x"),
+        Article(title="Apple delays the iPhone launch - Reuters", link="https://reuters.com/b"),
+        Article(title="Central bank raises rates", link="https://example.com/c"),
+    ]
+    results, dropped = collapse_near_duplicates({'2025-01-01': items})
+    assert dropped == 2
+    assert [item.link for item in results['2025-01-01']] == ["https://example.com/a", "https://example.com/c"]
+
+
+def test_collapse_drops_stories_already_in_the_feed():
+    known = [simhash(title_tokens("Apple delays iPhone launch"))]
+    results, dropped = collapse_near_duplicates(
+        {'2025-01-01': [Article(title="Apple delays iPhone launch - BBC", link="https://bbc.co.uk/x")]}, known)
+    assert dropped == 1
+    assert results == {'2025-01-01': []}
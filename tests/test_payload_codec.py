@@ -0,0 +1,78 @@
+import asyncio
+import zlib
+
+import pytest
+import temporalio.converter
+from temporalio.api.common.v1 import Payload
+
+from payload_codec import ZLIB_ENCODING, ZSTD_ENCODING, CompressionCodec, create_payload_codec
+
+converter = temporalio.converter.default().payload_converter
+
+
+def round_trip(codec, payloads):
+    encoded = asyncio.run(codec.encode(payloads))
+    return encoded, asyncio.run(codec.decode(encoded))
+
+
+def search_result(articles: int) -> Payload:
+    return converter.to_payloads([{'2025-01-01': [{'title': f"Story {n}", 'link': f"https://example.com/{n}",
+                                                   'snippet': "Some snippet text " * 5}
+                                                  for n in range(articles)]}])[0]
+
+
+def test_large_payloads_are_compressed_and_restored():
+    payload = search_result(50)
+    (encoded,), (decoded,) = round_trip(CompressionCodec('zlib', threshold=1024), [payload])
+    assert encoded.metadata['encoding'] == ZLIB_ENCODING
+    assert encoded.ByteSize() < payload.ByteSize()
+    assert decoded == payload
+    assert converter.from_payloads([decoded]) == converter.from_payloads([payload])
+
+
+def test_small_payloads_pass_through():
+    payload = converter.to_payloads(["short"])[0]
+    (encoded,), (decoded,) = round_trip(CompressionCodec('zlib', threshold=1024), [payload])
+    assert encoded == payload
+    assert decoded == payload
+
+
+def test_payloads_that_do_not_shrink_pass_through():
+    payload = Payload(metadata={'encoding': b'binary/plain'}, data=zlib.compress(bytes(range(256)) * 16))
+    (encoded,), _ = round_trip(CompressionCodec('zlib', threshold=0), [payload])
+    assert encoded == payload
+
+
+def test_plain_payloads_from_before_compression_decode_unchanged():
+    payload = search_result(50)
+    assert asyncio.run(CompressionCodec('zlib').decode([payload])) == [payload]
+
+
+def test_mixed_batches_keep_their_order():
+    payloads = [search_result(50), converter.to_payloads(["short"])[0], search_result(20)]
+    encoded, decoded = round_trip(CompressionCodec('zlib', threshold=1024), payloads)
+    assert [payload.metadata['encoding'] == ZLIB_ENCODING for payload in encoded] == [True, False, True]
+    assert decoded == payloads
+
+
+def test_zstd_round_trip():
+    zstandard_installed = True
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        zstandard_installed = False
+    payload = search_result(50)
+    (encoded,), (decoded,) = round_trip(CompressionCodec('zstd', threshold=1024), [payload])
+    # Without zstandard the codec falls back to zlib
+    assert encoded.metadata['encoding'] == (ZSTD_ENCODING if zstandard_installed else ZLIB_ENCODING)
+    assert decoded == payload
+
+
+def test_unknown_algorithm_is_rejected():
+    with pytest.raises(ValueError):
+        CompressionCodec('lz4')
+
+
+def test_compression_off_gives_no_codec():
+    assert create_payload_codec({'compression': 'none', 'threshold': 1024, 'level': 6}) is None
+    assert create_payload_codec({'compression': '', 'threshold': 1024, 'level': 6}) is None
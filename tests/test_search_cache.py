@@ -0,0 +1,65 @@
+import pytest
+
+from search_cache import SearchCache, search_cache_key
+
+PARAMS = {'tbs': 'qdr:d', 'gl': 'us'}
+
+
+def test_key_ignores_term_order_and_case():
+    assert search_cache_key("Apple OpenAI", '2025-01-01', **PARAMS) == \
+        search_cache_key("openai apple", '2025-01-01', **PARAMS)
+    assert search_cache_key("Open AI, bitcoin", '2025-01-01', **PARAMS) == \
+        search_cache_key("Bitcoin,open ai", '2025-01-01', **PARAMS)
+
+
+def test_key_ignores_repeated_terms_and_parameter_order():
+    assert search_cache_key("apple apple openai", '2025-01-01', tbs='qdr:d', gl='us') == \
+        search_cache_key("openai apple", '2025-01-01', gl='us', tbs='qdr:d')
+
+
+def test_key_keeps_searches_apart():
+    key = search_cache_key("apple openai", '2025-01-01', **PARAMS)
+    assert key != search_cache_key("apple", '2025-01-01', **PARAMS)
+    assert key != search_cache_key("apple openai", '2025-01-02', **PARAMS)
+    assert key != search_cache_key("apple openai", '2025-01-01', tbs='qdr:w', gl='us')
+    # Comma separated terms keep their words together
+    assert search_cache_key("open ai, bitcoin", '2025-01-01') != \
+        search_cache_key("open, ai, bitcoin", '2025-01-01')
+
+
+def test_cache_serves_until_the_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('search_cache.time.time', lambda: now[0])
+    cache = SearchCache(str(tmp_path / 'cache.db'), ttl_seconds=60)
+    cache.put('key', [{'title': "Story"}])
+    assert cache.get('key') == [{'title': "Story"}]
+    now[0] += 60
+    assert cache.get('key') is None
+    assert cache.metrics()['hits'] == 1
+    assert cache.metrics()['expired'] == 1
+
+
+def test_cache_evicts_the_least_recently_used(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('search_cache.time.time', lambda: now[0])
+    cache = SearchCache(str(tmp_path / 'cache.db'), max_entries=2)
+    for key in ('a', 'b'):
+        now[0] += 1
+        cache.put(key, [key])
+    now[0] += 1
+    cache.get('a')
+    now[0] += 1
+    cache.put('c', ['c'])
+    assert cache.get('b') is None
+    assert cache.get('a') == ['a']
+    assert cache.metrics()['evictions'] == 1
+
+
+def test_a_failed_put_does_not_break_the_cache(tmp_path):
+    cache = SearchCache(str(tmp_path / 'cache.db'))
+    cache.put('key', ['kept'])
+    with pytest.raises(TypeError):
+        cache.put('key', [object()])
+    assert cache.get('key') == ['kept']
+    cache.put('other', ['stored'])
+    assert cache.get('other') == ['stored']
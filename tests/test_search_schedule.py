@@ -0,0 +1,70 @@
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+from temporalio.client import ScheduleAlreadyRunningError
+
+from search_schedule import build_search_schedule, ensure_search_schedule
+
+
+class FakeScheduleHandle:
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.unpaused = False
+
+    async def update(self, updater):
+        self.schedule = updater(SimpleNamespace(description=SimpleNamespace(schedule=self.schedule))).schedule
+
+    async def unpause(self, note=None):
+        self.unpaused = True
+
+
+class FakeClient:
+    """Just enough of a Temporal client for ensure_search_schedule"""
+
+    def __init__(self):
+        self.handles = {}
+
+    async def create_schedule(self, schedule_id, schedule):
+        if schedule_id in self.handles:
+            raise ScheduleAlreadyRunningError()
+        self.handles[schedule_id] = FakeScheduleHandle(schedule)
+
+    def get_schedule_handle(self, schedule_id):
+        return self.handles[schedule_id]
+
+
+def ensure(client, target, interval_minutes, shared=False):
+    asyncio.run(ensure_search_schedule(client, 'topic-schedule', target, interval_minutes, 600, shared=shared))
+    return client.handles['topic-schedule']
+
+
+def cadence(schedule):
+    return schedule.spec.intervals[0].every, schedule.policy.catchup_window
+
+
+def test_schedule_offset_and_jitter_stay_within_the_interval():
+    schedule = build_search_schedule('topic-schedule', 'feed-1', 60, 3600)
+    interval = schedule.spec.intervals[0]
+    assert interval.every == timedelta(minutes=60)
+    assert timedelta(0) <= interval.offset < interval.every
+    assert schedule.spec.jitter == timedelta(minutes=30)
+    assert build_search_schedule('topic-schedule', 'feed-2', 60, 3600).spec.intervals[0].offset == interval.offset
+
+
+def test_a_new_interval_replaces_the_spec_and_the_catchup_window():
+    client = FakeClient()
+    ensure(client, 'feed-1', 1440)
+    handle = ensure(client, 'feed-2', 60)
+    assert cadence(handle.schedule) == (timedelta(minutes=60), timedelta(minutes=60))
+    assert handle.schedule.action.args[0].targetWorkflowId == 'feed-2'
+    assert handle.unpaused
+
+
+def test_a_shared_schedule_keeps_the_shortest_interval():
+    client = FakeClient()
+    ensure(client, 'collector', 60, shared=True)
+    handle = ensure(client, 'collector', 1440, shared=True)
+    assert cadence(handle.schedule) == (timedelta(minutes=60), timedelta(minutes=60))
+    handle = ensure(client, 'collector', 15, shared=True)
+    assert cadence(handle.schedule) == (timedelta(minutes=15), timedelta(minutes=15))
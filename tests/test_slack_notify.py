@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip('slack_sdk')
+
+from slack_notify import SLACK_ENTITY_MAX_CHARS, SLACK_MAX_ENTITIES, SLACK_TITLE_MAX_CHARS, build_slack_blocks
+
+
+def section_text(block):
+    assert block['type'] == 'section'
+    return block['text']['text']
+
+
+def test_one_header_and_one_section_per_article():
+    articles = [{'title': "Story 1", 'link': "https://example.com/1", 'source': "Outlet"},
+                {'title': "Story 2", 'link': "https://example.com/2", 'source': "Outlet"}]
+    blocks = build_slack_blocks(articles, 1, 1)
+    assert [section_text(block) for block in blocks] == [
+        "*2 new articles*",
+        "<https://example.com/1|Story 1>\n_Outlet_",
+        "<https://example.com/2|Story 2>\n_Outlet_",
+    ]
+    assert section_text(build_slack_blocks(articles, 2, 3)[0]) == "*2 new articles* (2/3)"
+
+
+def test_missing_fields_and_markup_are_safe():
+    text = section_text(build_slack_blocks([{'title': "AT&T <beats> Q3"}], 1, 1)[1])
+    assert text == "<#|AT&amp;T &lt;beats&gt; Q3>\n_Unknown_"
+
+
+def test_watchlist_tags_are_listed():
+    article = {'title': "Story", 'link': "#", 'source': "Outlet", 'entities': ["Luke Skywalker", "Droid"]}
+    text = section_text(build_slack_blocks([article], 1, 1)[1])
+    assert text.endswith("\n:warning: Watchlist: Luke Skywalker, Droid")
+
+
+def test_long_titles_and_tag_lists_are_cut():
+    article = {'title': "x" * 5000, 'link': "#", 'source': "Outlet",
+               'entities': ["y" * 500] + [f"Entity {n}" for n in range(SLACK_MAX_ENTITIES + 4)]}
+    text = section_text(build_slack_blocks([article], 1, 1)[1])
+    title = text[len("<#|"):text.index('>')]
+    assert len(title) == SLACK_TITLE_MAX_CHARS and title.endswith('…')
+    tags = text.split(":warning: Watchlist: ")[1].split(', ')
+    assert len(tags) == SLACK_MAX_ENTITIES
+    assert len(tags[0]) == SLACK_ENTITY_MAX_CHARS
+    assert tags[-1] == f"Entity {SLACK_MAX_ENTITIES - 2} and 5 more"
+    # Well inside Slack's 3000 characters per section
+    assert len(text) < 3000
+
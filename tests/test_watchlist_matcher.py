@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from watchlist_matcher import WatchlistMatcher, bounded_levenshtein, build_matcher, soundex
+
+
+# Outputs of Postgres' fuzzystrmatch soundex(), including the cases where it
+# differs from the textbook algorithm (H and W don't join consonants)
+@pytest.mark.parametrize('text, expected', [
+    ('Anne', 'A500'),
+    ('Ann', 'A500'),
+    ('Andrew', 'A536'),
+    ('Margaret', 'M626'),
+    ('Robert', 'R163'),
+    ('Rupert', 'R163'),
+    ('Rubin', 'R150'),
+    ('Tymczak', 'T522'),
+    ('Pfister', 'P236'),
+    ('Ashcraft', 'A226'),
+    ('Lee', 'L000'),
+    ('luke skywalker', 'L224'),
+    ('  42 abc', 'A120'),
+    ('', ''),
+    ('1234', ''),
+])
+def test_soundex_matches_fuzzystrmatch(text, expected):
+    assert soundex(text) == expected
+
+
+# levenshtein() and levenshtein_less_equal() results from the fuzzystrmatch docs
+@pytest.mark.parametrize('a, b, max_distance, expected', [
+    ('GUMBO', 'GAMBOL', 2, 2),
+    ('kitten', 'sitting', 3, 3),
+    ('extensive', 'exhaustive', 2, 3),
+    ('extensive', 'exhaustive', 4, 4),
+    ('same', 'same', 2, 0),
+    ('', 'ab', 2, 2),
+    ('', 'abc', 2, 3),
+    ('abcdef', 'ab', 2, 3),
+])
+def test_bounded_levenshtein(a, b, max_distance, expected):
+    assert bounded_levenshtein(a, b, max_distance) == expected
+    assert bounded_levenshtein(b, a, max_distance) == expected
+
+
+def levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        previous = current
+    return previous[-1]
+
+
+def test_bounded_levenshtein_agrees_with_the_full_distance():
+    rng = random.Random(7)
+    for _ in range(2000):
+        a = ''.join(rng.choice('abc ') for _ in range(rng.randint(0, 8)))
+        b = ''.join(rng.choice('abc ') for _ in range(rng.randint(0, 8)))
+        assert bounded_levenshtein(a, b, 2) == min(levenshtein(a, b), 3)
+
+
+def test_matcher_returns_what_the_sql_query_would():
+    rng = random.Random(3)
+
+    def word(alphabet: str) -> str:
+        # A small alphabet so plenty of names are within two edits of each other
+        return ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 10))).strip() or 'a'
+
+    names = list(dict.fromkeys(word('abcdef ') for _ in range(300)))
+    entries = [{'entity': name.title(), 'entity_type': rng.choice(['person', 'organization'])} for name in names]
+    matcher = WatchlistMatcher(entries)
+    keywords = [rng.choice(names) for _ in range(50)] + [word('abcdef') for _ in range(50)]
+    for keyword in keywords:
+        # soundex(lower(entity)) = soundex(lower(:kw)) UNION levenshtein_less_equal(...) <= 2
+        expected = [entry for entry in entries
+                    if soundex(entry['entity'].lower()) == soundex(keyword.lower())
+                    or bounded_levenshtein(entry['entity'].lower(), keyword.lower(), 2) <= 2]
+        assert matcher.match(keyword) == expected
+
+
+def test_match_batch_repeats_results_for_repeated_keywords():
+    matcher = WatchlistMatcher([{'entity': "Luke Skywalker", 'entity_type': 'person'}])
+    first, second, third = matcher.match_batch(["Luke Skiwalker", "luke skiwalker", "Droid"])
+    assert first == second == [{'entity': "Luke Skywalker", 'entity_type': 'person'}]
+    assert third == []
+
+
+def test_rows_keep_create_datetime():
+    matcher = build_matcher([("Luke Skywalker", 'person', '2025-01-01 10:00:00'), ("Droid", 'product', None)])
+    assert matcher.match("Droyd") == [{'entity': "Droid", 'entity_type': 'product', 'create_datetime': None}]
+    assert matcher.entry(0)['create_datetime'] == '2025-01-01 10:00:00'
+
+
+def test_check_keyword_answers_in_the_data_api_shape():
+    pytest.importorskip('boto3')
+    import importlib.util
+    import os
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'activities', 'watchlist.py')
+    spec = importlib.util.spec_from_file_location('watchlist_activities', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    result = module.keyword_query_result([{'entity': "Droid", 'entity_type': 'product', 'create_datetime': None}])
+    assert result['records'] == [[{'stringValue': "Droid"}, {'stringValue': 'product'}, {'isNull': True}]]
@@ -0,0 +1,87 @@
+import io
+
+import pytest
+
+from watchlist_refresh import (INSERT_SQL, STAGING_TABLE, SWAP_SQL, bulk_load_watchlist, iter_watchlist_csv, setup_sql,
+                               watchlist_table_sql)
+
+DB = {'resourceArn': 'arn:cluster', 'secretArn': 'arn:secret', 'database': 'postgres'}
+ARNS = {'resourceArn': 'arn:cluster', 'secretArn': 'arn:secret'}
+
+
+class FakeDataApi:
+    """Records the rds-data calls bulk_load_watchlist makes, fails the statement given"""
+
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+
+    def execute_statement(self, sql, **kwargs):
+        self.calls.append(('execute', sql, kwargs.get('transactionId')))
+        if sql == self.fail_on:
+            raise RuntimeError('statement failed')
+        return {'records': []}
+
+    def batch_execute_statement(self, sql, parameterSets, **kwargs):
+        self.calls.append(('batch', sql, [params[0]['value']['stringValue'] for params in parameterSets]))
+        return {'updateResults': []}
+
+    def begin_transaction(self, **kwargs):
+        assert kwargs == DB
+        self.calls.append(('begin',))
+        return {'transactionId': 'tx-1'}
+
+    def commit_transaction(self, **kwargs):
+        assert kwargs == {'transactionId': 'tx-1', **ARNS}
+        self.calls.append(('commit',))
+
+    def rollback_transaction(self, **kwargs):
+        assert kwargs == {'transactionId': 'tx-1', **ARNS}
+        self.calls.append(('rollback',))
+
+
+def records(count):
+    return ({'entity': f"entity {i}", 'entity_type': 'person'} for i in range(count))
+
+
+def test_records_are_sent_in_batches_to_the_staging_table():
+    client = FakeDataApi()
+    assert bulk_load_watchlist(client, DB, records(5), batch_size=2) == 5
+    batches = [call for call in client.calls if call[0] == 'batch']
+    assert [call[1] for call in batches] == [INSERT_SQL.format(table=STAGING_TABLE)] * 3
+    assert [call[2] for call in batches] == [['entity 0', 'entity 1'], ['entity 2', 'entity 3'], ['entity 4']]
+
+
+def test_swap_and_version_bump_run_in_one_transaction_after_the_inserts():
+    client = FakeDataApi()
+    bulk_load_watchlist(client, DB, records(3), batch_size=10)
+    setup = [('execute', sql, None) for sql in setup_sql()]
+    staging = [('execute', f'DROP TABLE IF EXISTS {STAGING_TABLE}', None),
+               ('execute', watchlist_table_sql(STAGING_TABLE), None)]
+    assert client.calls[:len(setup) + 2] == setup + staging
+    assert client.calls[len(setup) + 2][0] == 'batch'
+    assert client.calls[len(setup) + 3:] == ([('begin',)] + [('execute', sql, 'tx-1') for sql in SWAP_SQL]
+                                             + [('commit',)])
+    assert SWAP_SQL[-1].startswith('UPDATE watchlist_version SET version = version + 1')
+
+
+def test_an_empty_watchlist_still_swaps_in_an_empty_table():
+    client = FakeDataApi()
+    assert bulk_load_watchlist(client, DB, [], batch_size=10) == 0
+    assert not [call for call in client.calls if call[0] == 'batch']
+    assert client.calls[-1] == ('commit',)
+
+
+def test_a_failed_swap_is_rolled_back_and_the_version_not_bumped():
+    client = FakeDataApi(fail_on=SWAP_SQL[2])
+    with pytest.raises(RuntimeError):
+        bulk_load_watchlist(client, DB, records(3), batch_size=10)
+    assert client.calls[-1] == ('rollback',)
+    assert ('execute', SWAP_SQL[-1], 'tx-1') not in client.calls
+    assert ('commit',) not in client.calls
+
+
+def test_csv_rows_are_streamed_without_the_header_or_blank_entities():
+    body = io.BytesIO('entity,entity_type\nLuke Skywalker,person\n,person\nDroid,product\nshort\n'.encode('utf-8'))
+    assert list(iter_watchlist_csv(body)) == [{'entity': 'Luke Skywalker', 'entity_type': 'person'},
+                                              {'entity': 'Droid', 'entity_type': 'product'}]
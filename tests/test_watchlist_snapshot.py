@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from watchlist_snapshot import VersionedWatchlist
+
+
+class Source:
+    """A watchlist source whose loads can be held until the test releases them"""
+
+    def __init__(self):
+        self.version = '1'
+        self.loads = 0
+        self.broken = False
+        self.release = threading.Event()
+        self.release.set()
+        self.loading = threading.Event()
+
+    def read_version(self):
+        return self.version
+
+    def load(self):
+        self.loads += 1
+        if self.broken:
+            raise RuntimeError('database unavailable')
+        version = self.version
+        self.loading.set()
+        assert self.release.wait(5)
+        return version, [f"entry of version {version}"]
+
+
+@pytest.fixture
+def source():
+    return Source()
+
+
+def wait_for_reload(watchlist):
+    # The reload thread holds the lock until it is done
+    assert watchlist._reload_lock.acquire(timeout=5)
+    watchlist._reload_lock.release()
+
+
+def test_the_first_get_loads_and_later_gets_reuse_the_snapshot(source):
+    watchlist = VersionedWatchlist('test', source.read_version, source.load, poll_seconds=60)
+    assert watchlist.get() == ['entry of version 1']
+    assert watchlist.get() == ['entry of version 1']
+    assert source.loads == 1
+
+
+def test_get_serves_the_old_snapshot_while_a_new_version_loads(source):
+    watchlist = VersionedWatchlist('test', source.read_version, source.load, poll_seconds=60)
+    assert watchlist.get() == ['entry of version 1']
+
+    source.version = '2'
+    source.release.clear()
+    source.loading.clear()
+    watchlist.expire()
+    assert watchlist.get() == ['entry of version 1']
+    assert source.loading.wait(5)
+    # The reload is stuck in load(), readers carry on with version 1
+    assert watchlist.get() == ['entry of version 1']
+    assert watchlist.snapshot().version == '1'
+
+    source.release.set()
+    wait_for_reload(watchlist)
+    assert watchlist.get() == ['entry of version 2']
+    assert watchlist.snapshot().version == '2'
+    assert source.loads == 2
+
+
+def test_an_unchanged_version_is_not_reloaded(source):
+    watchlist = VersionedWatchlist('test', source.read_version, source.load, poll_seconds=60)
+    watchlist.get()
+    watchlist.expire()
+    watchlist.get()
+    wait_for_reload(watchlist)
+    assert source.loads == 1
+
+
+def test_a_failed_reload_keeps_the_current_snapshot(source):
+    watchlist = VersionedWatchlist('test', source.read_version, source.load, poll_seconds=60)
+    watchlist.get()
+    source.version = '2'
+    source.broken = True
+    watchlist.expire()
+    watchlist.get()
+    wait_for_reload(watchlist)
+    assert watchlist.get() == ['entry of version 1']
@@ -0,0 +1,62 @@
+import pytest
+
+from news_data import Article
+from watchlist_tagger import NameAutomaton, WatchlistTagger, candidate_runs, normalize_name
+
+NAMES = ['Droid', 'Apple', 'Luke Skywalker', 'Jedi Global Financial', 'Applied Materials', 'Bank of America']
+
+
+@pytest.fixture(scope='module')
+def tagger():
+    return WatchlistTagger({'entity': name, 'entity_type': 'company'} for name in NAMES)
+
+
+def test_automaton_matches_whole_words_only():
+    automaton = NameAutomaton(['droid', 'apple'])
+    assert automaton.find(normalize_name('Android beats Apple')) == ['apple']
+
+
+def test_candidate_runs_break_at_punctuation_and_lowercase_words():
+    assert candidate_runs('Apple, Google and Bank of America') == [['apple'], ['google'], ['bank'], ['america']]
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Bank of America, apple and DROID', ['Bank of America', 'Apple', 'Droid']),
+    ('Luke Skywalker joins Jedi Global Financial', ['Luke Skywalker', 'Jedi Global Financial']),
+])
+def test_exact_mentions(tagger, text, expected):
+    assert tagger.tag(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Luke Skiwalker buys a stake', ['Luke Skywalker']),
+    ('Shares of Jedi Global Finacial fell', ['Jedi Global Financial']),
+    ('Applied Materails and Luke Skywalkr', ['Applied Materials', 'Luke Skywalker']),
+])
+def test_misspellings_are_tagged(tagger, text, expected):
+    assert tagger.tag(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    # Two edits from a short name, and the name is too short to be matched fuzzily
+    ('Luke Skiwalker buys Android from Jedi Global Finacial', ['Luke Skywalker', 'Jedi Global Financial']),
+    # A plural is one edit from a name, but "Apple" is only matched exactly
+    ('Apples and Applied Materials', ['Applied Materials']),
+    ('Apples rise', []),
+    # One edit away but a different first letter
+    ('Rpplied Materials', []),
+    # Two edits are too many for a candidate under TWO_EDIT_CHARS
+    ('Droidsss', []),
+])
+def test_near_misses_are_not_tagged(tagger, text, expected):
+    assert tagger.tag(text) == expected
+
+
+def test_tag_articles_sets_entities_and_counts_tagged(tagger):
+    results = {'2024-01-01': [
+        Article(title='Apple results', link='https://a.example/1', source='A', snippet='', date='2024-01-01'),
+        Article(title='Nothing here', link='https://a.example/2', source='A', snippet='', date='2024-01-01'),
+    ]}
+    tagged_results, tagged = tagger.tag_articles(results)
+    assert tagged == 1
+    assert [item.entities for item in tagged_results['2024-01-01']] == [['Apple'], []]
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from workflow_store import JsonWorkflowMappingStore, SqliteWorkflowMappingStore, create_workflow_mapping_store
+
+
+def test_sqlite_mappings_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'mappings.db')
+    store = SqliteWorkflowMappingStore(path)
+    assert store.get('query-1') is None
+    store.set('query-1', 'workflow-1')
+    store.set('query-1', 'workflow-2')
+    assert store.get('query-1') == 'workflow-2'
+    assert SqliteWorkflowMappingStore(path).get('query-1') == 'workflow-2'
+
+
+def test_sqlite_lookups_see_other_processes_once_the_cache_expires(tmp_path):
+    path = str(tmp_path / 'mappings.db')
+    reader = SqliteWorkflowMappingStore(path, cache_seconds=0)
+    writer = SqliteWorkflowMappingStore(path)
+    writer.set('query-1', 'workflow-1')
+    assert reader.get('query-1') == 'workflow-1'
+    writer.set('query-1', 'workflow-2')
+    assert reader.get('query-1') == 'workflow-2'
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / 'workflow_mappings.json'
+    legacy.write_text(json.dumps({'query-1': 'workflow-1', 'query-2': 'workflow-2'}))
+    path = str(tmp_path / 'mappings.db')
+    store = SqliteWorkflowMappingStore(path, legacy_json_path=str(legacy))
+    assert store.get('query-1') == 'workflow-1'
+    assert store.get('query-2') == 'workflow-2'
+
+    store.set('query-1', 'workflow-3')
+    legacy.write_text(json.dumps({'query-4': 'workflow-4'}))
+    reopened = SqliteWorkflowMappingStore(path, legacy_json_path=str(legacy))
+    assert reopened.get('query-1') == 'workflow-3'
+    assert reopened.get('query-4') is None
+
+
+@pytest.mark.parametrize('legacy_text', [
+    '{"query-1": "workflow-1", "query-2": {"not": "an id"}}',
+    '["query-1", "workflow-1"]',
+    '{"query-1": ',
+])
+def test_a_malformed_legacy_file_does_not_break_the_store(tmp_path, legacy_text):
+    legacy = tmp_path / 'workflow_mappings.json'
+    legacy.write_text(legacy_text)
+    store = SqliteWorkflowMappingStore(str(tmp_path / 'mappings.db'), legacy_json_path=str(legacy))
+    # Nothing is half imported
+    assert store.get('query-1') is None
+    store.set('query-1', 'workflow-1')
+    assert store.get('query-1') == 'workflow-1'
+
+
+def test_json_store_writes_the_file_whole(tmp_path):
+    path = tmp_path / 'workflow_mappings.json'
+    store = JsonWorkflowMappingStore(str(path))
+    store.set('query-1', 'workflow-1')
+    assert json.loads(path.read_text()) == {'query-1': 'workflow-1'}
+    assert JsonWorkflowMappingStore(str(path)).get('query-1') == 'workflow-1'
+    assert [p.name for p in tmp_path.iterdir()] == ['workflow_mappings.json']
+
+
+def test_store_backend_comes_from_config(tmp_path):
+    sqlite_store = create_workflow_mapping_store({'backend': 'sqlite', 'path': str(tmp_path / 'mappings.db')})
+    assert isinstance(sqlite_store, SqliteWorkflowMappingStore)
+    json_store = create_workflow_mapping_store({'backend': 'json',
+                                                'legacy_json_path': str(tmp_path / 'mappings.json')})
+    assert isinstance(json_store, JsonWorkflowMappingStore)
+    with pytest.raises(ValueError):
+        create_workflow_mapping_store({'backend': 'redis'})
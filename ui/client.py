@@ -4,6 +4,8 @@ from logging import getLogger
 import coloredlogs
 import os
 
+from payload_codec import create_data_converter
+
 logger = getLogger(__name__)
 coloredlogs.install(level='INFO')
 
@@ -29,14 +31,13 @@ async def get_client() -> Client:
                 client_cert=client_cert,
                 client_private_key=client_key,
             ),
-            # data_converter=dataclasses.replace(
-            #     temporalio.converter.default(), payload_codec=EncryptionCodec()
-            # ),
+            data_converter=create_data_converter(),
         )
         logger.info("Cloud Client started on " + os.getenv("TEMPORAL_HOST_URL"))
     else:
         client = await Client.connect(
             "localhost:7233",
+            data_converter=create_data_converter(),
         )
         logger.info("Local Client started on localhost:7233")
 
@@ -5,6 +5,7 @@ from typing import Optional
 from temporalio.client import Client, TLSConfig
 
 from config import get_config
+from payload_codec import create_data_converter
 
 CONST_CLIENTS_KEY = 'clients'
 CONST_TEMPORAL_CLIENT_KEY = 'temporal'
@@ -33,9 +34,7 @@ async def create_temporal_client() -> Client:
         temporal_conn.get('target'),
         namespace=temporal_conn.get('namespace'),
         tls=tls,
-        #data_converter=dataclasses.replace(
-        #    temporalio.converter.default(), payload_codec=EncryptionCodec()
-        #),
+        data_converter=create_data_converter(),
     )
     return client
 
@@ -0,0 +1,223 @@
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Postgres fuzzystrmatch's soundex codes for A-Z, vowels and H, W, Y are 0
+SOUNDEX_CODES = "01230120022455012623010202"
+SOUNDEX_LEN = 4
+
+# The watchlist query matches within this many edits (levenshtein_less_equal(..., 2) <= 2)
+MAX_EDITS = 2
+
+
+def _soundex_code(char: str) -> str:
+    upper = char.upper()
+    if 'A' <= upper <= 'Z' and len(upper) == 1:
+        return SOUNDEX_CODES[ord(upper) - ord('A')]
+    return char
+
+
+def soundex(text: str) -> str:
+    """
+    Soundex exactly as Postgres' fuzzystrmatch computes it.
+
+    Leading characters that aren't ASCII letters are skipped and a string
+    without any letters gives ''. A letter is coded unless it has the same
+    code as the character right before it, whatever that character is, so
+    a space or vowel between two consonants keeps both.
+    """
+    start = 0
+    while start < len(text) and not _is_ascii_letter(text[start]):
+        start += 1
+    if start == len(text):
+        return ''
+    code = [text[start].upper()]
+    for i in range(start + 1, len(text)):
+        if len(code) == SOUNDEX_LEN:
+            break
+        char = text[i]
+        if _is_ascii_letter(char) and _soundex_code(char) != _soundex_code(text[i - 1]):
+            digit = _soundex_code(char)
+            if digit != '0':
+                code.append(digit)
+    return ''.join(code).ljust(SOUNDEX_LEN, '0')
+
+
+def _is_ascii_letter(char: str) -> bool:
+    return ('a' <= char <= 'z') or ('A' <= char <= 'Z')
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int = MAX_EDITS) -> int:
+    """Levenshtein distance if it is at most max_distance, otherwise max_distance + 1"""
+    if a == b:
+        return 0
+    too_far = max_distance + 1
+    if abs(len(a) - len(b)) > max_distance:
+        return too_far
+    # Edits only happen between the common prefix and suffix
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return len(b) if len(b) <= max_distance else too_far
+
+    # Only the diagonal band max_distance wide can stay within the bound
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        char = a[i - 1]
+        low, high = max(1, i - max_distance), min(len(b), i + max_distance)
+        best = current[low - 1]
+        for j in range(low, high + 1):
+            cost = previous[j - 1] + (char != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost if cost < too_far else too_far
+            if cost < best:
+                best = cost
+        if best > max_distance:
+            return too_far
+        previous = current
+    return previous[len(b)]
+
+
+def _bigrams(text: str) -> List[str]:
+    padded = f"\x02{text}\x03"
+    return [padded[i:i + 2] for i in range(len(padded) - 1)]
+
+
+class WatchlistMatcher:
+    """
+    In-memory fuzzy index over the watchlist, same matches as the SQL query.
+
+    check_keyword used to run, for every keyword,
+
+        soundex(lower(entity)) = soundex(lower(:kw))
+        UNION levenshtein_less_equal(lower(entity), lower(:kw), 2) <= 2
+
+    over the whole table through the Data API. Here the soundex side is a
+    dict of buckets. The edit distance side is a padded bigram index: two
+    strings within k edits share at least max(len) + 1 - 2k bigrams. Only
+    names passing that count (and length) filter are checked with a banded
+    Levenshtein. Names too short for the filter to mean anything are
+    compared directly, bucketed by length.
+
+    Entries are held as a tuple of names plus an array of indexes into a
+    table of entity types, not as a dict per entry (create_datetime, when
+    the entries have it, is one more tuple), and every lookup key
+    (lowercased name, soundex code, bigrams) is computed once here.
+    Build one per watchlist and share it; match() never mutates it.
+    """
+
+    def __init__(self, entries: Iterable[Dict], max_edits: int = MAX_EDITS):
+        self.max_edits = max_edits
+        entities: List[str] = []
+        created: List[Optional[str]] = []
+        # Rows loaded by one refresh share a handful of timestamps, keep one copy of each
+        created_values: Dict[str, str] = {}
+        self._types: List[str] = []
+        type_index: Dict[str, int] = {}
+        self._type_ids = array('H')
+        # Lowercased name -> indexes of the entries with it (several entity types per name)
+        name_entries: Dict[str, List[int]] = defaultdict(list)
+        for idx, entry in enumerate(entries):
+            entity_type = entry['entity_type']
+            if entity_type not in type_index:
+                type_index[entity_type] = len(self._types)
+                self._types.append(entity_type)
+            entities.append(entry['entity'])
+            created_at = entry.get('create_datetime')
+            created.append(None if created_at is None else created_values.setdefault(created_at, created_at))
+            self._type_ids.append(type_index[entity_type])
+            name_entries[entry['entity'].lower()].append(idx)
+        self._entities = tuple(entities)
+        self._created = tuple(created) if any(value is not None for value in created) else None
+        self._names: List[str] = []
+        self._name_entries: List[List[int]] = []
+        self._soundex: Dict[str, List[int]] = defaultdict(list)
+        # (name length, bigram) -> (name, occurrences in it), the count filter works on bigram multisets
+        self._bigrams: Dict[tuple, List[tuple]] = defaultdict(list)
+        self._by_length: Dict[int, List[int]] = defaultdict(list)
+        for name_idx, (name, idxs) in enumerate(name_entries.items()):
+            self._names.append(name)
+            self._name_entries.append(idxs)
+            self._soundex[soundex(name)].append(name_idx)
+            self._by_length[len(name)].append(name_idx)
+            for bigram, occurrences in Counter(_bigrams(name)).items():
+                self._bigrams[len(name), bigram].append((name_idx, occurrences))
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def entry(self, idx: int) -> Dict:
+        """Entry idx in the shape the watchlist table returns, built on demand"""
+        entry = {'entity': self._entities[idx], 'entity_type': self._types[self._type_ids[idx]]}
+        if self._created is not None:
+            entry['create_datetime'] = self._created[idx]
+        return entry
+
+    @property
+    def entries(self) -> List[Dict]:
+        return [self.entry(idx) for idx in range(len(self._entities))]
+
+    def match(self, keyword: str) -> List[Dict]:
+        """Watchlist entries matching one keyword, in watchlist order"""
+        keyword = keyword.lower()
+        names = set(self._soundex.get(soundex(keyword), ()))
+        names.update(self._within_edits(keyword))
+        return [self.entry(idx) for idx in sorted(idx for name_idx in names
+                                                  for idx in self._name_entries[name_idx])]
+
+    def match_batch(self, keywords: Sequence[str]) -> List[List[Dict]]:
+        """Matches for each keyword, repeated keywords (in any case) are only looked up once"""
+        cache: Dict[str, List[Dict]] = {}
+        results = []
+        for keyword in keywords:
+            key = keyword.lower()
+            if key not in cache:
+                cache[key] = self.match(key)
+            results.append(cache[key])
+        return results
+
+    def within_edits(self, keyword: str) -> List[Dict]:
+        """Entries within max_edits of the keyword, without the soundex side (too loose for free text)"""
+        names = self._within_edits(keyword.lower())
+        return [self.entry(idx) for idx in sorted(idx for name_idx in names
+                                                  for idx in self._name_entries[name_idx])]
+
+    def _within_edits(self, keyword: str) -> List[int]:
+        k = self.max_edits
+        lengths = range(max(0, len(keyword) - k), len(keyword) + k + 1)
+        # Below this length the shared bigram bound is zero, every name of a close length is a candidate
+        if len(keyword) + 1 - 2 * k <= 0:
+            candidates: List[int] = [name_idx for length in lengths for name_idx in self._by_length.get(length, ())]
+        else:
+            candidates = []
+            keyword_bigrams = Counter(_bigrams(keyword)).items()
+            for length in lengths:
+                counts: Dict[int, int] = defaultdict(int)
+                for bigram, occurrences in keyword_bigrams:
+                    for name_idx, name_occurrences in self._bigrams.get((length, bigram), ()):
+                        counts[name_idx] += min(occurrences, name_occurrences)
+                required = max(len(keyword), length) + 1 - 2 * k
+                candidates.extend(name_idx for name_idx, shared in counts.items() if shared >= required)
+        return [name_idx for name_idx in candidates
+                if bounded_levenshtein(keyword, self._names[name_idx], k) <= k]
+
+
+def build_matcher(rows: Iterable[Sequence], max_edits: Optional[int] = None) -> WatchlistMatcher:
+    """Matcher over (entity, entity_type[, create_datetime]) rows as the watchlist table returns them"""
+    entries = [{'entity': row[0], 'entity_type': row[1], 'create_datetime': row[2] if len(row) > 2 else None}
+               for row in rows]
+    return WatchlistMatcher(entries, MAX_EDITS if max_edits is None else max_edits)
@@ -0,0 +1,112 @@
+import codecs
+import csv
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+WATCHLIST_TABLE = 'watchlist'
+STAGING_TABLE = 'watchlist_staging'
+# One row, bumped with every refresh so workers know to reload their snapshot
+VERSION_TABLE = 'watchlist_version'
+VERSION_SQL = f"SELECT version FROM {VERSION_TABLE} WHERE id = 1"
+
+INSERT_SQL = ("INSERT INTO {table}(entity, entity_type, create_datetime) "
+              "VALUES(:entity, :entity_type, timezone('UTC', now())) ON CONFLICT DO NOTHING")
+
+# One transaction, readers see the old table until the commit and the full new one after it
+SWAP_SQL = [
+    f"ALTER TABLE {WATCHLIST_TABLE} RENAME TO {WATCHLIST_TABLE}_old",
+    f"DROP TABLE {WATCHLIST_TABLE}_old",
+    f"ALTER TABLE {STAGING_TABLE} RENAME TO {WATCHLIST_TABLE}",
+    # Keep the primary key's index name free for the next staging table
+    f"ALTER INDEX {STAGING_TABLE}_pkey RENAME TO {WATCHLIST_TABLE}_pkey",
+    f"UPDATE {VERSION_TABLE} SET version = version + 1, updated_at = timezone('UTC', now()) WHERE id = 1",
+]
+
+
+def watchlist_table_sql(table: str = WATCHLIST_TABLE) -> str:
+    """
+    Returns the watchlist DDL table creation SQL Statement
+    :param table: table name, the live table or the staging one
+    :return:
+    """
+    return f'CREATE TABLE IF NOT EXISTS {table}( ' \
+           'entity varchar(255), ' \
+           'entity_type varchar(255), ' \
+           'create_datetime timestamp, ' \
+           'PRIMARY KEY (entity, entity_type)) '
+
+
+def setup_sql() -> List[str]:
+    """
+    Statements creating whatever the watchlist needs that doesn't exist yet,
+    with the version row at 0, safe to run any number of times
+    :return: the statements, in order
+    """
+    return [
+        'create extension IF NOT EXISTS fuzzystrmatch;',
+        watchlist_table_sql(),
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE}(id integer PRIMARY KEY, version bigint NOT NULL, "
+        f"updated_at timestamp)",
+        f"INSERT INTO {VERSION_TABLE}(id, version, updated_at) VALUES(1, 0, timezone('UTC', now())) "
+        f"ON CONFLICT DO NOTHING",
+    ]
+
+
+def iter_watchlist_csv(stream) -> Iterator[Dict]:
+    """
+    Stream watchlist records out of a CSV body (entity, entity_type), without loading it whole
+    :param stream: binary file-like object, e.g. an S3 StreamingBody
+    :return: iterator of entity and entity_type records
+    """
+    reader = csv.reader(codecs.getreader('utf-8')(stream))
+    # The first line is the header, as pandas.read_csv assumed
+    next(reader, None)
+    for row in reader:
+        if len(row) >= 2 and row[0]:
+            yield {'entity': row[0], 'entity_type': row[1]}
+
+
+def record_parameters(record: Dict) -> List[Dict]:
+    return [
+        {'name': 'entity', 'value': {'stringValue': "{0}".format(record["entity"])}},
+        {'name': 'entity_type', 'value': {'stringValue': "{0}".format(record["entity_type"])}}
+    ]
+
+
+def bulk_load_watchlist(client, db: Dict, records: Iterable[Dict], batch_size: int = 1000) -> int:
+    """
+    Load the records into a staging table with batched inserts, then swap it in for the watchlist
+    and bump the watchlist version in the same transaction
+    :param client: boto3 'rds-data' client (or anything with the same methods)
+    :param db: resourceArn, secretArn and database for the Data API calls
+    :param records: iterable of entity and entity_type values, consumed a batch at a time
+    :param batch_size: parameter sets per batch_execute_statement call
+    :return: how many records were sent
+    """
+    def execute(sql, **kwargs):
+        return client.execute_statement(sql=sql, **db, **kwargs)
+
+    for sql in setup_sql():
+        execute(sql)
+    execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+    execute(watchlist_table_sql(STAGING_TABLE))
+
+    sent = 0
+    records = iter(records)
+    while True:
+        batch = [record_parameters(record) for record in islice(records, batch_size)]
+        if not batch:
+            break
+        client.batch_execute_statement(sql=INSERT_SQL.format(table=STAGING_TABLE), parameterSets=batch, **db)
+        sent += len(batch)
+
+    arns = {'resourceArn': db['resourceArn'], 'secretArn': db['secretArn']}
+    transaction_id = client.begin_transaction(**db)['transactionId']
+    try:
+        for sql in SWAP_SQL:
+            execute(sql, transactionId=transaction_id)
+    except Exception:
+        client.rollback_transaction(transactionId=transaction_id, **arns)
+        raise
+    client.commit_transaction(transactionId=transaction_id, **arns)
+    return sent
@@ -0,0 +1,86 @@
+import coloredlogs
+import threading
+import time
+from logging import getLogger
+from typing import Callable, Generic, Optional, Tuple, TypeVar
+
+logger = getLogger(__name__)
+coloredlogs.install(level='INFO')
+
+# How often a worker asks the watchlist source whether it has a new version
+DEFAULT_POLL_SECONDS = 30.0
+
+T = TypeVar('T')
+
+
+class WatchlistSnapshot(Generic[T]):
+    """One immutable version of the watchlist, as the index built over it (a matcher or tagger)"""
+
+    __slots__ = ('version', 'index', 'loaded_at')
+
+    def __init__(self, version: str, index: T):
+        self.version = version
+        self.index = index
+        self.loaded_at = time.time()
+
+
+class VersionedWatchlist(Generic[T]):
+    """
+    The current watchlist snapshot of a worker, swapped for a new one when the source's version changes.
+
+    read_version is a cheap check (the watchlist_version row, a file's
+    mtime), done at most every poll_seconds. load reads the whole
+    watchlist and returns the version it read with the index built over
+    it. A new version is loaded in a background thread while matching goes
+    on against the current snapshot, then swapped in with one reference
+    assignment. Readers never take a lock and a refresh never blocks a
+    check in flight, they finish on the snapshot they started with.
+    Only the very first get() waits for a load.
+    """
+
+    def __init__(self, name: str, read_version: Callable[[], str], load: Callable[[], Tuple[str, T]],
+                 poll_seconds: float = DEFAULT_POLL_SECONDS):
+        self.name = name
+        self.poll_seconds = poll_seconds
+        self._read_version = read_version
+        self._load = load
+        self._snapshot: Optional[WatchlistSnapshot[T]] = None
+        self._next_check = 0.0
+        # Held by whichever thread is checking or loading, never by readers
+        self._reload_lock = threading.Lock()
+
+    def get(self) -> T:
+        """The index of the current snapshot"""
+        return self.snapshot().index
+
+    def snapshot(self) -> WatchlistSnapshot[T]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._reload_lock:
+                if self._snapshot is None:
+                    self._swap(*self._load())
+                return self._snapshot
+        if time.monotonic() >= self._next_check and self._reload_lock.acquire(blocking=False):
+            threading.Thread(target=self._reload, name=f"{self.name}-reload", daemon=True).start()
+        return snapshot
+
+    def expire(self) -> None:
+        """Check the version on the next get(), e.g. right after a refresh from this process"""
+        self._next_check = 0.0
+
+    def _reload(self) -> None:
+        # Runs with _reload_lock held, released here
+        try:
+            if self._read_version() != self._snapshot.version:
+                self._swap(*self._load())
+        except Exception as e:
+            # Keep matching against the snapshot we have, try again next poll
+            logger.error(f"Could not reload the {self.name}: {e}")
+        finally:
+            self._next_check = time.monotonic() + self.poll_seconds
+            self._reload_lock.release()
+
+    def _swap(self, version: str, index: T) -> None:
+        self._snapshot = WatchlistSnapshot(version, index)
+        self._next_check = time.monotonic() + self.poll_seconds
+        logger.info(f"Loaded {self.name} version {version} ({len(index)} entries)")
@@ -0,0 +1,236 @@
+import coloredlogs
+import dataclasses
+import os
+import re
+from collections import deque
+from logging import getLogger
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import get_config
+from news_data import Article
+from watchlist_matcher import MAX_EDITS, WatchlistMatcher, bounded_levenshtein
+from watchlist_refresh import iter_watchlist_csv
+from watchlist_snapshot import VersionedWatchlist
+
+logger = getLogger(__name__)
+coloredlogs.install(level='INFO')
+
+_WORD = re.compile(r"\w+")
+# Shorter candidates and names are only matched exactly, an edit or two turns most short words into some name
+MIN_FUZZY_CHARS = 6
+# Candidates this long may be two edits from a name, shorter ones only one
+TWO_EDIT_CHARS = 9
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase words separated by single spaces, names and article text are compared in this form"""
+    return ' '.join(_WORD.findall(text.lower()))
+
+
+class NameAutomaton:
+    """
+    Aho-Corasick automaton over normalised watchlist names.
+
+    Patterns and text are padded with a space on each side, so a name only
+    matches whole words ("Droid" is not found in "Android"). One pass over
+    an article's text finds every name in it, however many names there are.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Names ending at each state, including those reached through fail links
+        self._out: List[List[str]] = [[]]
+        for name in names:
+            if name:
+                self._add(f" {name} ", name)
+        self._link()
+
+    def _add(self, pattern: str, name: str) -> None:
+        state = 0
+        for char in pattern:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(name)
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> List[str]:
+        """Names in the normalised text, each once, in the order they end"""
+        found: Dict[str, None] = {}
+        state = 0
+        for char in f" {text} ":
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for name in self._out[state]:
+                found[name] = None
+        return list(found)
+
+
+def candidate_runs(text: str) -> List[List[str]]:
+    """
+    Runs of capitalised words, lowercased, the proper nouns of a headline or snippet.
+
+    A run breaks at any punctuation between words, so "Apple, Google"
+    gives two runs and "Bank of America" gives "Bank" and "America".
+    """
+    runs: List[List[str]] = []
+    run: List[str] = []
+    last_end = 0
+    for match in _WORD.finditer(text):
+        word = match.group()
+        if not word[0].isupper() or (run and text[last_end:match.start()].strip()):
+            if run:
+                runs.append(run)
+            run = []
+        if word[0].isupper():
+            run.append(word.lower())
+        last_end = match.end()
+    if run:
+        runs.append(run)
+    return runs
+
+
+class WatchlistTagger:
+    """
+    Finds watchlist entities mentioned in article titles and snippets.
+
+    Exact mentions (case and punctuation aside) come from one Aho-Corasick
+    pass over the text. Misspelt ones come from the fuzzy fallback: n-grams
+    of the capitalised word runs, longest first and outside the mentions
+    already found, are looked up in a WatchlistMatcher by edit distance
+    only. The candidate and the name must both be at least min_fuzzy_chars
+    long and start with the same letter, and may be one edit apart, two
+    from TWO_EDIT_CHARS characters on, or "Android" would be tagged "Droid"
+    and "Apples" "Apple". Lookups are cached
+    per batch, since the same names keep coming back across a search's
+    results.
+
+    Build one per watchlist and share it, tagging never mutates it.
+    """
+
+    def __init__(self, entries: Iterable[Dict], max_edits: int = MAX_EDITS, min_fuzzy_chars: int = MIN_FUZZY_CHARS):
+        entries = list(entries)
+        self.min_fuzzy_chars = min_fuzzy_chars
+        # Normalised name -> the entity as written in the watchlist
+        self._names: Dict[str, str] = {}
+        for entry in entries:
+            self._names.setdefault(normalize_name(entry['entity']), entry['entity'])
+        self._names.pop('', None)
+        self._max_tokens = max((name.count(' ') + 1 for name in self._names), default=0)
+        self._automaton = NameAutomaton(self._names)
+        self._matcher = WatchlistMatcher(entries, max_edits)
+
+    def __len__(self) -> int:
+        return len(self._matcher)
+
+    def tag(self, text: str, cache: Optional[Dict[str, List[str]]] = None) -> List[str]:
+        """Watchlist entities mentioned in the text, exact mentions first"""
+        exact = self._automaton.find(normalize_name(text))
+        entities = dict.fromkeys(self._names[name] for name in exact)
+        cache = {} if cache is None else cache
+        exact_words = [name.split(' ') for name in exact]
+        for run in candidate_runs(text):
+            # N-grams inside a mention already found aren't candidates, longer n-grams are tried first
+            found: List[Tuple[int, int]] = []
+            for words in exact_words:
+                found.extend((start, start + len(words)) for start in range(len(run) - len(words) + 1)
+                             if run[start:start + len(words)] == words)
+            for size in range(min(self._max_tokens, len(run)), 0, -1):
+                for start in range(len(run) - size + 1):
+                    if any(low <= start and start + size <= high for low, high in found):
+                        continue
+                    candidate = ' '.join(run[start:start + size])
+                    if len(candidate) < self.min_fuzzy_chars:
+                        continue
+                    if candidate not in cache:
+                        cache[candidate] = self._fuzzy_matches(candidate)
+                    if cache[candidate]:
+                        entities.update(dict.fromkeys(cache[candidate]))
+                        found.append((start, start + size))
+        return list(entities)
+
+    def _fuzzy_matches(self, candidate: str) -> List[str]:
+        """Entities the candidate could be a misspelling of"""
+        edits = min(self._matcher.max_edits, 2 if len(candidate) >= TWO_EDIT_CHARS else 1)
+        entities: Dict[str, None] = {}
+        for entry in self._matcher.within_edits(candidate):
+            name = normalize_name(entry['entity'])
+            if len(name) >= self.min_fuzzy_chars and name[0] == candidate[0] \
+                    and bounded_levenshtein(name, candidate, edits) <= edits:
+                entities[entry['entity']] = None
+        return list(entities)
+
+    def tag_articles(self, results: Dict[str, List[Article]]) -> Tuple[Dict[str, List[Article]], int]:
+        """Set entities on every article of a batch, returns the batch and how many articles were tagged"""
+        cache: Dict[str, List[str]] = {}
+        tagged = 0
+        out: Dict[str, List[Article]] = {}
+        for date_key, items in results.items():
+            out[date_key] = []
+            for item in items:
+                entities = self.tag(f"{item.title}\n{item.snippet}", cache)
+                if entities:
+                    tagged += 1
+                out[date_key].append(dataclasses.replace(item, entities=entities))
+        return out, tagged
+
+
+def load_watchlist_file(path: str) -> List[Dict]:
+    """entity, entity_type rows of a watchlist CSV, the same file refresh loads from S3"""
+    with open(path, 'rb') as body:
+        return list(iter_watchlist_csv(body))
+
+
+def watchlist_file_version(path: str) -> str:
+    """Changes whenever the file is replaced or rewritten"""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+_watchlist_taggers: Optional[VersionedWatchlist] = None
+
+
+def get_watchlist_tagger() -> Optional[WatchlistTagger]:
+    """
+    The process wide tagger over the current WATCHLIST_PATH, None unless WATCHLIST_TAGGING is set.
+
+    A new file (replace it with a rename so it is never read half written)
+    is picked up within WATCHLIST_VERSION_POLL_SECONDS, batches being tagged
+    meanwhile finish with the previous watchlist.
+
+    This is not the Aurora watchlist check_keyword matches against, the
+    workers have no database access. Deploy the same CSV refresh loads from
+    the bucket to keep the two in step.
+    """
+    global _watchlist_taggers
+    if _watchlist_taggers is None:
+        watchlist_cfg = get_config()['newsfeed']['watchlist']
+        if not watchlist_cfg['tagging']:
+            return None
+        path = watchlist_cfg['path']
+
+        def load():
+            version = watchlist_file_version(path)
+            return version, WatchlistTagger(load_watchlist_file(path), min_fuzzy_chars=watchlist_cfg['min_fuzzy_chars'])
+
+        _watchlist_taggers = VersionedWatchlist('watchlist tagger', lambda: watchlist_file_version(path), load,
+                                                watchlist_cfg['poll_seconds'])
+    return _watchlist_taggers.get()
@@ -0,0 +1,153 @@
+import abc
+import coloredlogs
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from logging import getLogger
+from typing import Dict, Optional
+
+logger = getLogger(__name__)
+coloredlogs.install(level='INFO')
+
+
+class WorkflowMappingStore(abc.ABC):
+    """
+    Maps a search query_id to the workflow ID serving it.
+
+    Lookups go through a small in-process cache. Entries expire after
+    cache_seconds so a mapping replaced by another web process is picked
+    up without hitting the backing store on every request. get and set
+    may block on the backing store, async callers run them in a thread.
+    """
+
+    def __init__(self, cache_seconds: float = 30):
+        self._cache_seconds = cache_seconds
+        self._cache: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, query_id: str) -> Optional[str]:
+        cached = self._cache.get(query_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        workflow_id = self._load(query_id)
+        if workflow_id is not None:
+            self._cache[query_id] = (workflow_id, time.monotonic() + self._cache_seconds)
+        return workflow_id
+
+    def set(self, query_id: str, workflow_id: str) -> None:
+        with self._lock:
+            self._save(query_id, workflow_id)
+            self._cache[query_id] = (workflow_id, time.monotonic() + self._cache_seconds)
+
+    @abc.abstractmethod
+    def _load(self, query_id: str) -> Optional[str]:
+        ...
+
+    @abc.abstractmethod
+    def _save(self, query_id: str, workflow_id: str) -> None:
+        ...
+
+
+class SqliteWorkflowMappingStore(WorkflowMappingStore):
+    """Mappings in a local SQLite file, indexed by query_id and safe across processes"""
+
+    def __init__(self, path: str, legacy_json_path: Optional[str] = None, cache_seconds: float = 30):
+        super().__init__(cache_seconds)
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS workflow_mappings ("
+            "query_id TEXT PRIMARY KEY, "
+            "workflow_id TEXT NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        if legacy_json_path:
+            self._import_json(legacy_json_path)
+
+    def _load(self, query_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT workflow_id FROM workflow_mappings WHERE query_id = ?",
+                                   (query_id,)).fetchone()
+        return row[0] if row else None
+
+    def _save(self, query_id: str, workflow_id: str) -> None:
+        self._db.execute(
+            "INSERT INTO workflow_mappings(query_id, workflow_id, updated_at) VALUES(?, ?, ?) "
+            "ON CONFLICT(query_id) DO UPDATE SET workflow_id = excluded.workflow_id, updated_at = excluded.updated_at",
+            (query_id, workflow_id, time.time())
+        )
+
+    def _import_json(self, json_path: str) -> None:
+        # One time migration from the old workflow_mappings.json file
+        if not os.path.exists(json_path):
+            return
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM workflow_mappings LIMIT 1").fetchone():
+                return
+            try:
+                with open(json_path, 'r') as f:
+                    mappings = json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading legacy workflow mappings: {e}")
+                return
+            now = time.time()
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO workflow_mappings(query_id, workflow_id, updated_at) VALUES(?, ?, ?)",
+                    [(query_id, workflow_id, now) for query_id, workflow_id in mappings.items()]
+                )
+                self._db.execute("COMMIT")
+            except Exception as e:
+                # Nothing is half imported, and the connection isn't left in a transaction
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                logger.error(f"Error importing legacy workflow mappings: {e}")
+                return
+        logger.info(f"Imported {len(mappings)} workflow mappings from {json_path}")
+
+
+class JsonWorkflowMappingStore(WorkflowMappingStore):
+    """The original workflow_mappings.json file, now loaded once and written atomically"""
+
+    def __init__(self, path: str, cache_seconds: float = 30):
+        super().__init__(cache_seconds)
+        self._path = path
+        self._mappings: Dict[str, str] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self._mappings = json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading workflow mappings: {e}")
+
+    def _load(self, query_id: str) -> Optional[str]:
+        return self._mappings.get(query_id)
+
+    def _save(self, query_id: str, workflow_id: str) -> None:
+        self._mappings[query_id] = workflow_id
+        # Write to a temp file and rename so readers never see a partial file
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._mappings, f)
+            os.replace(tmp_path, self._path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+def create_workflow_mapping_store(store_cfg: dict) -> WorkflowMappingStore:
+    """Build the mapping store selected in config.py's web.workflow_store section"""
+    backend = store_cfg.get('backend') or 'sqlite'
+    if backend == 'sqlite':
+        return SqliteWorkflowMappingStore(store_cfg.get('path') or 'workflow_mappings.db',
+                                          legacy_json_path=store_cfg.get('legacy_json_path'))
+    if backend == 'json':
+        return JsonWorkflowMappingStore(store_cfg.get('legacy_json_path') or 'workflow_mappings.json')
+    raise ValueError(f"Unknown workflow store backend: {backend}")